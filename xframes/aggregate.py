@@ -210,11 +210,40 @@ def CONCAT(src_column, dict_value_column=None):
         return '__builtin__concat__dict__', [src_column, dict_value_column]
 
 
+# noinspection PyPep8Naming
+def APPROX_COUNT_DISTINCT(src_column, rel_error=0.01):
+    """
+    Builtin approximate distinct count aggregator for groupby.
+
+    The count is estimated with a HyperLogLog sketch for each group.  The sketch of
+    a group with few distinct values is small, and no sketch uses more than about
+    (1.04 / rel_error) ** 2 bytes.  Missing values are not counted.
+
+    Examples
+    --------
+
+    Get the approximate number of distinct users for each page.
+
+    >>> xf.groupby("page",
+                 {'users':aggregate.APPROX_COUNT_DISTINCT('user')})
+
+    With a relative standard error of 5%, using less memory for each group.
+
+    >>> xf.groupby("page",
+                 {'users':aggregate.APPROX_COUNT_DISTINCT('user', rel_error=0.05)})
+
+    """
+    return '__builtin__approx_count_distinct__[' + str(rel_error) + ']', [src_column]
+
+
 # noinspection PyPep8Naming
 def QUANTILE(src_column, *args):
     """
     Builtin approximate quantile aggregator for groupby.
     Accepts as an argument, one or more of a list of quantiles to query.
+    The result for each group is a list of the values at the given quantiles,
+    in the order given, or None if the group has no values.
+    Missing values are ignored.
 
     Examples
     --------
@@ -228,9 +257,19 @@ def QUANTILE(src_column, *args):
     Or equivalently
         >>> xf.groupby("user", {'rating_quantiles':aggregate.QUANTILE('rating', 0.25,0.5,0.75)})
 
-    The returned quantiles are guaranteed to have 0.5% accuracy. That is to say,
-    if the requested quantile is 0.50, the resultant quantile value may be
-    between 0.495 and 0.505 of the true quantile.
+    To get the 50th, 95th and 99th percentile latency for each endpoint
+        >>> xf.groupby("endpoint", {'latency':aggregate.QUANTILE('latency', 0.5, 0.95, 0.99)})
+
+    Notes
+    -----
+    Each group is summarized by a KLL sketch, which is built within each partition
+    and merged across partitions, so the rows of a group are never collected together.
+    The sketch keeps at most about 1650 values, however large the group, and the
+    values at quantiles 0 and 1 are the exact min and max.
+
+    The returned quantiles have a normalized rank error of at most 0.5%, with 99%
+    confidence.  That is to say, if the requested quantile is 0.50, the returned
+    value is one whose rank in the group is between 0.495 and 0.505.
     """
     if len(args) == 1:
         quantiles = args[0]
@@ -239,5 +278,10 @@ def QUANTILE(src_column, *args):
 
     if not hasattr(quantiles, '__iter__'):
         quantiles = [quantiles]
+    if len(quantiles) == 0:
+        raise ValueError('At least one quantile is required.')
+    for q in quantiles:
+        if not 0 <= q <= 1:
+            raise ValueError('Quantiles must be between 0 and 1: {}.'.format(q))
     query = ",".join([str(i) for i in quantiles])
     return '__builtin__quantile__[' + query + ']', [src_column]
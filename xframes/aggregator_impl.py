@@ -5,6 +5,12 @@ This module provides aggregator properties, used to define aggregators for group
 import random
 import math
 
+from xframes.hyperloglog import HyperLogLog, precision_for_error
+from xframes.kll import KLLSketch, k_for_rank_error
+
+# The normalized rank error of groupby quantiles, at 99% confidence.
+QUANTILE_RANK_ERROR = 0.005
+
 
 def is_missing(x):
     if x is None:
@@ -137,17 +143,283 @@ def agg_concat_dict(rows, cols):
     return vals
 
 
-def agg_quantile(rows, cols): 
-    # cols: [src_col, quantile]
-    # cols: [src_col, [quantile ...]]
-    # not imlemented
+def agg_approx_count_distinct(rows, cols, params):
+    # cols: [src_col]
+    # params: [rel_error]
+    acc = zero_approx_count_distinct(cols, params)
+    for row in rows:
+        acc = seq_approx_count_distinct(acc, row, cols)
+    return final_approx_count_distinct(acc, params)
+
+
+def agg_quantile(rows, cols, params):
+    # cols: [src_col]
+    # params: [quantile ...]
+    acc = zero_quantile(cols, params)
+    for row in rows:
+        acc = seq_quantile(acc, row, cols)
+    return final_quantile(acc, params)
+
+
+# Each of the following groups of functions implements an aggregator as a combiner.
+#  zero_xxx(cols) returns the initial accumulator for a group.
+#  seq_xxx(acc, row, cols) folds one row into the accumulator.
+#  comb_xxx(acc1, acc2) merges two accumulators from different partitions.
+#  final_xxx(acc) produces the aggregated result from the accumulator.
+# Accumulators are small values or tuples, so only these partial states are shuffled,
+#  rather than all the rows in a group.
+
+# All of them skip over missing values, as the functions above do.
+
+
+# noinspection PyUnusedLocal
+def zero_none(cols):
     return None
 
 
+def final_identity(acc):
+    return acc
+
+
+def seq_sum(acc, row, cols):
+    val = row[cols[0]]
+    if is_missing(val):
+        return acc
+    return val if acc is None else acc + val
+
+
+def comb_sum(acc1, acc2):
+    if acc1 is None:
+        return acc2
+    if acc2 is None:
+        return acc1
+    return acc1 + acc2
+
+
+def seq_max(acc, row, cols):
+    val = row[cols[0]]
+    if is_missing(val):
+        return acc
+    return val if acc is None or val > acc else acc
+
+
+def comb_max(acc1, acc2):
+    if acc1 is None:
+        return acc2
+    if acc2 is None:
+        return acc1
+    return acc2 if acc2 > acc1 else acc1
+
+
+def seq_min(acc, row, cols):
+    val = row[cols[0]]
+    if is_missing(val):
+        return acc
+    return val if acc is None or val < acc else acc
+
+
+def comb_min(acc1, acc2):
+    if acc1 is None:
+        return acc2
+    if acc2 is None:
+        return acc1
+    return acc2 if acc2 < acc1 else acc1
+
+
+# argmax and argmin accumulate (agg_val, out_val)
+# The first row having the extreme value is kept, as in agg_argmax and agg_argmin.
+def seq_argmax(acc, row, cols):
+    # cols: [agg_col, out_col]
+    val = row[cols[0]]
+    if is_missing(val):
+        return acc
+    if acc is None or val > acc[0]:
+        return val, row[cols[1]]
+    return acc
+
+
+def comb_argmax(acc1, acc2):
+    if acc1 is None:
+        return acc2
+    if acc2 is None:
+        return acc1
+    return acc2 if acc2[0] > acc1[0] else acc1
+
+
+def seq_argmin(acc, row, cols):
+    # cols: [agg_col, out_col]
+    val = row[cols[0]]
+    if is_missing(val):
+        return acc
+    if acc is None or val < acc[0]:
+        return val, row[cols[1]]
+    return acc
+
+
+def comb_argmin(acc1, acc2):
+    if acc1 is None:
+        return acc2
+    if acc2 is None:
+        return acc1
+    return acc2 if acc2[0] < acc1[0] else acc1
+
+
+def final_arg(acc):
+    return None if acc is None else acc[1]
+
+
+# noinspection PyUnusedLocal
+def zero_count(cols):
+    return 0
+
+
+# noinspection PyUnusedLocal
+def seq_count(acc, row, cols):
+    # Missing values do not matter here.
+    return acc + 1
+
+
+def comb_count(acc1, acc2):
+    return acc1 + acc2
+
+
+# Mean accumulates (count, total), so the result matches agg_avg.
+# noinspection PyUnusedLocal
+def zero_avg(cols):
+    return 0, 0
+
+
+def seq_avg(acc, row, cols):
+    val = row[cols[0]]
+    if is_missing(val):
+        return acc
+    return acc[0] + 1, acc[1] + val
+
+
+def comb_avg(acc1, acc2):
+    return acc1[0] + acc2[0], acc1[1] + acc2[1]
+
+
+def final_avg(acc):
+    n, total = acc
+    if n == 0:
+        return None
+    return total / float(n)
+
+
+# Variance and standard deviation accumulate (count, mean, m2).
+# Values are folded in using Welford's method, and accumulators are merged
+#  using the parallel form given by Chan et al.
+# noinspection PyUnusedLocal
+def zero_moments(cols):
+    return 0, 0.0, 0.0
+
+
+def seq_moments(acc, row, cols):
+    val = row[cols[0]]
+    if is_missing(val):
+        return acc
+    n, mean, m2 = acc
+    n += 1
+    delta = val - mean
+    mean += delta / float(n)
+    m2 += delta * (val - mean)
+    return n, mean, m2
+
+
+def comb_moments(acc1, acc2):
+    n1, mean1, m21 = acc1
+    n2, mean2, m22 = acc2
+    if n1 == 0:
+        return acc2
+    if n2 == 0:
+        return acc1
+    n = n1 + n2
+    delta = mean2 - mean1
+    mean = mean1 + delta * n2 / float(n)
+    m2 = m21 + m22 + delta * delta * n1 * n2 / float(n)
+    return n, mean, m2
+
+
+def final_var(acc):
+    n, mean, m2 = acc
+    if n == 0:
+        return None
+    return m2 / float(n)
+
+
+def final_std(acc):
+    variance = final_var(acc)
+    if variance is None:
+        return None
+    return math.sqrt(variance)
+
+
+# Approximate distinct counts accumulate a HyperLogLog sketch.
+def zero_approx_count_distinct(cols, params):
+    return HyperLogLog(precision_for_error(params[0]))
+
+
+def seq_approx_count_distinct(acc, row, cols):
+    val = row[cols[0]]
+    if is_missing(val):
+        return acc
+    return acc.add(val)
+
+
+def comb_approx_count_distinct(acc1, acc2):
+    return acc1.merge(acc2)
+
+
+# noinspection PyUnusedLocal
+def final_approx_count_distinct(acc, params):
+    return acc.cardinality()
+
+
+# Quantiles accumulate a KLL sketch, whose size is bounded whatever the size of the group.
+# noinspection PyUnusedLocal
+def zero_quantile(cols, params):
+    return KLLSketch(k_for_rank_error(QUANTILE_RANK_ERROR))
+
+
+def seq_quantile(acc, row, cols):
+    val = row[cols[0]]
+    if is_missing(val):
+        return acc
+    return acc.add(val)
+
+
+def comb_quantile(acc1, acc2):
+    return acc1.merge(acc2)
+
+
+def final_quantile(acc, params):
+    if acc.n == 0:
+        return None
+    return acc.quantiles(params)
+
+
+def seq_select_one(acc, row, cols):
+    # cols: [src_col, seed]
+    # Keeps the last non-missing value seen.  Since every select_one aggregator
+    #  sees the rows in the same order, the values selected for several columns come
+    #  from the same row.
+    val = row[cols[0]]
+    if is_missing(val):
+        return acc
+    return val
+
+
+def comb_select_one(acc1, acc2):
+    return acc1 if acc2 is None else acc2
+
+
 class AggregatorPropertySet(object):
     """ Store aggregator properties for one aggregator. """
 
-    def __init__(self, name, agg_function, default_col_name, output_type):
+    def __init__(self, name, agg_function, default_col_name, output_type,
+                 zero_function=None, seq_function=None, comb_function=None, final_function=None,
+                 parameterized=False):
         """ 
         Create a new instance.
 
@@ -169,12 +441,41 @@ class AggregatorPropertySet(object):
             If a type is given, use that type as the output column type.
             If an integer is given, then the output type is the same as the
                 input type of the column indexed by the integer.
+
+        zero_function: func(cols), optional
+            Returns the initial accumulator value for a group.
+
+        seq_function: func(acc, row, cols), optional
+            Folds a row into an accumulator and returns the new accumulator.
+
+        comb_function: func(acc1, acc2), optional
+            Merges two accumulators and returns the result.
+
+        final_function: func(acc), optional
+            Computes the aggregate value for the group from its accumulator.
+
+        parameterized: bool, optional
+            If True, the aggregator takes parameters, given in the operator name
+            in brackets: for example '__builtin__quantile__[0.25,0.75]'.
+            The parameters are passed as a list of floats, as an extra last argument
+            to the agg, zero, and final functions.
+
+        Notes
+        -----
+        If the zero, seq, and comb functions are all given, the aggregator is decomposable,
+        and groupby can compute it with aggregateByKey, shuffling only the accumulators.
+        Otherwise, groupby falls back to groupByKey and agg_function.
         """
 
         self.name = name
         self.agg_function = agg_function
         self.default_col_name = default_col_name
         self.output_type = output_type
+        self.zero_function = zero_function
+        self.seq_function = seq_function
+        self.comb_function = comb_function
+        self.final_function = final_function or final_identity
+        self.parameterized = parameterized
 
     def get_output_type(self, input_type):
         candidate = self.output_type
@@ -182,6 +483,24 @@ class AggregatorPropertySet(object):
             return input_type[candidate]
         return candidate
 
+    def is_decomposable(self):
+        return self.zero_function is not None and \
+            self.seq_function is not None and \
+            self.comb_function is not None
+
+    def bind(self, params):
+        """
+        Return the aggregator property set of a parameterized aggregator,
+        with its functions bound to the given parameters.
+        """
+        def bound(fn):
+            if fn is None:
+                return None
+            return lambda *args: fn(*(args + (params,)))
+        return AggregatorPropertySet(self.name, bound(self.agg_function), self.default_col_name,
+                                     self.output_type, bound(self.zero_function), self.seq_function,
+                                     self.comb_function, bound(self.final_function))
+
 
 class AggregatorProperties(object):
     """ Manage aggregator properties for all known aggregators. """
@@ -191,26 +510,63 @@ class AggregatorProperties(object):
     def add(self, aggregator_property_set):
         self.aggregator_properties[aggregator_property_set.name] = aggregator_property_set
 
+    @staticmethod
+    def parse(op):
+        """
+        Split an operator into its name and its parameters, or None if it has none.
+        """
+        if not op.endswith(']') or '[' not in op:
+            return op, None
+        name, _, params = op[:-1].partition('[')
+        try:
+            return name, [float(param) for param in params.split(',') if param != '']
+        except ValueError:
+            raise ValueError('unrecognized aggregation operator parameters: {}'.format(op))
+
     def __getitem__(self, op):
-        if op not in self.aggregator_properties:
+        name, params = self.parse(op)
+        if name not in self.aggregator_properties:
+            raise ValueError('unrecognized aggregation operator: {}'.format(op))
+        prop = self.aggregator_properties[name]
+        if prop.parameterized != (params is not None):
             raise ValueError('unrecognized aggregation operator: {}'.format(op))
-        return self.aggregator_properties[op]
+        return prop.bind(params) if params is not None else prop
 
 aggregator_properties = AggregatorProperties()
 
-aggregator_properties.add(AggregatorPropertySet('__builtin__sum__', agg_sum, 'sum', int))
-aggregator_properties.add(AggregatorPropertySet('__builtin__argmax__', agg_argmax, 'argmax', 1))
-aggregator_properties.add(AggregatorPropertySet('__builtin__argmin__', agg_argmin, 'argmin', 1))
-aggregator_properties.add(AggregatorPropertySet('__builtin__max__', agg_max, 'max', 0))
-aggregator_properties.add(AggregatorPropertySet('__builtin__min__', agg_min, 'min', 0))
-aggregator_properties.add(AggregatorPropertySet('__builtin__count__', agg_count, 'count', int))
-aggregator_properties.add(AggregatorPropertySet('__builtin__avg__', agg_avg, 'avg', float))
-aggregator_properties.add(AggregatorPropertySet('__builtin__mean__', agg_avg, 'mean', float))
-aggregator_properties.add(AggregatorPropertySet('__builtin__var__', agg_var, 'var', float))
-aggregator_properties.add(AggregatorPropertySet('__builtin__variance__', agg_var, 'variance', float))
-aggregator_properties.add(AggregatorPropertySet('__builtin__std__', agg_std, 'std', float))
-aggregator_properties.add(AggregatorPropertySet('__builtin__stdv__', agg_std, 'stdv', float))
-aggregator_properties.add(AggregatorPropertySet('__builtin__select_one__', agg_select_one, 'select_one', 0))
+aggregator_properties.add(AggregatorPropertySet('__builtin__sum__', agg_sum, 'sum', int,
+                                                zero_none, seq_sum, comb_sum))
+aggregator_properties.add(AggregatorPropertySet('__builtin__argmax__', agg_argmax, 'argmax', 1,
+                                                zero_none, seq_argmax, comb_argmax, final_arg))
+aggregator_properties.add(AggregatorPropertySet('__builtin__argmin__', agg_argmin, 'argmin', 1,
+                                                zero_none, seq_argmin, comb_argmin, final_arg))
+aggregator_properties.add(AggregatorPropertySet('__builtin__max__', agg_max, 'max', 0,
+                                                zero_none, seq_max, comb_max))
+aggregator_properties.add(AggregatorPropertySet('__builtin__min__', agg_min, 'min', 0,
+                                                zero_none, seq_min, comb_min))
+aggregator_properties.add(AggregatorPropertySet('__builtin__count__', agg_count, 'count', int,
+                                                zero_count, seq_count, comb_count))
+aggregator_properties.add(AggregatorPropertySet('__builtin__avg__', agg_avg, 'avg', float,
+                                                zero_avg, seq_avg, comb_avg, final_avg))
+aggregator_properties.add(AggregatorPropertySet('__builtin__mean__', agg_avg, 'mean', float,
+                                                zero_avg, seq_avg, comb_avg, final_avg))
+aggregator_properties.add(AggregatorPropertySet('__builtin__var__', agg_var, 'var', float,
+                                                zero_moments, seq_moments, comb_moments, final_var))
+aggregator_properties.add(AggregatorPropertySet('__builtin__variance__', agg_var, 'variance', float,
+                                                zero_moments, seq_moments, comb_moments, final_var))
+aggregator_properties.add(AggregatorPropertySet('__builtin__std__', agg_std, 'std', float,
+                                                zero_moments, seq_moments, comb_moments, final_std))
+aggregator_properties.add(AggregatorPropertySet('__builtin__stdv__', agg_std, 'stdv', float,
+                                                zero_moments, seq_moments, comb_moments, final_std))
+aggregator_properties.add(AggregatorPropertySet('__builtin__select_one__', agg_select_one, 'select_one', 0,
+                                                zero_none, seq_select_one, comb_select_one))
 aggregator_properties.add(AggregatorPropertySet('__builtin__concat__list__', agg_concat_list, 'concat', list))
 aggregator_properties.add(AggregatorPropertySet('__builtin__concat__dict__', agg_concat_dict, 'concat', dict))
-aggregator_properties.add(AggregatorPropertySet('__builtin__quantile__', agg_quantile, 'quantile', float))
+aggregator_properties.add(AggregatorPropertySet('__builtin__approx_count_distinct__', agg_approx_count_distinct,
+                                                'approx_count_distinct', int,
+                                                zero_approx_count_distinct, seq_approx_count_distinct,
+                                                comb_approx_count_distinct, final_approx_count_distinct,
+                                                parameterized=True))
+aggregator_properties.add(AggregatorPropertySet('__builtin__quantile__', agg_quantile, 'quantile', list,
+                                                zero_quantile, seq_quantile, comb_quantile, final_quantile,
+                                                parameterized=True))
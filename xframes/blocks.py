@@ -0,0 +1,227 @@
+"""
+Apply XArray operators to whole partitions using numpy.
+
+A partition of a numeric XArray is converted into a numpy array once, and the operator
+is applied to the array as a whole.  This is only done when the numpy result is exactly
+the same as applying the python operator to each element:
+
+* the partition must convert to an int64 array (for int XArrays) or a float64 array
+  (for float XArrays), so it has no missing values and no values of another type
+* int arithmetic is done only when the operands are small enough that int64 cannot overflow
+* division is done only when there are no zero divisors, and follows python 2:
+  floor division for ints and true division otherwise
+
+Otherwise, the partition is processed element by element with the python operator, which
+raises the same errors as before.  If numpy is not available, every partition is
+processed element by element.
+"""
+
+import operator
+
+from xframes.deps import HAS_NUMPY
+
+if HAS_NUMPY:
+    import numpy
+
+# Ints smaller than this in magnitude can be added, subtracted, or multiplied
+#  in int64 without overflow.
+_INT_SAFE = 2 ** 31
+
+_ARITHMETIC_OPS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.div,
+}
+
+_COMPARISON_OPS = {
+    '<': operator.lt,
+    '>': operator.gt,
+    '<=': operator.le,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+_UNARY_OPS = {
+    '-': operator.neg,
+    'abs': operator.abs,
+}
+
+_BLOCK_KINDS = {int: 'i', float: 'f'}
+
+
+def can_vectorize(elem_type, op, unary=False):
+    """
+    True if the operator can be applied to numpy blocks of the given element type.
+    """
+    if not HAS_NUMPY or elem_type not in _BLOCK_KINDS:
+        return False
+    if unary:
+        return op in _UNARY_OPS
+    return op in _ARITHMETIC_OPS or op in _COMPARISON_OPS
+
+
+def _to_block(values, elem_type):
+    # Returns None if the values do not make an array of the expected kind.
+    if len(values) == 0:
+        return None
+    try:
+        block = numpy.array(values)
+    except (OverflowError, ValueError, TypeError):
+        return None
+    if block.ndim != 1 or block.dtype.kind != _BLOCK_KINDS[elem_type]:
+        return None
+    return block
+
+
+def _scalar_ok(val):
+    if isinstance(val, bool):
+        return False
+    if isinstance(val, float):
+        return True
+    return isinstance(val, (int, long)) and -_INT_SAFE < val < _INT_SAFE
+
+
+def _is_int(operand):
+    if isinstance(operand, numpy.ndarray):
+        return operand.dtype.kind == 'i'
+    return isinstance(operand, (int, long))
+
+
+def _in_safe_range(operand):
+    if isinstance(operand, numpy.ndarray):
+        if operand.dtype.kind != 'i':
+            return True
+        return operand.max() < _INT_SAFE and operand.min() > -_INT_SAFE
+    return True
+
+
+def _binary_block(left, right, op):
+    # Returns the result block, or None if numpy would not give the python result.
+    if not (_in_safe_range(left) and _in_safe_range(right)):
+        return None
+    if op in _COMPARISON_OPS:
+        return _COMPARISON_OPS[op](left, right)
+    if op == '/':
+        if numpy.any(numpy.asarray(right) == 0):
+            return None
+        if _is_int(left) and _is_int(right):
+            return numpy.floor_divide(left, right)
+        return numpy.true_divide(left, right)
+    return _ARITHMETIC_OPS[op](left, right)
+
+
+def _python_binary_op(op):
+    if op in _COMPARISON_OPS:
+        return _COMPARISON_OPS[op]
+    return _ARITHMETIC_OPS[op]
+
+
+def scalar_op_partition(elem_type, scalar, op, scalar_on_left=False):
+    """
+    Build a function that applies a scalar operator to a partition.
+
+    Parameters
+    ----------
+    elem_type : type
+        The element type of the XArray.
+
+    scalar : int | float
+        The scalar operand.
+
+    op : str
+        The operator.
+
+    scalar_on_left : bool, optional
+        If True, the scalar is the left operand.
+
+    Returns
+    -------
+    out : function(values)
+        A function suitable for mapPartitions.
+    """
+    python_op = _python_binary_op(op)
+    if scalar_on_left:
+        def python_fn(x):
+            return python_op(scalar, x)
+    else:
+        def python_fn(x):
+            return python_op(x, scalar)
+
+    def apply_partition(values):
+        values = list(values)
+        block = _to_block(values, elem_type) if _scalar_ok(scalar) else None
+        if block is not None:
+            if scalar_on_left:
+                res = _binary_block(scalar, block, op)
+            else:
+                res = _binary_block(block, scalar, op)
+            if res is not None:
+                return res.tolist()
+        return [python_fn(x) for x in values]
+    return apply_partition
+
+
+def vector_op_partition(left_type, right_type, op):
+    """
+    Build a function that applies an operator to a partition of zipped pairs.
+
+    Parameters
+    ----------
+    left_type : type
+        The element type of the left XArray.
+
+    right_type : type
+        The element type of the right XArray.
+
+    op : str
+        The operator.
+
+    Returns
+    -------
+    out : function(pairs)
+        A function suitable for mapPartitions.
+    """
+    python_op = _python_binary_op(op)
+
+    def apply_partition(pairs):
+        pairs = list(pairs)
+        if len(pairs) > 0:
+            lefts, rights = zip(*pairs)
+            left = _to_block(list(lefts), left_type)
+            right = _to_block(list(rights), right_type) if left is not None else None
+            if right is not None:
+                res = _binary_block(left, right, op)
+                if res is not None:
+                    return res.tolist()
+        return [python_op(x, y) for x, y in pairs]
+    return apply_partition
+
+
+def unary_op_partition(elem_type, op):
+    """
+    Build a function that applies a unary operator to a partition.
+
+    Parameters
+    ----------
+    elem_type : type
+        The element type of the XArray.
+
+    op : str
+        The operator: '-' or 'abs'.
+
+    Returns
+    -------
+    out : function(values)
+        A function suitable for mapPartitions.
+    """
+    python_op = _UNARY_OPS[op]
+
+    def apply_partition(values):
+        values = list(values)
+        block = _to_block(values, elem_type)
+        if block is not None and _in_safe_range(block):
+            return python_op(block).tolist()
+        return [python_op(x) for x in values]
+    return apply_partition
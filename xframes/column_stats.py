@@ -0,0 +1,162 @@
+"""
+Summary statistics of columns, computed in a single pass.
+
+A ColumnStats accumulates every statistic of one column at once, so any combination
+of statistics over any number of columns costs one treeAggregate job.
+
+Missing values (None and nan) are counted in 'count' and 'missing', and are skipped by
+all the other statistics.  The numeric statistics are computed only for numeric columns,
+and are None otherwise.  The mean and variance use the same algorithm as the RDD stats
+functions, so they give the same results.  The sum, min, and max are kept as python
+values, so they are exact and of the column's type.
+"""
+
+from pyspark.statcounter import StatCounter
+
+from xframes.util import is_missing, is_numeric_type
+
+STATS = ['count', 'missing', 'min', 'max', 'sum', 'mean', 'var', 'std', 'nnz']
+
+
+class ColumnStats(object):
+    """ Accumulates the summary statistics of one column. """
+
+    def __init__(self, numeric):
+        self.numeric = numeric
+        self.count = 0
+        self.missing = 0
+        self.nnz = 0
+        self.total = 0
+        self.min_val = None
+        self.max_val = None
+        self.counter = StatCounter()
+
+    def add(self, value):
+        """
+        Add one value.  Returns self, so it is suitable as a seqOp.
+        """
+        self.count += 1
+        if is_missing(value):
+            self.missing += 1
+            return self
+        if value != 0:
+            self.nnz += 1
+        if self.numeric:
+            self.total += value
+            if self.min_val is None or value < self.min_val:
+                self.min_val = value
+            if self.max_val is None or value > self.max_val:
+                self.max_val = value
+            self.counter.merge(value)
+        return self
+
+    def merge(self, other):
+        """
+        Merge the statistics of another part of the column.  Returns self, so it is
+        suitable as a combOp.
+        """
+        self.count += other.count
+        self.missing += other.missing
+        self.nnz += other.nnz
+        self.total += other.total
+        if other.min_val is not None and (self.min_val is None or other.min_val < self.min_val):
+            self.min_val = other.min_val
+        if other.max_val is not None and (self.max_val is None or other.max_val > self.max_val):
+            self.max_val = other.max_val
+        self.counter.mergeStats(other.counter)
+        return self
+
+    def num_values(self):
+        """
+        The number of values that are not missing.
+        """
+        return self.count - self.missing
+
+    def get(self, stat, ddof=0):
+        """
+        Get one statistic.
+
+        Parameters
+        ----------
+        stat : str
+            One of the names in STATS.
+
+        ddof : int, optional
+            "delta degrees of freedom" for 'var' and 'std'.
+
+        Returns
+        -------
+        out : object
+            The value of the statistic, or None if it does not apply to the column or
+            there are not enough values.
+        """
+        if stat == 'count':
+            return self.count
+        if stat == 'missing':
+            return self.missing
+        if stat == 'nnz':
+            return self.nnz
+        if not self.numeric or self.num_values() <= 0:
+            return None
+        if stat == 'min':
+            return self.min_val
+        if stat == 'max':
+            return self.max_val
+        if stat == 'sum':
+            return self.total
+        if stat == 'mean':
+            return self.counter.mean()
+        if self.num_values() <= ddof:
+            return None
+        if stat == 'var':
+            return self.counter.variance() if ddof == 0 else self.counter.sampleVariance()
+        if stat == 'std':
+            return self.counter.stdev() if ddof == 0 else self.counter.sampleStdev()
+        raise ValueError('Unknown statistic: {}.'.format(stat))
+
+
+def validate_stats(stats):
+    """
+    Check a list of statistic names, and return it.  All statistics are selected if
+    stats is None.
+    """
+    if stats is None:
+        return list(STATS)
+    if isinstance(stats, basestring):
+        stats = [stats]
+    for stat in stats:
+        if stat not in STATS:
+            raise ValueError('Unknown statistic: {}.'.format(stat))
+    return list(stats)
+
+
+def aggregate_values(rdd, elem_type):
+    """
+    Compute the statistics of an RDD of values in one pass.
+
+    Returns a ColumnStats.
+    """
+    zero = ColumnStats(is_numeric_type(elem_type))
+    return rdd.treeAggregate(zero,
+                             lambda acc, value: acc.add(value),
+                             lambda acc1, acc2: acc1.merge(acc2))
+
+
+def aggregate_rows(rdd, column_types):
+    """
+    Compute the statistics of every column of an RDD of rows in one pass.
+
+    Returns a list of ColumnStats, one for each column.
+    """
+    def add_row(accs, row):
+        for acc, value in zip(accs, row):
+            acc.add(value)
+        return accs
+
+    def merge_rows(accs1, accs2):
+        for acc1, acc2 in zip(accs1, accs2):
+            acc1.merge(acc2)
+        return accs1
+
+    zero = [ColumnStats(is_numeric_type(column_type)) for column_type in column_types]
+    return rdd.treeAggregate(zero, add_row, merge_rows)
@@ -0,0 +1,107 @@
+"""
+Columnar storage for the partitions of an XFrame.
+
+Each partition is held as a single ColumnBlock, which stores one container per column.
+Int and float columns are stored in an array.array, when every value in the partition
+is of exactly that type.  All other columns are stored in a list.
+
+Selecting, removing, or reordering columns only rearranges the column containers,
+so the cost does not depend on the number of rows.
+"""
+
+import array
+import itertools
+
+# array.array typecodes for the column types that can be packed.
+_TYPECODES = {int: 'l', float: 'd'}
+
+
+def make_column(values, column_type):
+    """
+    Store the values of one column of a partition.
+
+    Parameters
+    ----------
+    values : list
+        The column values.
+
+    column_type : type
+        The column type.
+
+    Returns
+    -------
+    out : array.array | list
+        An array.array if the values can be packed without changing any of them,
+        otherwise the list of values.
+    """
+    typecode = _TYPECODES.get(column_type)
+    if typecode is not None and set(map(type, values)) <= {column_type}:
+        try:
+            return array.array(typecode, values)
+        except OverflowError:
+            pass
+    return values
+
+
+class ColumnBlock(object):
+    """ The rows of one partition, stored by column. """
+
+    def __init__(self, columns, num_rows):
+        self.columns = columns
+        self.num_rows = num_rows
+
+    @staticmethod
+    def from_rows(rows, column_types):
+        """
+        Build a block from an iterable of row tuples.
+        """
+        rows = list(rows)
+        if len(rows) == 0:
+            columns = [[] for _ in column_types]
+        else:
+            columns = [make_column(list(values), column_type)
+                       for values, column_type in zip(zip(*rows), column_types)]
+        return ColumnBlock(columns, len(rows))
+
+    def rows(self):
+        """
+        Iterate over the rows of the block, as tuples.
+        """
+        if len(self.columns) == 0:
+            return itertools.repeat((), self.num_rows)
+        return itertools.izip(*self.columns)
+
+    def column(self, index):
+        return self.columns[index]
+
+    def select(self, indexes):
+        """
+        Returns a block containing only the given columns, in the given order.
+        """
+        return ColumnBlock([self.columns[i] for i in indexes], self.num_rows)
+
+    def add(self, column):
+        """
+        Returns a block with a column added at the end.
+        """
+        return ColumnBlock(self.columns + [column], self.num_rows)
+
+
+def rows_to_blocks(column_types):
+    """
+    Build a function that converts a partition of rows into a single ColumnBlock.
+    Suitable for mapPartitions.
+    """
+    def to_block(rows):
+        return [ColumnBlock.from_rows(rows, column_types)]
+    return to_block
+
+
+def values_to_columns(column_type):
+    """
+    Build a function that converts a partition of values into a single column.
+    Suitable for mapPartitions.
+    """
+    def to_column(values):
+        return [make_column(list(values), column_type)]
+    return to_column
@@ -0,0 +1,176 @@
+"""
+The columnar storage format for saved XFrames.
+
+Each partition is saved as one chunk.  A chunk holds the number of rows, the encoded
+bytes of each column, and the min and max of each column.  Each column is encoded on
+its own, so loading a subset of the columns decodes only those columns.
+
+Columns are encoded in one of three ways:
+
+packed
+    An int or float column with no missing values is stored as the bytes of an
+    array.array, using the smallest int typecode that holds every value.
+
+dict
+    A str or unicode column with few distinct values is stored as the list of
+    distinct values and a packed array of codes.
+
+plain
+    Anything else is stored as the pickled list of values.
+
+The `_metadata` and `_lineage` files are saved alongside the chunks, as they are for the
+row format.  A `_format` file records which format the chunks are in: xframes saved in
+the row format do not have one.
+"""
+
+import array
+import cPickle
+
+from xframes.columnar import ColumnBlock
+from xframes.util import is_missing
+
+FORMAT = 'columnar'
+VERSION = 1
+
+# int typecodes, from smallest to largest
+_INT_TYPECODES = ['b', 'h', 'i', 'l']
+
+# strings are dictionary encoded if there are at most this many distinct values,
+#  and at most half as many as there are rows
+_MAX_DICT_SIZE = 1 << 15
+
+
+def _int_typecode(values):
+    """
+    The smallest typecode that holds every value, or None if none do.
+    """
+    lo = min(values)
+    hi = max(values)
+    for typecode in _INT_TYPECODES:
+        bits = array.array(typecode).itemsize * 8 - 1
+        if -(1 << bits) <= lo and hi < (1 << bits):
+            return typecode
+    return None
+
+
+def _index_typecode(size):
+    for typecode in _INT_TYPECODES:
+        if size < (1 << (array.array(typecode).itemsize * 8 - 1)):
+            return typecode
+    return 'l'
+
+
+def encode_column(values, column_type):
+    """
+    Encode the values of one column of a partition.
+
+    Parameters
+    ----------
+    values : list | array.array
+        The column values.
+
+    column_type : type
+        The column type.
+
+    Returns
+    -------
+    out : tuple
+        The encoding name, followed by the encoded data.
+    """
+    if isinstance(values, array.array):
+        if values.typecode == 'l' and len(values) > 0:
+            typecode = _int_typecode(values)
+            if typecode != 'l':
+                values = array.array(typecode, values)
+        return 'packed', values.typecode, values.tostring()
+
+    if column_type in (str, unicode) and len(values) > 0:
+        distinct = {}
+        for value in values:
+            if value not in distinct:
+                if len(distinct) >= _MAX_DICT_SIZE or len(distinct) * 2 >= len(values):
+                    break
+                distinct[value] = len(distinct)
+        else:
+            codes = array.array(_index_typecode(len(distinct)), [distinct[value] for value in values])
+            dictionary = [None] * len(distinct)
+            for value, code in distinct.iteritems():
+                dictionary[code] = value
+            return 'dict', dictionary, codes.typecode, codes.tostring()
+
+    return 'plain', list(values)
+
+
+def decode_column(encoded, column_type):
+    """
+    Decode a column encoded by encode_column.
+
+    Returns an array.array for packed int and float columns, otherwise a list.
+    """
+    encoding = encoded[0]
+    if encoding == 'packed':
+        typecode, data = encoded[1:]
+        values = array.array(typecode)
+        values.fromstring(data)
+        if typecode in _INT_TYPECODES and typecode != 'l':
+            # widen, so the block matches one built by make_column
+            values = array.array('l', values)
+        return values
+    if encoding == 'dict':
+        dictionary, typecode, data = encoded[1:]
+        codes = array.array(typecode)
+        codes.fromstring(data)
+        return [dictionary[code] for code in codes]
+    if encoding == 'plain':
+        return encoded[1]
+    raise ValueError('Unknown column encoding: {}.'.format(encoding))
+
+
+def column_min_max(values, column_type):
+    """
+    The min and max of the values that are not missing, or (None, None).
+
+    Only int, float, str, and unicode columns have statistics.
+    """
+    if column_type not in (int, float, str, unicode):
+        return None, None
+    if isinstance(values, array.array):
+        present = values
+    else:
+        present = [value for value in values if not is_missing(value)]
+    if len(present) == 0:
+        return None, None
+    return min(present), max(present)
+
+
+def encode_block(block, column_types):
+    """
+    Encode a ColumnBlock as a chunk.
+
+    Returns (num_rows, list of encoded column bytes, list of (min, max)).
+    """
+    columns = []
+    stats = []
+    for values, column_type in zip(block.columns, column_types):
+        columns.append(cPickle.dumps(encode_column(values, column_type), cPickle.HIGHEST_PROTOCOL))
+        stats.append(column_min_max(values, column_type))
+    return block.num_rows, columns, stats
+
+
+def decode_block(chunk, column_types, indexes):
+    """
+    Decode the selected columns of a chunk into a ColumnBlock.
+
+    Parameters
+    ----------
+    chunk : tuple
+        A chunk made by encode_block.
+
+    column_types : list[type]
+        The types of all the columns in the chunk.
+
+    indexes : list[int]
+        The positions of the columns to decode, in the order they are wanted.
+    """
+    num_rows, columns, _ = chunk
+    return ColumnBlock([decode_column(cPickle.loads(columns[i]), column_types[i]) for i in indexes], num_rows)
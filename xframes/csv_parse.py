@@ -0,0 +1,232 @@
+"""
+Parse csv files in a single pass.
+
+Each partition of lines goes through one line filter and the csv reader.  Each row
+is then cleaned, checked against the missing value markers, reduced to the columns that
+are kept, and cast, all in one loop.  The cast for each column is chosen once, when the
+row parser is built, rather than for each value.
+"""
+
+import ast
+import csv
+import datetime
+
+from dateutil import parser as date_parser
+
+# Builds the value stored for an empty field, by column type.
+_EMPTY_VALUES = {
+    int: lambda: 0,
+    float: lambda: 0.0,
+    str: lambda: '',
+    datetime.datetime: lambda: datetime.datetime(1, 1, 1),
+    dict: dict,
+    list: list,
+}
+
+
+def make_caster(typ, name):
+    """
+    Build the function that casts the fields of one column.
+
+    Parameters
+    ----------
+    typ : type
+        The column type.
+
+    name : str
+        The column name, used in error messages.
+
+    Returns
+    -------
+    out : function(str)
+        A function that converts a field to the column type.  Empty fields become
+        the empty value of the type.
+    """
+    if typ is str:
+        return lambda val: val
+
+    if typ in (dict, list):
+        convert = ast.literal_eval
+    elif typ is datetime.datetime:
+        convert = date_parser.parse
+    else:
+        convert = typ
+
+    empty_value = _EMPTY_VALUES.get(typ)
+
+    def cast(val):
+        if len(val) == 0 and empty_value is not None:
+            return empty_value()
+        try:
+            return convert(val)
+        except ValueError:
+            raise ValueError('Cast failed: ({}) {}  col: {}'.format(typ, val, name))
+        except TypeError:
+            raise TypeError('Cast failed: ({}) {}  col: {}'.format(typ, val, name))
+    return cast
+
+
+def clean_field(field):
+    """
+    Escape newlines in a field, and remove quotes around it.
+    """
+    if '\n' in field or '\r' in field:
+        field = field.replace('\n', '\\n').replace('\r', '\\r')
+    if len(field) > 0 and field[0] in '"\'' and field[-1] == field[0]:
+        return field[1: -1]
+    return field
+
+
+def make_row_parser(types, names, na_values, keep_cols):
+    """
+    Build the function that turns the fields of a csv row into an XFrame row.
+
+    Parameters
+    ----------
+    types : list[type]
+        The type of each column that is kept.
+
+    names : list[str]
+        The name of each column that is kept.
+
+    na_values : list[str]
+        Fields equal to any of these are stored as None.
+
+    keep_cols : list[int]
+        The positions, in the csv row, of the columns that are kept.
+
+    Returns
+    -------
+    out : function(list[str])
+        A function that returns a tuple of the cleaned and cast values of the
+        kept columns.
+    """
+    na_values = frozenset(val for val in na_values if val is not None)
+    columns = [(index, make_caster(typ, name)) for index, typ, name in zip(keep_cols, types, names)]
+
+    def parse_row(row):
+        values = []
+        for index, cast in columns:
+            val = clean_field(row[index])
+            values.append(None if val in na_values else cast(val))
+        return tuple(values)
+    return parse_row
+
+
+def make_row_caster(types, names):
+    """
+    Build the function that casts a row of parsed strings.
+
+    Parameters
+    ----------
+    types : list[type]
+        The type of each column.
+
+    names : list[str]
+        The name of each column, used in error messages.
+
+    Returns
+    -------
+    out : function(tuple)
+        A function that returns the row with each value cast to its column type.
+        Missing values stay None.
+    """
+    columns = [(index, make_caster(typ, name))
+               for index, (typ, name) in enumerate(zip(types, names)) if typ is not str]
+
+    def cast_row(row):
+        values = list(row)
+        for index, cast in columns:
+            if values[index] is not None:
+                values[index] = cast(values[index])
+        return tuple(values)
+    return cast_row
+
+
+def clean_lines(lines, comment_char, current):
+    """
+    Prepare the lines of a partition for the csv reader.
+
+    Encodes unicode lines as utf-8, removes a utf-8 byte order mark, and strips comments.
+    The last line read is kept in current[0], so errors can report it.
+    """
+    for line in lines:
+        if not isinstance(line, str):
+            line = line.encode('utf-8')
+        current[0] = line
+        if line.startswith('\xef\xbb\xbf') and len(line) > 3:
+            line = line[3:]
+        if comment_char:
+            line = line.partition(comment_char)[0].rstrip()
+        yield line
+
+
+def parse_header(line, params, comment_char):
+    """
+    Parse the first line of the file.
+
+    Returns ('data', list of cleaned fields) or ('csv', line) if it cannot be parsed.
+    """
+    current = [line]
+    reader = csv.reader(clean_lines([line], comment_char, current), **params)
+    try:
+        for row in reader:
+            return 'data', [clean_field(field) for field in row]
+    except (csv.Error, SystemError):
+        pass
+    return 'csv', current[0]
+
+
+def parse_partition(lines, params, comment_char, num_columns, header, parse_row, tagged):
+    """
+    Parse the lines of one partition into XFrame rows.
+
+    Parameters
+    ----------
+    lines : iterable of str
+        The lines of the partition.
+
+    params : dict
+        Parameters for the csv reader.
+
+    comment_char : str
+        Text after this character is ignored.
+
+    num_columns : int
+        Rows with a different number of fields are errors.
+
+    header : list[str]
+        If not None, rows that match the header are skipped.
+
+    parse_row : function
+        The row parser built by make_row_parser.
+
+    tagged : bool
+        If True, yield ('data', row) for each row, ('width', line) for rows with the
+        wrong number of fields, and ('csv', line) if the csv reader fails.
+        If False, yield only the rows.
+
+    Returns
+    -------
+    out : generator
+    """
+    current = [None]
+    reader = csv.reader(clean_lines(lines, comment_char, current), **params)
+    header_start = header[:1] if header is not None else None
+    try:
+        for row in reader:
+            if len(row) != num_columns:
+                if tagged:
+                    yield 'width', current[0]
+                continue
+            # compare the first field before cleaning the whole row
+            if header is not None and [clean_field(field) for field in row[:1]] == header_start and \
+                    [clean_field(field) for field in row] == header:
+                continue
+            if tagged:
+                yield 'data', parse_row(row)
+            else:
+                yield parse_row(row)
+    except (csv.Error, SystemError):
+        if tagged:
+            yield 'csv', current[0]
@@ -0,0 +1,273 @@
+"""
+XFrame operations carried out on a spark DataFrame.
+
+An XFrameImpl that is backed by a DataFrame runs these operations in spark sql, without
+converting its rows into python.  Each function returns None when the operation cannot be
+expressed exactly as a DataFrame operation, and the caller then falls back to its RDD.
+
+Column names containing '.' or '`' are not handled here, since spark would parse them.
+"""
+
+import datetime
+import operator
+
+from pyspark.sql import Column
+from pyspark.sql import functions
+
+from xframes.aggregator_impl import AggregatorProperties
+
+# Builds the dataframe condition for each predicate op accepted by the readers.
+PREDICATE_OPS = {
+    '==': lambda col, value: col.isNull() if value is None else col == value,
+    '!=': lambda col, value: col.isNotNull() if value is None else col != value,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda col, value: col.isin(*list(value)),
+}
+
+# The spark function for each builtin aggregator that has an exact equivalent.
+# Count has no source column, so it is handled separately.
+_AGGREGATE_FUNCTIONS = {
+    '__builtin__sum__': 'sum',
+    '__builtin__max__': 'max',
+    '__builtin__min__': 'min',
+    '__builtin__avg__': 'avg',
+    '__builtin__mean__': 'avg',
+    '__builtin__var__': 'var_pop',
+    '__builtin__variance__': 'var_pop',
+    '__builtin__std__': 'stddev_pop',
+    '__builtin__stdv__': 'stddev_pop',
+}
+
+# Types that spark compares, groups, and joins the same way python does.
+_KEY_TYPES = (int, long, float, str, unicode, bool, datetime.datetime)
+_NUMERIC_TYPES = (int, long, float)
+_ORDERED_TYPES = (int, long, float, str, unicode)
+
+_LITERAL_TYPES = (int, long, float, basestring, bool)
+
+# the relative errors that spark's HyperLogLog++ accepts
+_MIN_RSD = 0.002
+_MAX_RSD = 0.39
+
+
+def names_supported(names):
+    """
+    True if all the column names can be used in DataFrame column references.
+    """
+    return all(['.' not in name and '`' not in name for name in names])
+
+
+def select_dataframe(dataframe, columns, predicates):
+    """
+    Apply a projection and comparison predicates to a spark dataframe.
+
+    These are applied before the dataframe is converted, so spark can push them
+    into the reader of the data source.
+
+    Parameters
+    ----------
+    dataframe : spark.DataFrame
+
+    columns : list[str]
+        The columns to keep, in order.  If None, all columns are kept.
+
+    predicates : tuple | list[tuple]
+        A predicate, or a list of predicates that must all be true.  Each predicate
+        is (column, op, value), where op is one of: ==, !=, <, <=, >, >=, in.
+        Comparing to None with == or != tests for null.
+    """
+    available = dataframe.columns
+    for col in columns or []:
+        if col not in available:
+            raise ValueError("Column '{}' not in data.".format(col))
+    if predicates is not None:
+        if isinstance(predicates, tuple):
+            predicates = [predicates]
+        for predicate in predicates:
+            if not isinstance(predicate, tuple) or len(predicate) != 3:
+                raise TypeError('Predicate must be a (column, op, value) tuple.')
+            col, op, value = predicate
+            if col not in available:
+                raise ValueError("Column '{}' not in data.".format(col))
+            if op not in PREDICATE_OPS:
+                raise ValueError('Predicate op must be one of: {}.'.format(', '.join(sorted(PREDICATE_OPS))))
+            dataframe = dataframe.filter(PREDICATE_OPS[op](dataframe[col], value))
+    if columns is not None:
+        dataframe = dataframe.select(*columns)
+    return dataframe
+
+
+def _comparable(value, column_type):
+    """
+    True if spark compares the value with values of the column type as python does,
+    without implicit casts: numbers with numbers, strings with strings, and bools
+    with bools.
+    """
+    if not isinstance(column_type, type):
+        return False
+    if isinstance(value, bool) or issubclass(column_type, bool):
+        return isinstance(value, bool) and issubclass(column_type, bool)
+    if issubclass(column_type, _NUMERIC_TYPES):
+        return isinstance(value, _NUMERIC_TYPES)
+    if issubclass(column_type, basestring):
+        return isinstance(value, basestring)
+    return False
+
+
+def filter_values(dataframe, column_name, column_type, values, exclude):
+    """
+    Keep the rows whose value in the column is in values, or not in values if exclude.
+
+    Missing values are kept only by exclude, as they are by the python filter.
+    """
+    values = list(values)
+    if len(values) == 0 or not names_supported([column_name]):
+        return None
+    if not all([isinstance(value, _LITERAL_TYPES) and value == value and _comparable(value, column_type)
+                for value in values]):
+        # None, nan, and values spark would cast before comparing are handled in python
+        return None
+    col = dataframe[column_name]
+    if exclude:
+        return dataframe.filter(~col.isin(*values) | col.isNull())
+    return dataframe.filter(col.isin(*values))
+
+
+def aggregate(dataframe, key_names, key_types, group_columns, group_types, group_ops, output_names):
+    """
+    Group by the key columns, and compute builtin aggregates.
+
+    Parameters
+    ----------
+    key_names, key_types : list
+        The key columns and their types.
+
+    group_columns, group_types : list[list]
+        For each aggregate, the source columns and their types.
+
+    group_ops : list[str]
+        The aggregator for each aggregate.
+
+    output_names : list[str]
+        The names of the key columns followed by the names of the aggregates.
+    """
+    if not names_supported(key_names + output_names):
+        return None
+    if not all([issubclass(typ, _KEY_TYPES) for typ in key_types]):
+        return None
+    aggregates = []
+    for cols, types, op in zip(group_columns, group_types, group_ops):
+        if op == '__builtin__count__':
+            aggregates.append(functions.count(functions.lit(1)))
+            continue
+        name, params = AggregatorProperties.parse(op)
+        if name == '__builtin__approx_count_distinct__':
+            col, typ = cols[0], types[0]
+            if not hasattr(functions, 'approx_count_distinct') or not names_supported([col]):
+                return None
+            if typ is None or not issubclass(typ, _KEY_TYPES) or not _MIN_RSD <= params[0] <= _MAX_RSD:
+                return None
+            source = dataframe[col]
+            if typ is float:
+                if not hasattr(functions, 'nanvl'):
+                    return None
+                source = functions.nanvl(source, functions.lit(None).cast('double'))
+            aggregates.append(functions.approx_count_distinct(source, params[0]))
+            continue
+        function_name = _AGGREGATE_FUNCTIONS.get(op)
+        if function_name is None or not hasattr(functions, function_name):
+            return None
+        col, typ = cols[0], types[0]
+        if not names_supported([col]):
+            return None
+        allowed = _ORDERED_TYPES if function_name in ('max', 'min') else _NUMERIC_TYPES
+        if typ is None or not issubclass(typ, allowed) or typ is bool:
+            return None
+        source = dataframe[col]
+        if typ is float:
+            if not hasattr(functions, 'nanvl'):
+                return None
+            # python skips nan, spark does not
+            source = functions.nanvl(source, functions.lit(None).cast('double'))
+        aggregates.append(getattr(functions, function_name)(source))
+    key_count = len(key_names)
+    aggregates = [agg.alias(output_name) for agg, output_name in zip(aggregates, output_names[key_count:])]
+    grouped = dataframe.groupBy(*[dataframe[key_name] for key_name in key_names])
+    res = grouped.agg(*aggregates)
+    return res.select(*[res[key_name].alias(out) for key_name, out in zip(key_names, output_names[:key_count])] +
+                      [res[output_name] for output_name in output_names[key_count:]])
+
+
+def join(left, right, how, join_keys, left_names, key_types, right_keep_names):
+    """
+    Join two dataframes on equal keys.
+
+    Missing keys match each other, as they do in the python join.  In right and full
+    joins, the left key columns take the right key when there is no left row.
+
+    Parameters
+    ----------
+    join_keys : list[(str, str)]
+        Pairs of left and right key column names.
+
+    left_names : list[str]
+        All the left columns.
+
+    key_types : list[type]
+        The type of each key.
+
+    right_keep_names : list[str]
+        The right columns that are not keys, in order.
+    """
+    if how not in ('inner', 'left', 'right', 'full'):
+        return None
+    if not hasattr(Column, 'eqNullSafe'):
+        return None
+    if not all([issubclass(typ, _KEY_TYPES) for typ in key_types]):
+        return None
+    right_names = [right_key for _, right_key in join_keys] + right_keep_names
+    if not names_supported(left_names + right_names):
+        return None
+    # aliases keep the columns apart when both sides come from the same dataframe
+    left = left.alias('left')
+    right = right.alias('right')
+
+    def left_col(name):
+        return functions.col('left.' + name)
+
+    def right_col(name):
+        return functions.col('right.' + name)
+
+    condition = None
+    for left_key, right_key in join_keys:
+        equal = left_col(left_key).eqNullSafe(right_col(right_key))
+        condition = equal if condition is None else condition & equal
+    joined = left.join(right, condition, 'outer' if how == 'full' else how)
+
+    right_keys = dict(join_keys)
+    columns = []
+    for name in left_names:
+        if name in right_keys and how in ('right', 'full'):
+            columns.append(functions.coalesce(left_col(name), right_col(right_keys[name])).alias(name))
+        else:
+            columns.append(left_col(name).alias(name))
+    columns.extend([right_col(name).alias(name) for name in right_keep_names])
+    return joined.select(*columns)
+
+
+def sort(dataframe, column_names, column_types, ascending):
+    """
+    Sort by the given columns.  Missing values sort first when ascending and last
+    when descending, as they do in the python sort.
+    """
+    if not names_supported(column_names):
+        return None
+    if not all([issubclass(typ, _ORDERED_TYPES) and typ is not float for typ in column_types]):
+        # spark sorts nan above every number, python does not order it
+        return None
+    order = [dataframe[name].asc() if asc else dataframe[name].desc()
+             for name, asc in zip(column_names, ascending)]
+    return dataframe.orderBy(*order)
@@ -23,6 +23,9 @@ environment, like Spark.
 
 Modifications by Charles Hayden at Atigeo.
   Use array instead of list for counts.
+  Update and merge the counts with numpy, when it is available.  A whole batch of
+  values is hashed into index arrays, and the counts are added with numpy.add.at.
+  The hashes are the same as for single values, so the sketches can still be merged.
 """
 
 import sys
@@ -31,6 +34,14 @@ import array
 import itertools
 from math import isnan, ceil, log, e as euler
 
+from xframes.deps import HAS_NUMPY
+
+if HAS_NUMPY:
+    import numpy
+
+# values are hashed and counted this many at a time
+BATCH_SIZE = 10000
+
 
 def exp2(x):
     return 2. ** x
@@ -56,7 +67,10 @@ class CMSketch(object):
         self.width = width
         self.depth = depth
         self.hash_state = hash_state
-        self._counts = array.array('i', itertools.repeat(0, self.width * self.depth))
+        if HAS_NUMPY:
+            self._counts = numpy.zeros(self.width * self.depth, dtype=numpy.int32)
+        else:
+            self._counts = array.array('i', itertools.repeat(0, self.width * self.depth))
         self._masks = [CMSketch.generate_mask(n) for n in self.hash_state]
 
     def hash_index(self, row, column):
@@ -71,6 +85,27 @@ class CMSketch(object):
             j = hash(key) ^ mask
             self._counts[self.hash_index(i, j)] += 1
 
+    def increment_batch(self, keys):
+        """Increment counters for each hashable object in keys."""
+        if not HAS_NUMPY:
+            for key in keys:
+                self.increment(key)
+            return
+        self.increment_hashes(numpy.fromiter((hash(key) for key in keys), dtype=numpy.int64))
+
+    def increment_hashes(self, hashes):
+        """Increment counters for many keys, given an int64 array of hash(key).
+
+        Requires numpy.  Each row of the sketch gets one column for each key, and
+        all the counts are added at once.
+        """
+        if len(hashes) == 0:
+            return
+        masks = numpy.array(self._masks, dtype=numpy.int64)
+        columns = numpy.mod(hashes[numpy.newaxis, :] ^ masks[:, numpy.newaxis], self.width)
+        rows = numpy.arange(self.depth)[:, numpy.newaxis]
+        numpy.add.at(self._counts.reshape(self.depth, self.width), (rows, columns), 1)
+
     def get(self, key):
         """Get estimated count for hashable object key."""
         return min([self._counts[self.hash_index(i, hash(key) ^ mask)]
@@ -82,6 +117,9 @@ class CMSketch(object):
         The width, depth, and hash_state must be identical.
         """
         self._check_compatibility(other)
+        if HAS_NUMPY:
+            self._counts += numpy.asarray(other.counts(), dtype=self._counts.dtype)
+            return self
         for i in xrange(self.depth):
             for j in xrange(self.width):
                 ix = self.hash_index(i, j)
@@ -208,6 +246,27 @@ class QuantileAccumulator(object):
         for (level, sketch) in enumerate(self._sketches):
             key = QuantileAccumulator._index_at_level(normed_value, level)
             sketch.increment(key)
+
+    def increment_batch(self, values):
+        """Increment counters for each value in the domain in values.
+
+        The dyadic index of every value is computed at once for each level.  These
+        are small non-negative ints, whose hash is the int itself, so the sketches
+        are updated from the indexes directly.
+        """
+        if HAS_NUMPY:
+            normed = numpy.array([value for value in values if value is not None], dtype=numpy.float64)
+            normed = (normed[~numpy.isnan(normed)] - self.lower_bound) / float(self.norm)
+            # beyond this, the deepest indexes would no longer be their own hash
+            if len(normed) == 0 or normed.max() * exp2(self._num_levels) < 2 ** 62:
+                self.total += len(normed)
+                for (level, sketch) in enumerate(self._sketches):
+                    segment_size = exp2(-level)
+                    keys = numpy.where(normed <= 0., 0., numpy.ceil(normed / segment_size) - 1)
+                    sketch.increment_hashes(keys.astype(numpy.int64))
+                return
+        for value in values:
+            self.increment(value)
     
     def __call__(self, value_iterator):
         """Makes QuantileAccumulator usable with PySpark .mapPartitions().
@@ -221,8 +280,9 @@ class QuantileAccumulator(object):
             accums.reduce(lambda x, y: x.merge(y))
         
         """
-        for value in value_iterator:
-            self.increment(value)
+        value_iterator = iter(value_iterator)
+        for values in iter(lambda: list(itertools.islice(value_iterator, BATCH_SIZE)), []):
+            self.increment_batch(values)
         yield self
     
     def merge(self, other):
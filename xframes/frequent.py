@@ -5,6 +5,11 @@ import math
 import array
 import itertools
 
+from xframes.deps import HAS_NUMPY
+
+if HAS_NUMPY:
+    import numpy
+
 #
 #    This code is derived from that found on the webpage:
 #         http://tech.shareaholic.com/2012/12/03/the-count-min-sketch-how-to-count-over-large-keyspaces-when-about-right-is-good-enough/
@@ -12,9 +17,72 @@ import itertools
 #    Instead of maintaining both a heap and a dict, we use a single heapdict.
 #    The algorithm described above is used in each partition, and then the results are merged using
 #       the methods at the end.
+#    When numpy is available, a batch of keys is counted at once: each key is hashed once, the
+#       columns of all the rows are computed with exact uint64 arithmetic modulo BIG_PRIME, and the
+#       counts are added with numpy.add.at.  The columns are the same as for single keys, so
+#       sketches built either way can be merged.
 #
 BIG_PRIME = 9223372036854775783
 
+# keys are counted this many at a time
+BATCH_SIZE = 10000
+
+if HAS_NUMPY:
+    _PRIME = numpy.uint64(BIG_PRIME)
+    _MASK32 = numpy.uint64(0xffffffff)
+    _MASK63 = numpy.uint64((1 << 63) - 1)
+    _SHIFT32 = numpy.uint64(32)
+    _SHIFT63 = numpy.uint64(63)
+    # 2**63 - BIG_PRIME
+    _OVER63 = numpy.uint64(25)
+
+
+def _reduce(v):
+    """
+    Reduce a uint64 array modulo BIG_PRIME, using 2**63 = 25 (mod BIG_PRIME).
+    """
+    res = (v >> _SHIFT63) * _OVER63 + (v & _MASK63)
+    return numpy.where(res >= _PRIME, res - _PRIME, res)
+
+
+def _add_mod(u, v):
+    """
+    Add uint64 arrays whose values are less than BIG_PRIME, modulo BIG_PRIME.
+    """
+    return _reduce(u + v)
+
+
+def _times_50_mod(v):
+    """
+    Multiply a uint64 array whose values are less than BIG_PRIME by 50, modulo BIG_PRIME.
+    """
+    v2 = _add_mod(v, v)
+    v4 = _add_mod(v2, v2)
+    v8 = _add_mod(v4, v4)
+    v16 = _add_mod(v8, v8)
+    v25 = _add_mod(_add_mod(v16, v8), v)
+    return _add_mod(v25, v25)
+
+
+def _mul_mod(a, x):
+    """
+    Compute a * x modulo BIG_PRIME without overflow, for an int a and a uint64 array x
+    whose values are less than BIG_PRIME.
+
+    Both are split into 32 bit halves.  The partial products fit in 64 bits, and
+    2**64 = 50 (mod BIG_PRIME).
+    """
+    a_high = numpy.uint64(a >> 32)
+    a_low = numpy.uint64(a & 0xffffffff)
+    x_high = x >> _SHIFT32
+    x_low = x & _MASK32
+    high = a_high * x_high
+    middle = a_high * x_low + a_low * x_high
+    low = a_low * x_low
+    res = _times_50_mod(_add_mod(_reduce(high), middle >> _SHIFT32))
+    res = _add_mod(res, _reduce((middle & _MASK32) << _SHIFT32))
+    return _add_mod(res, _reduce(low))
+
 
 def _random_parameter():
     return random.randrange(0, BIG_PRIME - 1)
@@ -76,9 +144,25 @@ class FreqSketch(object):
         self.width = int(math.ceil(math.exp(1) / epsilon))
         self.depth = int(math.ceil(math.log(1 / delta)))
         self.hash_function_params = [_generate_hash_function_params() for _ in range(self.depth)]
-        self.count = array.array('i', itertools.repeat(0, self.depth * self.width))
+        if HAS_NUMPY:
+            self.count = numpy.zeros(self.depth * self.width, dtype=numpy.int32)
+        else:
+            self.count = array.array('i', itertools.repeat(0, self.depth * self.width))
         self.heap = HeapDict()
 
+    def __getstate__(self):
+        # the counts are kept as raw int32 values, so they load with or without numpy
+        state = dict(self.__dict__)
+        state['count'] = self.count.tostring()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if HAS_NUMPY:
+            self.count = numpy.frombuffer(state['count'], dtype=numpy.int32).copy()
+        else:
+            self.count = array.array('i', state['count'])
+
     def hash_index(self, row, column):
         return self.width * row + column
 
@@ -109,11 +193,56 @@ class FreqSketch(object):
         """
         self.update(key, 1)
 
+    def increment_batch(self, keys):
+        """
+        Increments the sketch for each item in keys.
+
+        With numpy, the counts for the whole batch are added at once, and then the heap
+        is updated once for each distinct key, with its estimate after the batch.
+
+        Parameters
+        ----------
+        keys : list
+            The items to update the value of in the sketch
+
+        Examples
+        --------
+        >>> s = FreqSketch(40, 0.005, 10**-7)
+        >>> s.increment_batch(['http://www.cnn.com/', 'http://www.bbc.co.uk/'])
+
+        """
+        if not HAS_NUMPY:
+            for key in keys:
+                self.increment(key)
+            return
+        if len(keys) == 0:
+            return
+        columns = self._hash_columns(numpy.array([abs(hash(key)) for key in keys], dtype=numpy.uint64))
+        rows = numpy.arange(self.depth)[:, numpy.newaxis]
+        counts = self.count.reshape(self.depth, self.width)
+        numpy.add.at(counts, (rows, columns), 1)
+        first = {}
+        for i, key in enumerate(keys):
+            first.setdefault(key, i)
+        estimates = counts[rows, columns[:, numpy.array(first.values())]].min(axis=0)
+        for key, estimate in zip(first.keys(), estimates.tolist()):
+            self._offer(key, estimate)
+
     def _hash_function(self, x, params):
         a, b = params
         res = (a * x + b) % BIG_PRIME % self.width
         return res
 
+    def _hash_columns(self, hashes):
+        """
+        The columns for a uint64 array of abs(hash(key)), one row of columns for each
+        row of the sketch.  These are the same as _hash_function gives.
+        """
+        hashes = _reduce(hashes)
+        width = numpy.uint64(self.width)
+        return numpy.array([_add_mod(_mul_mod(a, hashes), numpy.uint64(b)) % width
+                            for a, b in self.hash_function_params], dtype=numpy.int64)
+
     def _update_sketch(self, key, increment):
         for row, hash_function_params in enumerate(self.hash_function_params):
             column = self._hash_function(abs(hash(key)), hash_function_params)
@@ -155,8 +284,9 @@ class FreqSketch(object):
             The item to check against the heap
 
         """
-        estimate = self.get(key)
+        self._offer(key, self.get(key))
 
+    def _offer(self, key, estimate):
         # smallest element is found by peekitem()
         if len(self.heap) < self.k or estimate >= self.heap.peekitem()[1][0]:
             self.heap[key] = [estimate, key]
@@ -191,7 +321,36 @@ class FreqSketch(object):
             column = self._hash_function(abs(hash(key)), hash_function_params)
             value = min(self.count[self.hash_index(row, column)], value)
 
-        return value
+        return int(value)
+
+    def merge(self, other):
+        """
+        Merge another FreqSketch into this one.
+
+        The counts are added, and the top items are chosen again from the items
+        in either heap, using the merged counts.
+
+        Parameters
+        ----------
+        other : FreqSketch
+            A sketch with the same k, epsilon, delta, and seed.
+
+        Returns
+        -------
+        out : FreqSketch
+            This sketch.
+        """
+        self._check_compatibility(other)
+        if HAS_NUMPY:
+            self.count += numpy.asarray(other.count, dtype=self.count.dtype)
+        else:
+            for i in xrange(len(self.count)):
+                self.count[i] += other.count[i]
+        keys = set(self.heap.keys()) | set(other.heap.keys())
+        self.heap = HeapDict()
+        for key in keys:
+            self.update_heap(key)
+        return self
 
     def frequent_items(self):
         """
@@ -213,8 +372,9 @@ class FreqSketch(object):
         value_iterator : iterator
             Produces the values whose frequency is to be counted.
         """
-        for value in value_iterator:
-            self.increment(value)
+        value_iterator = iter(value_iterator)
+        for values in iter(lambda: list(itertools.islice(value_iterator, BATCH_SIZE)), []):
+            self.increment_batch(values)
         yield self
 
     @staticmethod
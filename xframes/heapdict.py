@@ -1,4 +1,5 @@
 import collections
+import heapq
 
 # This file derived from
 #   https://pypi.python.org/pypi/HeapDict.
@@ -120,5 +121,39 @@ class HeapDict(collections.MutableMapping):
         """
         return (self.heap[0][1], self.heap[0][0])
 
+
+class BoundedHeap(object):
+    """
+    Keeps the n largest items pushed into it.
+
+    Items must be comparable.  Each push costs at most O(log n), and an item
+    smaller than all of the n items already kept costs only one comparison.
+    """
+    def __init__(self, n, items=None):
+        self.n = n
+        self.heap = []
+        if items:
+            for item in items:
+                self.push(item)
+
+    def push(self, item):
+        if len(self.heap) < self.n:
+            heapq.heappush(self.heap, item)
+        elif self.n > 0 and item > self.heap[0]:
+            heapq.heapreplace(self.heap, item)
+
+    def merge(self, other):
+        """ Adds the items kept by another BoundedHeap. """
+        for item in other.heap:
+            self.push(item)
+        return self
+
+    def items(self):
+        """ The items kept, largest first. """
+        return sorted(self.heap, reverse=True)
+
+    def __len__(self):
+        return len(self.heap)
+
 del doc
-__all__ = ['heapdict']
+__all__ = ['heapdict', 'BoundedHeap']
@@ -0,0 +1,204 @@
+"""
+HyperLogLog estimates of the number of distinct values.
+
+The sketch keeps one small register for each of 2**precision buckets.  Each value is
+hashed to 64 bits: the first precision bits choose the register, and the register keeps
+the largest position of the first one bit seen in the rest of the hash.  The estimate
+is computed from the harmonic mean of the registers, and small cardinalities use linear
+counting over the empty registers.
+
+As in HyperLogLog++, a sketch starts out sparse: it keeps only the registers that have
+been set, using 25 bits of the hash to choose them, which is both smaller and more
+accurate while there are few distinct values.  It switches to the dense registers when
+the sparse ones would take more room.  So a sketch of a small group stays small, and
+no sketch is ever larger than the dense registers.
+
+Sketches made with the same precision can be merged, so a sketch can be built for each
+partition and the partial sketches combined.  The dense memory use is fixed: one byte
+for each register.  The relative standard error is about 1.04 / sqrt(2**precision).
+
+References
+----------
+- Flajolet, et al. (2007) `HyperLogLog: the analysis of a near-optimal cardinality
+  estimation algorithm. <http://algo.inria.fr/flajolet/Publications/FlFuGaMe07.pdf>`_
+- Heule, et al. (2013) `HyperLogLog in Practice: Algorithmic Engineering of a State of
+  The Art Cardinality Estimation Algorithm.
+  <http://research.google.com/pubs/pub40671.html>`_
+"""
+
+import math
+
+_MASK64 = (1 << 64) - 1
+
+# hashes of values whose python hash is not the same in every process
+_NONE_HASH = 0x5bd1e9955bd1e995
+_NAN_HASH = 0x2545f4914f6cdd1d
+# python hashes -1 to -2, since -1 is reserved for errors, so it needs a hash of its own
+_MINUS_ONE_HASH = 0x9e3779b97f4a7c15
+
+# the number of hash bits that choose a sparse register
+SPARSE_PRECISION = 25
+
+# a sparse sketch holds at most one entry for each this many dense registers
+_SPARSE_RATIO = 16
+
+
+def _mix64(h):
+    """
+    Spread the bits of a python hash over all 64 bits (the murmur3 finalizer).
+
+    Python hashes of small ints are the ints themselves, which would otherwise
+    all land in the first register.
+    """
+    h &= _MASK64
+    h ^= h >> 33
+    h = (h * 0xff51afd7ed558ccd) & _MASK64
+    h ^= h >> 33
+    h = (h * 0xc4ceb9fe1a85ec53) & _MASK64
+    h ^= h >> 33
+    return h
+
+
+def hash64(value):
+    """
+    A 64 bit hash of a value, which is the same in every spark worker.
+
+    Lists and dicts are hashed by their string form, as they are when counting
+    distinct values exactly.
+    """
+    if value is None:
+        return _NONE_HASH
+    if isinstance(value, float) and value != value:
+        return _NAN_HASH
+    if isinstance(value, (int, long, float)) and value == -1:
+        return _MINUS_ONE_HASH
+    if isinstance(value, (list, dict, set, tuple)):
+        return _mix64(hash(str(value)))
+    return _mix64(hash(value))
+
+
+def precision_for_error(rel_error):
+    """
+    The smallest precision whose relative standard error is at most rel_error.
+    """
+    if rel_error <= 0 or rel_error >= 1:
+        raise ValueError('Relative error must be between 0 and 1, exclusive.')
+    precision = int(math.ceil(2 * math.log(1.04 / rel_error, 2)))
+    if precision > 18:
+        raise ValueError('Relative error must be at least {}.'.format(1.04 / 2 ** 9))
+    return max(4, precision)
+
+
+def _split(h, precision):
+    """
+    The register chosen by the first precision bits of a hash, and the position of the
+    first one bit in the rest, counting from 1.
+    """
+    width = 64 - precision
+    return h >> width, width - (h & ((1 << width) - 1)).bit_length() + 1
+
+
+class HyperLogLog(object):
+    """ A mergeable sketch of the number of distinct values. """
+
+    def __init__(self, precision=14):
+        """
+        Create an empty sketch.
+
+        Parameters
+        ----------
+        precision : int, optional
+            The number of hash bits used to choose a register, from 4 to 18.
+            The dense sketch has 2**precision registers.
+        """
+        if precision < 4 or precision > 18:
+            raise ValueError('Precision must be between 4 and 18.')
+        self.precision = precision
+        # sparse register index to rank, until it is converted to dense registers
+        self.sparse = {}
+        self.registers = None
+
+    def is_sparse(self):
+        return self.registers is None
+
+    def _dense_registers(self):
+        if self.registers is not None:
+            return self.registers
+        registers = bytearray(1 << self.precision)
+        shift = SPARSE_PRECISION - self.precision
+        low_mask = (1 << shift) - 1
+        for sparse_index, sparse_rank in self.sparse.iteritems():
+            index = sparse_index >> shift
+            low = sparse_index & low_mask
+            # the bits that chose the sparse register come first in the rest of the hash
+            rank = shift - low.bit_length() + 1 if low != 0 else shift + sparse_rank
+            if rank > registers[index]:
+                registers[index] = rank
+        return registers
+
+    def _to_dense(self):
+        self.registers = self._dense_registers()
+        self.sparse = None
+
+    def _check_size(self):
+        if len(self.sparse) * _SPARSE_RATIO > (1 << self.precision):
+            self._to_dense()
+
+    def add(self, value):
+        """
+        Add one value.  Returns self.
+        """
+        h = hash64(value)
+        if self.registers is None:
+            index, rank = _split(h, SPARSE_PRECISION)
+            if rank > self.sparse.get(index, 0):
+                self.sparse[index] = rank
+                self._check_size()
+        else:
+            index, rank = _split(h, self.precision)
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+        return self
+
+    def merge(self, other):
+        """
+        Merge another sketch into this one.  Returns self.
+        """
+        if self.precision != other.precision:
+            raise ValueError('HyperLogLog precisions do not match.')
+        if self.registers is None and other.registers is None:
+            for index, rank in other.sparse.iteritems():
+                if rank > self.sparse.get(index, 0):
+                    self.sparse[index] = rank
+            self._check_size()
+            return self
+        self._to_dense()
+        self.registers = bytearray(map(max, self.registers, other._dense_registers()))
+        return self
+
+    def _alpha(self):
+        m = len(self.registers)
+        if m == 16:
+            return 0.673
+        if m == 32:
+            return 0.697
+        if m == 64:
+            return 0.709
+        return 0.7213 / (1.0 + 1.079 / m)
+
+    def cardinality(self):
+        """
+        The estimated number of distinct values added.
+        """
+        if self.registers is None:
+            # linear counting over the sparse registers
+            m = 1 << SPARSE_PRECISION
+            return int(round(m * math.log(float(m) / (m - len(self.sparse)))))
+        m = len(self.registers)
+        zeros = self.registers.count('\x00')
+        if zeros == m:
+            return 0
+        estimate = self._alpha() * m * m / math.fsum([2.0 ** -r for r in self.registers])
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * math.log(float(m) / zeros)
+        return int(round(estimate))
@@ -0,0 +1,193 @@
+"""
+KLL quantile sketches.
+
+A KLL sketch keeps a hierarchy of compactors.  Values are added to the lowest one.
+When a compactor is full, it is sorted and every other value, starting at a random
+offset, is promoted to the compactor above, where each value stands for twice as many.
+Higher compactors hold fewer values, so the memory use grows only with the log of the
+number of values.
+
+Unlike QuantileAccumulator, the sketch needs no bounds on the values, and sketches can
+be merged in any order.  Any values that can be compared with each other can be
+sketched, such as numbers or datetimes.  The exact min and max are kept, so the
+quantiles 0 and 1 are exact.
+
+References
+----------
+- Karnin, Lang, and Liberty (2016) `Optimal Quantile Approximation in Streams.
+  <https://arxiv.org/abs/1603.05346>`_
+"""
+
+import math
+import random
+
+DEFAULT_K = 200
+
+# each compactor holds this fraction of the one above it
+_CAPACITY_RATIO = 2.0 / 3.0
+
+
+def k_for_rank_error(rank_error):
+    """
+    The smallest k whose normalized rank error is at most rank_error.
+
+    The error model is the one measured for KLL sketches by Apache DataSketches:
+    the rank error is about 2.296 / k**0.9723, at 99% confidence.
+    """
+    if rank_error <= 0 or rank_error >= 1:
+        raise ValueError('Rank error must be between 0 and 1, exclusive.')
+    return max(8, int(math.ceil((2.296 / rank_error) ** (1.0 / 0.9723))))
+
+
+class KLLSketch(object):
+    """ A mergeable sketch of the distribution of values. """
+
+    def __init__(self, k=DEFAULT_K, seed=None):
+        """
+        Create an empty sketch.
+
+        Parameters
+        ----------
+        k : int, optional
+            The capacity of the top compactor.  Larger k gives smaller errors.
+
+        seed : int, optional
+            Seed for the compaction offsets.
+        """
+        if k < 8:
+            raise ValueError('k must be at least 8.')
+        self.k = k
+        self.seed = seed
+        self.n = 0
+        self.min_val = None
+        self.max_val = None
+        self.compactors = [[]]
+        self._size = 0
+        self._max_size = self._capacity(0)
+        self._random = random.Random(seed)
+
+    def __getstate__(self):
+        # the state of the random generator is much larger than the sketch
+        state = dict(self.__dict__)
+        del state['_random']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._random = random.Random(self.seed)
+
+    def _capacity(self, level):
+        height = len(self.compactors) - level - 1
+        return int(math.ceil(self.k * _CAPACITY_RATIO ** height)) + 1
+
+    def _grow(self):
+        self.compactors.append([])
+        self._max_size = sum([self._capacity(level) for level in xrange(len(self.compactors))])
+
+    def _compress(self):
+        for level, compactor in enumerate(self.compactors):
+            if len(compactor) >= self._capacity(level):
+                if level + 1 == len(self.compactors):
+                    self._grow()
+                compactor.sort()
+                # an odd value out stays behind, so the total weight is unchanged
+                keep = compactor[-1:] if len(compactor) % 2 == 1 else []
+                pairs = compactor[:len(compactor) - len(keep)]
+                self.compactors[level + 1].extend(pairs[self._random.randint(0, 1)::2])
+                self.compactors[level] = keep
+                break
+        self._size = sum([len(compactor) for compactor in self.compactors])
+
+    def add(self, value):
+        """
+        Add one value.  Returns self.
+        """
+        if self.n == 0:
+            self.min_val = value
+            self.max_val = value
+        elif value < self.min_val:
+            self.min_val = value
+        elif value > self.max_val:
+            self.max_val = value
+        self.n += 1
+        self.compactors[0].append(value)
+        self._size += 1
+        if self._size >= self._max_size:
+            self._compress()
+        return self
+
+    def merge(self, other):
+        """
+        Merge another sketch into this one.  Returns self.
+        """
+        if other.n == 0:
+            return self
+        if self.n == 0 or other.min_val < self.min_val:
+            self.min_val = other.min_val
+        if self.n == 0 or other.max_val > self.max_val:
+            self.max_val = other.max_val
+        self.n += other.n
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for level, compactor in enumerate(other.compactors):
+            self.compactors[level].extend(compactor)
+        self._size = sum([len(compactor) for compactor in self.compactors])
+        while self._size >= self._max_size:
+            self._compress()
+        return self
+
+    def _weighted(self):
+        """
+        The retained values with their weights, in order.
+        """
+        pairs = [(value, 1 << level)
+                 for level, compactor in enumerate(self.compactors)
+                 for value in compactor]
+        pairs.sort(key=lambda pair: pair[0])
+        return pairs
+
+    def rank(self, value):
+        """
+        The estimated fraction of values that are at most value.
+        """
+        if self.n == 0:
+            return None
+        weight = sum([1 << level
+                      for level, compactor in enumerate(self.compactors)
+                      for item in compactor if item <= value])
+        return float(weight) / self.n
+
+    def quantiles(self, qs):
+        """
+        The estimated values at each of the quantiles in qs.
+
+        The value at quantile q is the smallest retained value whose estimated rank
+        is at least q.  Quantiles are clipped to [0, 1].
+        """
+        if self.n == 0:
+            return [None for _ in qs]
+        pairs = self._weighted()
+        res = []
+        for q in qs:
+            if q <= 0:
+                res.append(self.min_val)
+                continue
+            if q >= 1:
+                res.append(self.max_val)
+                continue
+            target = q * self.n
+            cumulative = 0
+            value = self.max_val
+            for item, weight in pairs:
+                cumulative += weight
+                if cumulative >= target:
+                    value = item
+                    break
+            res.append(value)
+        return res
+
+    def quantile(self, q):
+        """
+        The estimated value at quantile q.
+        """
+        return self.quantiles([q])[0]
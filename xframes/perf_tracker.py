@@ -1,14 +1,205 @@
+"""
+Performance tracking for xframes.
 
+The call counts record how many times each traced method is entered.  They are cheap,
+and can be left on.
+
+A profile records, for each method of XRdd, XArrayImpl, and XFrameImpl called while it is
+active, the number of calls, the wall time, the spark jobs and stages that ran, and the
+number of rows in and out, when they are known without running another job.  Times and
+jobs include those of nested calls.  The methods are wrapped only while the profile is
+active, so there is no cost otherwise.
+
+    >>> with PerfTracker.profile() as p:
+    ...     xf.groupby('user', {'count': COUNT()}).sort('count')
+    >>> p.to_csv('profile.csv')
+"""
 from pprint import pprint
 from sys import stderr
+from contextlib import contextmanager
+import functools
+import threading
+import time
+import json
+import csv
+import StringIO
 
-
+from xframes.spark_context import CommonSparkContext
 from xframes.xrdd import XRdd
 from xframes.xarray_impl import XArrayImpl
 from xframes.xframe_impl import XFrameImpl
- 
+
+# methods that are used by the profile itself
+_UNPROFILED = frozenset(['_known_count'])
+
+FIELDS = ['method', 'calls', 'wall_time', 'job_ids', 'stage_ids', 'rows_in', 'rows_out']
+
+
+class MethodProfile(object):
+    """ The totals for one method. """
+
+    def __init__(self, method):
+        self.method = method
+        self.calls = 0
+        self.wall_time = 0.0
+        self.job_ids = set()
+        self.stage_ids = set()
+        self.rows_in = None
+        self.rows_out = None
+
+    def add(self, wall_time, job_ids, stage_ids, rows_in, rows_out):
+        self.calls += 1
+        self.wall_time += wall_time
+        self.job_ids.update(job_ids)
+        self.stage_ids.update(stage_ids)
+        if rows_in is not None:
+            self.rows_in = (self.rows_in or 0) + rows_in
+        if rows_out is not None:
+            self.rows_out = (self.rows_out or 0) + rows_out
+
+    def as_dict(self):
+        return {'method': self.method,
+                'calls': self.calls,
+                'wall_time': self.wall_time,
+                'job_ids': sorted(self.job_ids),
+                'stage_ids': sorted(self.stage_ids),
+                'rows_in': self.rows_in,
+                'rows_out': self.rows_out}
+
+
+class Profile(object):
+    """ The method profiles collected by PerfTracker.profile. """
+
+    def __init__(self, track_jobs=True):
+        self.track_jobs = track_jobs
+        self.methods = {}
+        self.local = threading.local()
+        self.status_tracker = CommonSparkContext().status_tracker if track_jobs else None
+
+    def _job_ids(self):
+        if self.status_tracker is None:
+            return set()
+        return set(self.status_tracker.getJobIdsForGroup(None))
+
+    def _stage_ids(self, job_ids):
+        stage_ids = set()
+        for job_id in job_ids:
+            info = self.status_tracker.getJobInfo(job_id)
+            if info is not None:
+                stage_ids.update(info.stageIds)
+        return stage_ids
+
+    @staticmethod
+    def _rows(obj):
+        # classmethods get the class, which has no rows
+        if isinstance(obj, type) or not hasattr(obj, '_known_count'):
+            return None
+        return obj._known_count()
+
+    def call(self, method, fn, args, kwargs):
+        """
+        Call a method, and record it.
+        """
+        if getattr(self.local, 'busy', False):
+            # called by the profile's own bookkeeping
+            return fn(*args, **kwargs)
+        self.local.busy = True
+        try:
+            rows_in = self._rows(args[0]) if len(args) > 0 else None
+            jobs_before = self._job_ids()
+        finally:
+            self.local.busy = False
+
+        start = time.time()
+        res = fn(*args, **kwargs)
+        wall_time = time.time() - start
+
+        self.local.busy = True
+        try:
+            job_ids = self._job_ids() - jobs_before
+            stage_ids = self._stage_ids(job_ids)
+            if isinstance(res, (int, long)) and method.rpartition('.')[2] in ('count', '_count', 'num_rows', 'size'):
+                rows_out = res
+            else:
+                rows_out = self._rows(res)
+            if method not in self.methods:
+                self.methods[method] = MethodProfile(method)
+            self.methods[method].add(wall_time, job_ids, stage_ids, rows_in, rows_out)
+        finally:
+            self.local.busy = False
+        return res
+
+    def records(self):
+        """
+        The profile of each method, as a list of dicts, with the most time first.
+
+        Each dict has the keys: method, calls, wall_time, job_ids, stage_ids, rows_in, rows_out.
+        """
+        return [prof.as_dict() for prof in sorted(self.methods.values(), key=lambda prof: -prof.wall_time)]
+
+    def to_json(self, path=None):
+        """
+        The records as json.  They are written to the file if path is given.
+        """
+        res = json.dumps(self.records(), indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(res)
+        return res
+
+    def to_csv(self, path=None):
+        """
+        The records as csv, with a header line.  Job and stage ids are separated by spaces.
+        They are written to the file if path is given.
+        """
+        sio = StringIO.StringIO()
+        writer = csv.writer(sio)
+        writer.writerow(FIELDS)
+        for record in self.records():
+            record['job_ids'] = ' '.join([str(job_id) for job_id in record['job_ids']])
+            record['stage_ids'] = ' '.join([str(stage_id) for stage_id in record['stage_ids']])
+            writer.writerow(['' if record[field] is None else record[field] for field in FIELDS])
+        res = sio.getvalue()
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(res)
+        return res
+
+
+def _wrap(profile, method, fn):
+    @functools.wraps(fn)
+    def profiled(*args, **kwargs):
+        return profile.call(method, fn, args, kwargs)
+    return profiled
+
+
+def _instrument(profile, cls):
+    """
+    Replace the methods of a class with profiled versions.
+
+    Returns the original attributes, so they can be restored.
+    """
+    originals = {}
+    for name, attr in vars(cls).items():
+        if name.startswith('__') or name in _UNPROFILED:
+            continue
+        method = '{}.{}'.format(cls.__name__, name)
+        if isinstance(attr, staticmethod):
+            wrapped = staticmethod(_wrap(profile, method, attr.__func__))
+        elif isinstance(attr, classmethod):
+            wrapped = classmethod(_wrap(profile, method, attr.__func__))
+        elif callable(attr):
+            wrapped = _wrap(profile, method, attr)
+        else:
+            continue
+        originals[name] = attr
+        setattr(cls, name, wrapped)
+    return originals
+
 
 class PerfTracker(object):
+    _profile = None
+
     @staticmethod
     def xrdd_track(enable=True):
         XRdd.set_perf_count(enable)
@@ -26,6 +217,19 @@ class PerfTracker(object):
         XFrameImpl.set_perf_count(enable)
         XArrayImpl.set_perf_count(enable)
 
+    @staticmethod
+    def get_perf_counts():
+        """
+        The call counts, as a dict of class name to a dict of method name to count.
+        Classes that are not being counted are left out.
+        """
+        res = {}
+        for name, cls in [('XRDD', XRdd), ('XArray', XArrayImpl), ('XFrame', XFrameImpl)]:
+            perf = cls.get_perf_count()
+            if perf is not None:
+                res[name] = dict(perf)
+        return res
+
     @staticmethod
     def print_perf():
         perf = XRdd.get_perf_count()
@@ -40,3 +244,41 @@ class PerfTracker(object):
         if perf:
             print >>stderr, 'XFrame'
             pprint(perf, stream=stderr)
+
+    @staticmethod
+    @contextmanager
+    def profile(track_jobs=True):
+        """
+        Profile the xframes methods called inside a with statement.
+
+        Parameters
+        ----------
+        track_jobs : bool, optional
+            If True, record the spark jobs and stages run by each method.  This asks the
+            spark status tracker before and after each call.
+
+        Returns
+        -------
+        out : Profile
+            The profile, which can be read when the with statement ends.
+
+        Examples
+        --------
+        >>> with PerfTracker.profile() as p:
+        ...     xf.sort('id').head()
+        >>> p.records()
+        >>> p.to_json('profile.json')
+        """
+        if PerfTracker._profile is not None:
+            raise ValueError('A profile is already active.')
+        profile = Profile(track_jobs)
+        classes = [XRdd, XArrayImpl, XFrameImpl]
+        originals = [_instrument(profile, cls) for cls in classes]
+        PerfTracker._profile = profile
+        try:
+            yield profile
+        finally:
+            for cls, attrs in zip(classes, originals):
+                for name, attr in attrs.iteritems():
+                    setattr(cls, name, attr)
+            PerfTracker._profile = None
@@ -0,0 +1,242 @@
+"""
+Logical plans of XFrame and XArray operations, for explain().
+
+Each XFrameImpl and XArrayImpl holds a PlanNode, made when the impl is created.  The
+node records the operation that created the impl and its arguments, both taken from the
+calling frame, and the nodes of the impls it was made from.
+
+XRdd records the physical events that matter for cost -- shuffles, persists, and how
+zips were carried out -- as they happen.  They are held until the next plan node is
+made, which takes them.  Actions, such as counts, are recorded on the node of the impl
+they ran on.
+"""
+
+import sys
+import threading
+import types
+
+# frames that only pass data along, and are skipped to find the operation
+_PLUMBING = frozenset(['__init__', '_rv', '_rv_frame', '_rv_blocks', '_rv_dataframe', '_from_blocks',
+                       '_from_dataframe', '_replace', '_replace_rdd'])
+
+# operations are the methods of the impls: anything else made the impl from outside
+_IMPL_MODULES = frozenset(['xframes.xobject_impl', 'xframes.xframe_impl', 'xframes.xarray_impl'])
+
+# pending events are dropped beyond this many, if no plan node takes them
+_MAX_PENDING = 100
+
+# plans are shown to this depth, so long loops of operations stay readable
+_MAX_DEPTH = 50
+
+_pending = threading.local()
+
+
+def record(kind, detail=None):
+    """
+    Record a physical event, to be attached to the next plan node.
+
+    Parameters
+    ----------
+    kind : str
+        One of 'shuffle', 'persist', 'zip', 'broadcast'.
+
+    detail : str, optional
+        More about the event, such as the rdd operation that shuffled.
+    """
+    events = getattr(_pending, 'events', None)
+    if events is None:
+        events = _pending.events = []
+    if len(events) < _MAX_PENDING:
+        events.append((kind, detail))
+
+
+def take_events():
+    """
+    Return the pending events, and clear them.
+    """
+    events = getattr(_pending, 'events', None) or []
+    _pending.events = []
+    return events
+
+
+def _summarize(value):
+    """
+    A short description of an argument.  Large values are described by type and size,
+    so they are not held by the plan.
+    """
+    if value is None or isinstance(value, (bool, int, long, float)):
+        return repr(value)
+    if isinstance(value, basestring):
+        return repr(value) if len(value) <= 40 else repr(value[:37] + '...')
+    if isinstance(value, type):
+        return value.__name__
+    if isinstance(value, (types.FunctionType, types.BuiltinFunctionType, types.MethodType)):
+        return '<function {}>'.format(value.__name__)
+    if isinstance(value, (list, tuple, set, frozenset, dict)):
+        if len(value) <= 8:
+            text = repr(value)
+            if len(text) <= 60:
+                return text
+        return '<{} of {}>'.format(type(value).__name__, len(value))
+    return '<{}>'.format(type(value).__name__)
+
+
+class PlanNode(object):
+    """ One operation in a logical plan. """
+
+    def __init__(self, op, args, inputs, events):
+        self.op = op
+        self.args = args
+        self.inputs = inputs
+        self.events = events
+        self.actions = {}
+        self.rows = None
+
+    @staticmethod
+    def capture(impl_types):
+        """
+        Make the node for an impl that is being created, from the operation that is
+        creating it.
+
+        Parameters
+        ----------
+        impl_types : tuple of type
+            The impl classes.  Arguments of these types are the inputs of the operation.
+        """
+        frame = sys._getframe(1)
+        while frame is not None and frame.f_code.co_name in _PLUMBING and \
+                frame.f_globals.get('__name__') in _IMPL_MODULES:
+            frame = frame.f_back
+        if frame is None or frame.f_globals.get('__name__') not in _IMPL_MODULES:
+            return PlanNode('new', [], [], take_events())
+        code = frame.f_code
+        arg_names = code.co_varnames[:code.co_argcount]
+        local_vars = frame.f_locals
+        args = []
+        inputs = []
+        for name in arg_names:
+            value = local_vars.get(name)
+            if isinstance(value, impl_types):
+                node = getattr(value, '_plan', None)
+                if node is not None:
+                    inputs.append(node)
+            elif name not in ('self', 'cls'):
+                args.append((name, _summarize(value)))
+        return PlanNode(code.co_name, args, inputs, take_events())
+
+    def add_action(self, action, rows=None):
+        """
+        Record an action that ran on the impl of this node.  Events that the action
+        caused, such as persisting the rdd, are taken too.
+        """
+        self.actions[action] = self.actions.get(action, 0) + 1
+        if rows is not None:
+            self.rows = rows
+        self.events.extend(take_events())
+
+    def cost(self):
+        """
+        Cost hints for this node alone.
+        """
+        kinds = [kind for kind, _ in self.events]
+        zips = [detail for kind, detail in self.events if kind == 'zip']
+        res = {'shuffles': kinds.count('shuffle'),
+               'persists': kinds.count('persist'),
+               'broadcasts': kinds.count('broadcast'),
+               'zips': zips,
+               'actions': dict(self.actions)}
+        if self.rows is not None:
+            res['rows'] = self.rows
+        return res
+
+    def nodes(self):
+        """
+        The nodes of the plan, each once.
+        """
+        res = []
+        seen = set()
+        pending = [self]
+        while pending:
+            node = pending.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            res.append(node)
+            pending.extend(node.inputs)
+        return res
+
+    def as_dict(self, depth=0, seen=None):
+        """
+        The plan as nested dicts.  Each node is numbered by 'id', and is given in full
+        only the first time it is reached: after that, it is given as {'ref': id}.
+        Inputs beyond the maximum depth are left out.
+        """
+        seen = {} if seen is None else seen
+        if id(self) in seen:
+            return {'ref': seen[id(self)]}
+        node_id = seen[id(self)] = len(seen)
+        return {'id': node_id,
+                'op': self.op,
+                'args': dict(self.args),
+                'events': [{'kind': kind, 'detail': detail} for kind, detail in self.events],
+                'cost': self.cost(),
+                'inputs': [node.as_dict(depth + 1, seen) for node in self.inputs] if depth < _MAX_DEPTH else []}
+
+    def _hints(self):
+        cost = self.cost()
+        hints = []
+        if cost['shuffles'] > 0:
+            hints.append('shuffle x{}'.format(cost['shuffles']))
+        for detail in cost['zips']:
+            hints.append('{} zip'.format(detail))
+        if cost['broadcasts'] > 0:
+            hints.append('broadcast')
+        if cost['persists'] > 0:
+            hints.append('persist')
+        for action, count in sorted(cost['actions'].iteritems()):
+            hints.append('{} x{}'.format(action, count))
+        if self.rows is not None:
+            hints.append('rows={}'.format(self.rows))
+        return hints
+
+    def _lines(self, depth, seen):
+        args = ', '.join(['{}={}'.format(name, value) for name, value in self.args])
+        line = '{}{}({})'.format('  ' * depth, self.op, args)
+        hints = self._hints()
+        if hints:
+            line += '  [{}]'.format(', '.join(hints))
+        if id(self) in seen:
+            return [line + '  (see above)']
+        seen.add(id(self))
+        lines = [line]
+        if depth >= _MAX_DEPTH and self.inputs:
+            lines.append('{}...'.format('  ' * (depth + 1)))
+            return lines
+        for node in self.inputs:
+            lines.extend(node._lines(depth + 1, seen))
+        return lines
+
+    def totals(self):
+        """
+        Cost totals over the whole plan.
+        """
+        nodes = self.nodes()
+        res = {'operations': len(nodes), 'shuffles': 0, 'persists': 0, 'safe_zips': 0, 'counts': 0}
+        for node in nodes:
+            cost = node.cost()
+            res['shuffles'] += cost['shuffles']
+            res['persists'] += cost['persists']
+            res['safe_zips'] += cost['zips'].count('safe')
+            res['counts'] += cost['actions'].get('count', 0)
+        return res
+
+    def as_text(self):
+        """
+        The plan as an indented tree, the last operation first, followed by the totals.
+        """
+        lines = self._lines(0, set())
+        totals = self.totals()
+        lines.append('')
+        lines.append('operations: {operations}  shuffles: {shuffles}  persists: {persists}  '
+                     'safe zips: {safe_zips}  counts: {counts}'.format(**totals))
+        return '\n'.join(lines)
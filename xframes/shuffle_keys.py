@@ -0,0 +1,144 @@
+"""
+Encode column values as hashable keys for shuffle operations.
+
+Join, groupby, and unique need to use column values as RDD keys.
+Spark can use tuples as keys, provided every element is hashable.
+Most column types (int, float, str, datetime, and so on) are already hashable, and are
+used as they are.  Values of list, dict, and array.array type are converted into tagged
+tuples, which can be converted back without loss of type information.
+
+Encoders and decoders are built once for a set of column types, so that the per-row work
+is only what those types require.
+"""
+
+import array
+import math
+import datetime
+
+# Tags used to mark encoded values of types that are not hashable.
+_LIST_TAG = '__xframes_list__'
+_DICT_TAG = '__xframes_dict__'
+_ARRAY_TAG = '__xframes_array__'
+_NAN_TAG = '__xframes_nan__'
+
+_TAGS = frozenset([_LIST_TAG, _DICT_TAG, _ARRAY_TAG, _NAN_TAG])
+
+# NaN is not equal to itself, so NaN values would never group or join together.
+# Replace it with a key that does.
+_NAN_KEY = (_NAN_TAG, )
+
+
+def encode_value(val):
+    """
+    Encode a value of any type into a hashable key.
+
+    Parameters
+    ----------
+    val : object
+        The value to encode.
+
+    Returns
+    -------
+    out : object
+        A hashable value, which `decode_value` converts back to the original.
+    """
+    if isinstance(val, float):
+        return _NAN_KEY if math.isnan(val) else val
+    if isinstance(val, list):
+        return _LIST_TAG, tuple([encode_value(v) for v in val])
+    if isinstance(val, dict):
+        return _DICT_TAG, frozenset([(encode_value(k), encode_value(v)) for k, v in val.iteritems()])
+    if isinstance(val, array.array):
+        return _ARRAY_TAG, val.typecode, tuple(val)
+    if isinstance(val, tuple):
+        return tuple([encode_value(v) for v in val])
+    return val
+
+
+def decode_value(key):
+    """
+    Decode a key produced by `encode_value` back into the original value.
+
+    Parameters
+    ----------
+    key : object
+        The encoded value.
+
+    Returns
+    -------
+    out : object
+        The original value.
+    """
+    if not isinstance(key, tuple):
+        return key
+    if len(key) > 0 and isinstance(key[0], str) and key[0] in _TAGS:
+        tag = key[0]
+        if tag == _NAN_TAG:
+            return float('nan')
+        if tag == _LIST_TAG:
+            return [decode_value(v) for v in key[1]]
+        if tag == _DICT_TAG:
+            return {decode_value(k): decode_value(v) for k, v in key[1]}
+        if tag == _ARRAY_TAG:
+            return array.array(key[1], key[2])
+    return tuple([decode_value(v) for v in key])
+
+
+def _needs_encoding(typ):
+    # Types whose values are hashable, and equal only when they represent the same value,
+    #  can be used directly.
+    if typ is None:
+        return True
+    return not issubclass(typ, (int, long, str, unicode, bool, datetime.datetime))
+
+
+def key_encoder(column_types):
+    """
+    Build a function that extracts an encoded key from a row.
+
+    Parameters
+    ----------
+    column_types : list[type]
+        The types of the columns that make up the key.
+
+    Returns
+    -------
+    out : function(row, indexes)
+        A function that takes a row and the key column indexes, and returns a hashable tuple.
+        Values are encoded only for columns whose type requires it.
+    """
+    needs_encoding = [_needs_encoding(typ) for typ in column_types]
+    if not any(needs_encoding):
+        def make_key(row, indexes):
+            return tuple([row[i] for i in indexes])
+    else:
+        def make_key(row, indexes):
+            return tuple([encode_value(row[i]) if encode else row[i]
+                          for i, encode in zip(indexes, needs_encoding)])
+    return make_key
+
+
+def key_decoder(column_types):
+    """
+    Build a function that converts an encoded key back into a list of column values.
+
+    Parameters
+    ----------
+    column_types : list[type]
+        The types of the columns that make up the key.
+
+    Returns
+    -------
+    out : function(key)
+        A function that takes a key produced by the matching `key_encoder`,
+        and returns a list of the original values.
+    """
+    needs_encoding = [_needs_encoding(typ) for typ in column_types]
+    if not any(needs_encoding):
+        def decode_key(key):
+            return list(key)
+    else:
+        def decode_key(key):
+            return [decode_value(val) if encode else val
+                    for val, encode in zip(key, needs_encoding)]
+    return decode_key
@@ -17,6 +17,7 @@ from math import sqrt
 from xframes.xarray import XArray
 from xframes.xframe import XFrame
 from xframes.sketch_impl import SketchImpl
+from xframes.util import make_internal_url
 
 __all__ = ['Sketch']
 
@@ -41,8 +42,14 @@ class Sketch(object):
     >>> sketch_factory = my_sframe['column1'].sketch_summary()
 
     The sketch computation is fast, with complexity approximately linear in the
-    length of the XArray. After the Sketch is computed, all queryable functions
-    are performed nearly instantly.
+    length of the XArray: all the statistics are computed together, in one pass over
+    the XArray. After the Sketch is computed, all queryable functions are performed
+    nearly instantly.
+
+    A sketch can be saved and loaded (:func:`~xframes.Sketch.save`,
+    :func:`~xframes.Sketch.load`), and sketches of parts of a collection can be
+    combined (:func:`~xframes.Sketch.merge`, :func:`~xframes.Sketch.update`), so a
+    profile can be kept up to date without sketching every value again.
 
     A sketch can compute the following information depending on the dtype of the
     XArray:
@@ -161,16 +168,19 @@ class Sketch(object):
         """
         Set the quantile accumulator accuracy settings.
 
+        The quantiles are computed again, with the new settings, when they are next used.
+
         Parameters
         ----------
         num_levels: int, optional
-            The number of levels of hash map.
+            Not used: the quantile sketch does not divide the range of values into levels.
 
         epsilon: float (0 .. 1.0), optional
-            The precision of the result
+            The precision of the result, as a fraction of the number of values.
+            Defaults to 0.01.
 
         delta: float (0 .. 1.0), optional
-            The probability that the precision specified above is not achieved.
+            Not used: the precision is achieved with 99% confidence.
         """
         self._impl.set_quantile_accumulator_params(num_levels, epsilon, delta)
 
@@ -178,6 +188,8 @@ class Sketch(object):
         """
         Set the frequency sketch accuracy settings.
 
+        The frequent items are computed again, with the new settings, when they are next used.
+
         Parameters
         ----------
         num_items: int, optional
@@ -191,6 +203,115 @@ class Sketch(object):
         """
         self._impl.set_frequency_sketch_params(num_items, epsilon, delta)
 
+    def save(self, filename):
+        """
+        Saves the sketch to a file.
+
+        The file holds the exact statistics and the distinct count, quantile and
+        frequency sketches, compressed.  It does not hold the values of the XArray,
+        so a loaded sketch cannot count unique values exactly, compute tf_idf, or
+        compute its quantiles or frequent items again with new settings.
+
+        Parameters
+        ----------
+        filename : string
+            A local path or a remote URL.
+
+        See Also
+        --------
+        xframes.Sketch.load
+            Loads a saved sketch.
+
+        Examples
+        --------
+        >>> sketch = xframes.XArray([1, 2, 3]).sketch_summary()
+        >>> sketch.save('my_sketch')
+        >>> sketch_loaded = xframes.Sketch.load('my_sketch')
+        """
+        self._impl.save(make_internal_url(filename))
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Loads a sketch saved by :py:meth:`~xframes.Sketch.save`.
+
+        Parameters
+        ----------
+        filename : string
+            A local path or a remote URL.
+
+        Returns
+        -------
+        out : Sketch
+        """
+        return cls(impl=SketchImpl.load(make_internal_url(filename)))
+
+    def merge(self, other):
+        """
+        Combine two sketches into a sketch of the values of both.
+
+        The exact statistics are combined exactly, and the approximate ones keep
+        their accuracy, so a sketch of a large collection can be built from the
+        sketches of its parts.  Neither sketch is changed.
+
+        Parameters
+        ----------
+        other : Sketch
+            A sketch of values of the same type, made with the same frequency
+            sketch settings.
+
+        Returns
+        -------
+        out : Sketch
+            A sketch of the values of both sketches.
+
+        Raises
+        ------
+        TypeError
+            If the sketches are of values of different types.
+
+        ValueError
+            If the frequency sketches have different settings.
+
+        Examples
+        --------
+        Fold each day's values into a saved sketch.
+
+        >>> history = xframes.Sketch.load('history')
+        >>> today = xframes.XArray.read_text('today.txt').sketch_summary()
+        >>> history.merge(today).save('history')
+        """
+        if not isinstance(other, Sketch):
+            raise TypeError('Can only merge with another Sketch.')
+        return Sketch(impl=self._impl.merge(other._impl))
+
+    def update(self, array):
+        """
+        Sketch the values of an XArray and combine them with this sketch.
+
+        This is the same as merging with a sketch of the XArray, made with the
+        same settings as this sketch.  This sketch is not changed.
+
+        Parameters
+        ----------
+        array : XArray
+            Values of the same type as this sketch.
+
+        Returns
+        -------
+        out : Sketch
+            A sketch of the values of this sketch and of the XArray.
+
+        Examples
+        --------
+        >>> history = xframes.Sketch.load('history')
+        >>> history = history.update(xframes.XArray.read_text('today.txt'))
+        >>> history.save('history')
+        """
+        if not isinstance(array, XArray):
+            raise TypeError('Sketch can only be updated with an XArray.')
+        return Sketch(impl=self._impl.update(array.impl()))
+
     # noinspection PyBroadException
     def __repr__(self):
         """
@@ -422,17 +543,27 @@ class Sketch(object):
         """
         return int(self._impl.num_undefined())
 
-    def num_unique(self):
+    def num_unique(self, approximate=True):
         """
         Returns a sketched estimate of the number of unique values in the
         XArray based on the Hyperloglog sketch.
 
+        The estimate is made when the sketch is built, and has a relative
+        standard error of about 0.8%.  Missing values count as one value.
+
+        Parameters
+        ----------
+        approximate : bool, optional
+            If False, count the unique values exactly instead.  This shuffles
+            every value, so it is much slower on large columns.
+
         Returns
         -------
-        out : float
-            An estimate of the number of unique values in the XArray.
+        out : int
+            An estimate of the number of unique values in the XArray, or the
+            exact number if approximate is False.
         """
-        return int(self._impl.num_unique())
+        return int(self._impl.num_unique(approximate))
 
     def frequent_items(self):
         """
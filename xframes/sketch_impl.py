@@ -6,15 +6,20 @@ import math
 import datetime
 from collections import Counter
 import copy
+import itertools
 import logging
+import pickle
+import zlib
 
-import py4j
+from pyspark.statcounter import StatCounter
 
 from xframes.xobject_impl import XObjectImpl
 from xframes.traced_object import TracedObject
-from xframes.dsq import QuantileAccumulator
 from xframes.frequent import FreqSketch
+from xframes.hyperloglog import HyperLogLog
+from xframes.kll import KLLSketch, k_for_rank_error
 from xframes import util
+from xframes import fileio
 from xframes import xarray_impl
 
 __all__ = ['Sketch']
@@ -33,6 +38,137 @@ def normalize_number(x):
     return None if is_missing(x) else x
 
 
+# defaults for the quantile and frequency sketches
+QUANTILE_EPSILON = 0.01
+FREQUENCY_NUM_ITEMS = 500
+FREQUENCY_EPSILON = 0.0001
+FREQUENCY_DELTA = 0.01
+
+# values are added to the sketches this many at a time
+BATCH_SIZE = 10000
+
+# the version of the saved sketch format
+SAVE_FORMAT_VERSION = 1
+
+
+class SketchAccumulator(object):
+    """
+    Accumulates every statistic of a sketch in one pass.
+
+    One accumulator is built for each partition, and they are merged.  Each part can
+    be left out, so the same pass can also rebuild a single part.
+    """
+
+    def __init__(self, sketch_type, dtype, stats=True, distinct=True, quantile_k=None, frequency_params=None):
+        self.sketch_type = sketch_type
+        self.measure_length = dtype in (list, dict, str)
+        self.count = 0
+        self.num_undefined = 0
+        self.total_length = 0
+        # exact statistics: a StatCounter for numbers, min and max for dates
+        self.stats = StatCounter() if stats and sketch_type == 'numeric' else None
+        self.track_range = stats and sketch_type == 'date'
+        self.min_val = None
+        self.max_val = None
+        # datetimes with and without time zones cannot be compared
+        self.range_failed = False
+        self.distinct = HyperLogLog() if distinct else None
+        self.quantiles = KLLSketch(quantile_k) \
+            if quantile_k is not None and sketch_type in ('numeric', 'date') else None
+        # lists and dicts cannot be counted, since they cannot be hashed
+        self.frequency = FreqSketch(*frequency_params) \
+            if frequency_params is not None and dtype not in (list, dict) else None
+
+    def _add_range(self, value):
+        if self.range_failed:
+            return
+        try:
+            if self.min_val is None or value < self.min_val:
+                self.min_val = value
+            if self.max_val is None or value > self.max_val:
+                self.max_val = value
+        except TypeError:
+            self.range_failed = True
+
+    def add(self, value):
+        """
+        Add one value.  Returns self.
+        """
+        if self._add(value) and self.frequency is not None:
+            self.frequency.increment(value)
+        return self
+
+    def add_batch(self, values):
+        """
+        Add a list of values.  The frequency sketch counts them all at once.  Returns self.
+        """
+        defined = [value for value in values if self._add(value)]
+        if self.frequency is not None:
+            self.frequency.increment_batch(defined)
+        return self
+
+    def _add(self, value):
+        """
+        Add one value to everything but the frequency sketch.  Returns False if the
+        value is missing.
+        """
+        if self.distinct is not None:
+            # missing values count as one distinct value
+            self.distinct.add(value)
+        if is_missing(value):
+            self.num_undefined += 1
+            return False
+        self.count += 1
+        if self.measure_length:
+            self.total_length += len(value)
+        if self.stats is not None:
+            self.stats.merge(value)
+        if self.track_range:
+            self._add_range(value)
+        if self.quantiles is not None:
+            try:
+                self.quantiles.add(value)
+            except TypeError:
+                self.quantiles = None
+        return True
+
+    def add_partition(self, values):
+        """
+        Add the values of one partition, for use with mapPartitions.
+        """
+        values = iter(values)
+        for batch in iter(lambda: list(itertools.islice(values, BATCH_SIZE)), []):
+            self.add_batch(batch)
+        yield self
+
+    def merge(self, other):
+        """
+        Merge the accumulator of another part of the column.  Returns self.
+        """
+        self.count += other.count
+        self.num_undefined += other.num_undefined
+        self.total_length += other.total_length
+        if self.stats is not None:
+            self.stats.mergeStats(other.stats)
+        if self.track_range:
+            self.range_failed = self.range_failed or other.range_failed
+            if other.min_val is not None:
+                self._add_range(other.min_val)
+                self._add_range(other.max_val)
+        if self.distinct is not None:
+            self.distinct.merge(other.distinct)
+        if self.quantiles is not None and other.quantiles is not None:
+            try:
+                self.quantiles.merge(other.quantiles)
+            except TypeError:
+                self.quantiles = None
+        else:
+            self.quantiles = None
+        if self.frequency is not None:
+            self.frequency.merge(other.frequency)
+        return self
+
+
 class SketchImpl(XObjectImpl, TracedObject):
 
     entry_trace = False
@@ -40,11 +176,11 @@ class SketchImpl(XObjectImpl, TracedObject):
 
     def __init__(self):
         super(SketchImpl, self).__init__(None)
-        self.defined = None
         self.dtype = None
         self.sketch_type = None
+        # every statistic, so sketches can be merged
+        self.accumulator = None
         self.count = 0
-        self.stats = None
         self.min_val = None
         self.max_val = None
         self.mean_val = None
@@ -54,7 +190,8 @@ class SketchImpl(XObjectImpl, TracedObject):
         self.avg_len = None
         self.num_undefined_val = None
         self.num_unique_val = None
-        self.quantile_accumulator = None
+        self.exact_num_unique_val = None
+        self.quantile_sketch = None
         self.quantile_accumulator_num_levels = None
         self.quantile_accumulator_epsilon = None
         self.quantile_accumulator_delta = None
@@ -67,139 +204,240 @@ class SketchImpl(XObjectImpl, TracedObject):
         self.quantile_accumulator_num_levels = num_levels
         self.quantile_accumulator_epsilon = epsilon
         self.quantile_accumulator_delta = delta
+        # rebuilt with the new parameters when next needed
+        self.quantile_sketch = None
 
     def set_frequency_sketch_params(self, num_items, epsilon, delta):
         self.frequency_sketch_num_items = num_items
         self.frequency_sketch_epsilon = epsilon
         self.frequency_sketch_delta = delta
+        self.frequency_sketch = None
+
+    def _params(self):
+        return (self.quantile_accumulator_num_levels, self.quantile_accumulator_epsilon,
+                self.quantile_accumulator_delta, self.frequency_sketch_num_items,
+                self.frequency_sketch_epsilon, self.frequency_sketch_delta)
+
+    def _set_params(self, params):
+        (self.quantile_accumulator_num_levels, self.quantile_accumulator_epsilon,
+         self.quantile_accumulator_delta, self.frequency_sketch_num_items,
+         self.frequency_sketch_epsilon, self.frequency_sketch_delta) = params
+
+    def _quantile_k(self):
+        return k_for_rank_error(self.quantile_accumulator_epsilon or QUANTILE_EPSILON)
+
+    def _frequency_params(self):
+        return (self.frequency_sketch_num_items or FREQUENCY_NUM_ITEMS,
+                self.frequency_sketch_epsilon or FREQUENCY_EPSILON,
+                self.frequency_sketch_delta or FREQUENCY_DELTA)
+
+    def _accumulate(self, **parts):
+        """
+        Build a SketchAccumulator over the values in one pass.
+        """
+        zero = SketchAccumulator(self.sketch_type, self.dtype, **parts)
+        self._check_data()
+        if self._rdd.getNumPartitions() == 0:
+            return zero
+        accumulators = self._rdd.mapPartitions(zero.add_partition)
+        return accumulators.treeReduce(lambda acc1, acc2: acc1.merge(acc2))
 
     def construct_from_xarray(self, xa, sub_sketch_keys=None):
         self._entry(sub_sketch_keys=sub_sketch_keys)
         if sub_sketch_keys is not None:
             raise NotImplementedError('sub_sketch_keys mode not implemented')
 
-        # these are not going through the xrdd layer -- should they?
-        defined = xa.to_rdd().filter(lambda x: not is_missing(x))
-        defined.cache()
         self.dtype = xa.dtype()
-        self.count = defined.count()
         if util.is_numeric_type(self.dtype):
             self.sketch_type = 'numeric'
         elif util.is_date_type(self.dtype):
             self.sketch_type = 'date'
         else:
             self.sketch_type = 'non-numeric'
-
-        # compute others later if needed
+        # these are not going through the xrdd layer -- should they?
         self._rdd = xa.to_rdd()
-        self.defined = defined
-
-    def _create_stats(self):
-        # calculate some basic statistics
-        if self.stats is None:
-            if util.is_date_type(self.dtype):
-                try:
-                    self.min_val = normalize_number(self.defined.min())
-                    self.max_val = normalize_number(self.defined.max())
-                except py4j.protocol.Py4JJavaError as e:
-                    self.min_val = None
-                    self.max_val = None
-                    logging.warn('Datetime max or min did not compute.  ' +
-                                 'Possible mixture of offset-native and offset-aware times.')
+
+        # every statistic is computed in the same pass
+        self._set_accumulator(self._accumulate(quantile_k=self._quantile_k(),
+                                               frequency_params=self._frequency_params()))
+
+    def _check_data(self):
+        if self._rdd is None:
+            raise ValueError('The values of a loaded sketch are not available.')
+
+    def _set_accumulator(self, acc):
+        self.accumulator = acc
+        self.count = acc.count
+        self.num_undefined_val = acc.num_undefined
+        self.num_unique_val = acc.distinct.cardinality()
+        self.exact_num_unique_val = None
+        self._set_avg_length(acc)
+        self._set_stats(acc)
+        self.quantile_sketch = acc.quantiles
+        self.frequency_sketch = acc.frequency
+
+    def _current_accumulator(self):
+        """
+        A copy of the accumulator, with quantile and frequency sketches built
+        with the current parameters.
+        """
+        acc = copy.deepcopy(self.accumulator)
+        if self.sketch_type in ['numeric', 'date']:
+            if self.quantile_sketch is None:
+                self.quantile_sketch = self._create_quantile_sketch()
+            acc.quantiles = copy.deepcopy(self.quantile_sketch)
+        if self.dtype not in [list, dict]:
+            acc.frequency = copy.deepcopy(self._frequencies())
+        return acc
+
+    def merge(self, other):
+        """
+        A new sketch of the values of both sketches.
+        """
+        self._entry()
+        if self.dtype is not other.dtype:
+            raise TypeError('Sketches of {} and {} values cannot be merged.'.format(
+                self.dtype.__name__, other.dtype.__name__))
+        res = SketchImpl()
+        res.dtype = self.dtype
+        res.sketch_type = self.sketch_type
+        res._set_params(self._params())
+        # the values are kept only while both sketches have them
+        if self._rdd is not None and other._rdd is not None:
+            res._rdd = self._rdd.union(other._rdd)
+        res._set_accumulator(self._current_accumulator().merge(other._current_accumulator()))
+        return res
+
+    def update(self, xa):
+        """
+        A new sketch of the values of this sketch and of an XArray.
+        """
+        self._entry()
+        other = SketchImpl()
+        other._set_params(self._params())
+        other.construct_from_xarray(xa)
+        return self.merge(other)
+
+    def save(self, path):
+        """
+        Saves the sketch to a file, as a compressed pickle of its accumulator.
+        """
+        self._entry(path=path)
+        state = {'version': SAVE_FORMAT_VERSION,
+                 'dtype': self.dtype,
+                 'sketch_type': self.sketch_type,
+                 'params': self._params(),
+                 'accumulator': self._current_accumulator()}
+        with fileio.open_file(path, 'wb') as f:
+            f.write(zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL)))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a sketch saved by save.
+        """
+        cls._entry(path=path)
+        with fileio.open_file(path, 'rb') as f:
+            state = pickle.loads(zlib.decompress(f.read()))
+        if state.get('version') != SAVE_FORMAT_VERSION:
+            raise ValueError('Unsupported sketch format version: {}.'.format(state.get('version')))
+        res = cls()
+        res.dtype = state['dtype']
+        res.sketch_type = state['sketch_type']
+        res._set_params(state['params'])
+        res._set_accumulator(state['accumulator'])
+        return res
+
+    def _set_avg_length(self, acc):
+        if self.count == 0:
+            self.avg_len = 0
+        elif self.dtype in [int, float, datetime.datetime]:
+            self.avg_len = 1
+        elif self.dtype in [list, dict, str]:
+            self.avg_len = acc.total_length / float(self.count)
+        else:
+            self.avg_len = 0
+
+    def _set_stats(self, acc):
+        if acc.stats is not None:
+            stats = acc.stats
+            self.min_val = normalize_number(stats.min())
+            self.max_val = normalize_number(stats.max())
+            self.mean_val = normalize_number(stats.mean())
+            self.sum_val = normalize_number(stats.sum())
+            self.variance_val = normalize_number(stats.variance())
+            self.stdev_val = normalize_number(stats.stdev())
+        elif acc.track_range:
+            if acc.range_failed:
+                logging.warn('Datetime max or min did not compute.  ' +
+                             'Possible mixture of offset-native and offset-aware times.')
             else:
-                stats = self.defined.stats()
-                self.min_val = normalize_number(stats.min())
-                self.max_val = normalize_number(stats.max())
-                self.mean_val = normalize_number(stats.mean())
-                self.sum_val = normalize_number(stats.sum())
-                self.variance_val = normalize_number(stats.variance())
-                self.stdev_val = normalize_number(stats.stdev())
-                self.stats = stats
-
-    def _create_quantile_accumulator(self):
-        num_levels = self.quantile_accumulator_num_levels or 10
-        epsilon = self.quantile_accumulator_epsilon or 0.001
-        delta = self.quantile_accumulator_delta or 0.01
-        accumulator = QuantileAccumulator(self.min_val, self.max_val, num_levels, epsilon, delta)
-        accumulators = self._rdd.mapPartitions(accumulator)
-        return accumulators.reduce(lambda x, y: x.merge(y))
+                self.min_val = acc.min_val
+                self.max_val = acc.max_val
+
+    def _create_quantile_sketch(self):
+        return self._accumulate(stats=False, distinct=False, quantile_k=self._quantile_k()).quantiles
 
     def _create_frequency_sketch(self):
-        num_items = self.frequency_sketch_num_items or 500
-        epsilon = self.frequency_sketch_epsilon or 0.0001
-        delta = self.frequency_sketch_delta or 0.01
-        accumulator = FreqSketch(num_items, epsilon, delta)
-        accumulators = self._rdd.mapPartitions(accumulator.iterate_values)
-        return accumulators.aggregate(FreqSketch.initial_accumulator_value(),
-                                      FreqSketch.merge_accumulator_value,
-                                      FreqSketch.merge_accumulators)
+        return self._accumulate(stats=False, distinct=False, frequency_params=self._frequency_params()).frequency
 
     def size(self):
         return self.count
 
     def max(self):
         if self.sketch_type in ['numeric', 'date']:
-            self._create_stats()
             return self.max_val
         raise ValueError('max only available for numeric or date types')
 
     def min(self):
         if self.sketch_type in ['numeric', 'date']:
-            self._create_stats()
             return self.min_val
         raise ValueError('min only available for numeric or date types')
 
     def sum(self):
         if self.sketch_type == 'numeric':
-            self._create_stats()
             return self.sum_val
         raise ValueError('sum only available for numeric types')
 
     def mean(self):
         if self.sketch_type == 'numeric':
-            self._create_stats()
             return self.mean_val
         raise ValueError('mean only available for numeric types')
 
     def var(self):
         if self.sketch_type == 'numeric':
-            self._create_stats()
             return self.variance_val
         raise ValueError('var only available for numeric types')
 
     def avg_length(self):
-        if self.avg_len is None:
-            if self.count == 0:
-                self.avg_len = 0
-            elif self.dtype in [int, float, datetime.datetime]:
-                self.avg_len = 1
-            elif self.dtype in [list, dict, str]:
-                lens = self.defined.map(lambda x: len(x))
-                self.avg_len = lens.sum() / float(self.count)
-            else:
-                self.avg_len = 0
         return self.avg_len
 
     def num_undefined(self):
-        if self.num_undefined_val is None:
-            self.num_undefined_val = self._rdd.filter(lambda x: is_missing(x)).count()
         return self.num_undefined_val
 
-    def num_unique(self):
-        if self.num_unique_val is None:
+    def num_unique(self, approximate=True):
+        if approximate:
+            return self.num_unique_val
+        if self.exact_num_unique_val is None:
+            self._check_data()
             # distinct fails if the values are not hashable
             if self.dtype in [list, dict]:
                 rdd = self._rdd.map(lambda x: str(x))
             else:
                 rdd = self._rdd
-            self.num_unique_val = rdd.distinct().count()
-        return self.num_unique_val
+            self.exact_num_unique_val = rdd.distinct().count()
+        return self.exact_num_unique_val
 
-    def frequent_items(self):
+    def _frequencies(self):
+        if self.dtype in [list, dict]:
+            raise ValueError('frequent items not available for list or dict types')
         if self.frequency_sketch is None:
             self.frequency_sketch = self._create_frequency_sketch()
         return self.frequency_sketch
 
+    def frequent_items(self):
+        return self._frequencies().frequent_items()
+
     def tf_idf(self):
         """ Returns an RDD of td-idf dicts, one for each document. """
         def normalize_doc(doc):
@@ -209,6 +447,7 @@ class SketchImpl(XObjectImpl, TracedObject):
                 logging.warn('Document should be str -- is {}: {}'.format(type(doc).__name__, doc))
                 return []
             return doc.strip().lower().split()
+        self._check_data()
         if self.dtype is str:
             docs = self._rdd.map(normalize_doc)
         else:
@@ -262,16 +501,16 @@ class SketchImpl(XObjectImpl, TracedObject):
 
     def get_quantile(self, quantile_val):
         if self.sketch_type == 'numeric' or self.sketch_type == 'date':
-            if self.quantile_accumulator is None:
-                self._create_stats()
-                self.quantile_accumulator = self._create_quantile_accumulator()
-            return self.quantile_accumulator.ppf(quantile_val)
+            if self.quantile_sketch is None:
+                self.quantile_sketch = self._create_quantile_sketch()
+            if self.quantile_sketch is None:
+                raise ValueError('Quantiles did not compute.  ' +
+                                 'Possible mixture of offset-native and offset-aware times.')
+            return self.quantile_sketch.quantile(quantile_val)
         raise ValueError('get_quantile only available for numeric or date types')
 
     def frequency_count(self, element):
-        if self.frequency_sketch is None:
-            self.frequency_sketch = self._create_frequency_sketch()
-        return self.frequency_sketch.get(element, 0)
+        return self._frequencies().get(element)
 
     def element_length_summary(self):
         raise NotImplementedError('element_length_summary not implemented')
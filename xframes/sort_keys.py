@@ -0,0 +1,266 @@
+"""
+Build natively comparable sort keys, and range partition by them.
+
+A multi-column sort, where each column may be ascending or descending, is turned
+into a tuple key that python compares without calling back into python code for
+ordinary values.  Ascending values are used as they are, except that datetimes are
+converted to microseconds, so that they can be compared with missing values.
+Descending values are inverted:
+
+* numbers are negated
+* datetimes are converted to microseconds and negated
+* strings are encoded so that their order is reversed
+
+Missing values sort first when ascending, and last when descending, the same way
+that python orders None against other values.
+"""
+
+import bisect
+import datetime
+import random
+
+
+class _Greatest(object):
+    """ A value that compares greater than any other value. """
+    def __lt__(self, other):
+        return False
+
+    def __le__(self, other):
+        return isinstance(other, _Greatest)
+
+    def __gt__(self, other):
+        return not isinstance(other, _Greatest)
+
+    def __ge__(self, other):
+        return True
+
+    def __eq__(self, other):
+        return isinstance(other, _Greatest)
+
+    def __ne__(self, other):
+        return not isinstance(other, _Greatest)
+
+    def __hash__(self):
+        return 0
+
+GREATEST = _Greatest()
+
+
+class _Reversed(object):
+    """ Comparison wrapper that reverses the order of values that cannot be inverted. """
+    def __init__(self, val):
+        self.val = val
+
+    def __lt__(self, other):
+        if not isinstance(other, _Reversed):
+            return NotImplemented
+        return self.val > other.val
+
+    def __le__(self, other):
+        if not isinstance(other, _Reversed):
+            return NotImplemented
+        return self.val >= other.val
+
+    def __gt__(self, other):
+        if not isinstance(other, _Reversed):
+            return NotImplemented
+        return self.val < other.val
+
+    def __ge__(self, other):
+        if not isinstance(other, _Reversed):
+            return NotImplemented
+        return self.val <= other.val
+
+    def __eq__(self, other):
+        if not isinstance(other, _Reversed):
+            return NotImplemented
+        return self.val == other.val
+
+    def __ne__(self, other):
+        if not isinstance(other, _Reversed):
+            return NotImplemented
+        return self.val != other.val
+
+    def __hash__(self):
+        return hash(self.val)
+
+
+# Bytes are mapped to code points 1 through 256 in reverse order.
+# A string is followed by a terminator that is greater than any mapped byte,
+#  so that a string sorts after all strings that it is a prefix of.
+_INVERT_BYTES = {i: 256 - i for i in range(256)}
+_STR_TERMINATOR = unichr(257)
+
+_EPOCH_ORDINAL = datetime.datetime(1970, 1, 1).toordinal()
+
+
+def _invert_str(val):
+    if isinstance(val, unicode):
+        # utf-8 byte order is the same as code point order
+        val = val.encode('utf-8')
+    return val.decode('latin-1').translate(_INVERT_BYTES) + _STR_TERMINATOR
+
+
+def _invert_number(val):
+    return -val
+
+
+def _datetime_micros(val):
+    if val.tzinfo is not None:
+        val = val.replace(tzinfo=None) - val.utcoffset()
+    seconds = (val.toordinal() - _EPOCH_ORDINAL) * 86400 + val.hour * 3600 + val.minute * 60 + val.second
+    return seconds * 1000000 + val.microsecond
+
+
+def _invert_datetime(val):
+    return -_datetime_micros(val)
+
+
+def _invert_other(val):
+    return _Reversed(val)
+
+
+def _converter(typ, ascending):
+    if ascending:
+        if typ is not None and issubclass(typ, datetime.datetime):
+            return _datetime_micros
+        return None
+    return _inverter(typ)
+
+
+def _inverter(typ):
+    if typ is None:
+        return _invert_other
+    if issubclass(typ, (int, long, float)):
+        return _invert_number
+    if issubclass(typ, basestring):
+        return _invert_str
+    if issubclass(typ, datetime.datetime):
+        return _invert_datetime
+    return _invert_other
+
+
+def sort_key_encoder(column_types, ascending):
+    """
+    Build a function that extracts a sort key from a row.
+
+    Parameters
+    ----------
+    column_types : list[type]
+        The types of the sort columns.
+
+    ascending : list[bool]
+        For each sort column, True if it is sorted ascending.
+
+    Returns
+    -------
+    out : function(row, indexes)
+        A function that takes a row and the sort column indexes, and returns a tuple
+        that orders the rows as given by the sort specification.
+    """
+    converters = [_converter(typ, asc) for typ, asc in zip(column_types, ascending)]
+    missing = [None if asc else GREATEST for asc in ascending]
+    if all([converter is None for converter in converters]):
+        def make_key(row, indexes):
+            return tuple([row[i] for i in indexes])
+    else:
+        def convert(val, converter, missing_val):
+            if converter is None:
+                return val
+            if val is None:
+                return missing_val
+            return converter(val)
+
+        def make_key(row, indexes):
+            return tuple([convert(row[i], converter, missing_val)
+                          for i, converter, missing_val in zip(indexes, converters, missing)])
+    return make_key
+
+
+def range_bounds(keys, num_partitions, sample_per_partition=20):
+    """
+    Compute the boundaries that split an RDD of keys into ranges of roughly equal size.
+
+    Each input partition is sampled in a single pass.  Samples are weighted by the
+    size of the partition they come from, so that skewed partitions do not skew
+    the boundaries.
+
+    Parameters
+    ----------
+    keys : XRdd
+        The sort keys.
+
+    num_partitions : int
+        The number of ranges to produce.
+
+    sample_per_partition : int, optional
+        The number of samples to take for each output partition.
+
+    Returns
+    -------
+    out : list
+        A sorted list of num_partitions - 1 (or fewer) boundary keys.
+    """
+    if num_partitions <= 1:
+        return []
+    input_partitions = max(keys.getNumPartitions(), 1)
+    # oversample, as the spark range partitioner does
+    sample_size = max(1, 3 * sample_per_partition * num_partitions / input_partitions)
+
+    def reservoir(index, rows):
+        rng = random.Random(index)
+        sample = []
+        count = 0
+        for row in rows:
+            count += 1
+            if len(sample) < sample_size:
+                sample.append(row)
+            else:
+                j = rng.randint(0, count - 1)
+                if j < sample_size:
+                    sample[j] = row
+        yield count, sample
+
+    weighted = []
+    for count, sample in keys.mapPartitionsWithIndex(reservoir).collect():
+        if len(sample) == 0:
+            continue
+        weight = float(count) / len(sample)
+        weighted.extend([(key, weight) for key in sample])
+    if len(weighted) == 0:
+        return []
+    weighted.sort(key=lambda pair: pair[0])
+    total = sum([sample_weight for _, sample_weight in weighted])
+    step = total / num_partitions
+    bounds = []
+    cumulative = 0.0
+    target = step
+    for key, weight in weighted:
+        cumulative += weight
+        if cumulative >= target:
+            if len(bounds) == 0 or key > bounds[-1]:
+                bounds.append(key)
+            while cumulative >= target:
+                target += step
+            if len(bounds) == num_partitions - 1:
+                break
+    return bounds
+
+
+def range_partitioner(bounds):
+    """
+    Build a partition function that puts each key in its range.
+
+    Parameters
+    ----------
+    bounds : list
+        The boundaries, as computed by range_bounds.
+
+    Returns
+    -------
+    out : function(key)
+        A function that returns the partition number of the key.
+    """
+    def partition(key):
+        return bisect.bisect_left(bounds, key)
+    return partition
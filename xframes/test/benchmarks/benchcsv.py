@@ -0,0 +1,100 @@
+"""
+Benchmark csv loading.
+
+Generates a narrow csv file (4 columns) and a wide csv file (100 columns) in the
+layout of the files in xframes/test/files: a header line, then comma separated
+values, with some quoted strings and some NA values.
+
+The first part measures the single pass parser in xframes.csv_parse in a single
+process.  The second part loads the files through XFrame.read_csv.
+Both report rows per second.
+
+Run from the xframes/test directory:
+    python benchmarks/benchcsv.py [num_rows]
+"""
+import sys
+import os
+import time
+import shutil
+import tempfile
+
+from xframes import XFrame
+from xframes.csv_parse import parse_header, parse_partition, make_row_parser
+
+
+def timed(label, num_rows, fn):
+    start = time.time()
+    res = fn()
+    elapsed = time.time() - start
+    print '{:<40} {:8.3f} sec {:12.0f} rows/sec'.format(label, elapsed, num_rows / elapsed)
+    return res
+
+
+def write_narrow(path, num_rows):
+    with open(path, 'w') as f:
+        f.write('id,val,score,note\n')
+        for i in xrange(num_rows):
+            note = 'NA' if i % 10 == 0 else '"note {}"'.format(i)
+            f.write('{},{},{},{}\n'.format(i, 'val-{}'.format(i % 100), i * 0.5, note))
+    return ['id', 'val', 'score', 'note'], [int, str, float, str]
+
+
+def write_wide(path, num_rows, num_columns=100):
+    names = ['c{}'.format(j) for j in range(num_columns)]
+    types = [(int, float, str)[j % 3] for j in range(num_columns)]
+    with open(path, 'w') as f:
+        f.write(','.join(names) + '\n')
+        for i in xrange(num_rows):
+            fields = []
+            for j, typ in enumerate(types):
+                if typ is int:
+                    fields.append(str(i + j))
+                elif typ is float:
+                    fields.append(str((i + j) * 0.25))
+                else:
+                    fields.append('"s{}"'.format((i + j) % 1000))
+            f.write(','.join(fields) + '\n')
+    return names, types
+
+
+def bench_local(label, path, names, types):
+    with open(path) as f:
+        lines = f.read().splitlines()
+    params = {'delimiter': ','}
+    _, header = parse_header(lines[0], params, None)
+    parse_row = make_row_parser(types, names, ['NA'], range(len(names)))
+
+    def parse():
+        return sum(1 for _ in parse_partition(lines, params, None, len(names), header, parse_row, False))
+    timed('parse {}'.format(label), len(lines) - 1, parse)
+
+
+def bench_spark(label, path, names, types, num_rows):
+    hints = dict(zip(names, types))
+
+    def load():
+        return len(XFrame.read_csv(path, column_type_hints=hints, verbose=False))
+
+    def load_with_errors():
+        xf, errs = XFrame.read_csv_with_errors(path, column_type_hints=hints)
+        return len(xf)
+    timed('read_csv {}'.format(label), num_rows, load)
+    timed('read_csv_with_errors {}'.format(label), num_rows, load_with_errors)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        narrow_path = os.path.join(tmp_dir, 'bench-narrow.csv')
+        wide_path = os.path.join(tmp_dir, 'bench-wide.csv')
+        narrow = write_narrow(narrow_path, n)
+        wide = write_wide(wide_path, n / 10)
+        print 'Local parse'
+        bench_local('narrow', narrow_path, *narrow)
+        bench_local('wide', wide_path, *wide)
+        print 'Spark load'
+        bench_spark('narrow', narrow_path, narrow[0], narrow[1], n)
+        bench_spark('wide', wide_path, wide[0], wide[1], n / 10)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
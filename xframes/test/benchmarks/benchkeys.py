@@ -0,0 +1,103 @@
+"""
+Benchmark shuffle key encoding.
+
+Compares the tuple keys built by xframes.shuffle_keys against the json-encoded
+string keys that join, groupby and unique used previously.
+
+The first part measures encode and decode cost in a single process.
+The second part runs a keyed aggregation and a join through spark, on frames
+with a million rows.
+
+Run from the xframes/test directory:
+    python benchmarks/benchkeys.py [num_rows]
+"""
+import sys
+import time
+import json
+import datetime
+
+from xframes import XFrame
+from xframes.shuffle_keys import key_encoder, key_decoder
+
+
+def timed(label, fn):
+    start = time.time()
+    res = fn()
+    elapsed = time.time() - start
+    print '{:<40} {:8.3f} sec'.format(label, elapsed)
+    return res
+
+
+def make_rows(num_rows):
+    base = datetime.datetime(2015, 1, 1)
+    return [(i % 1000, 'key-{}'.format(i % 100), float(i), base + datetime.timedelta(seconds=i % 5000))
+            for i in xrange(num_rows)]
+
+
+def bench_local(rows):
+    print 'Local encode/decode, {} rows'.format(len(rows))
+    indexes = [0, 1, 2]
+    types = [int, str, float]
+    make_key = key_encoder(types)
+    decode_key = key_decoder(types)
+
+    def json_keys():
+        return [json.dumps([row[i] for i in indexes]) for row in rows]
+
+    def tuple_keys():
+        return [make_key(row, indexes) for row in rows]
+
+    json_encoded = timed('json encode', json_keys)
+    tuple_encoded = timed('tuple encode', tuple_keys)
+    timed('json decode', lambda: [json.loads(key) for key in json_encoded])
+    timed('tuple decode', lambda: [decode_key(key) for key in tuple_encoded])
+
+
+def bench_spark(num_rows):
+    print 'Spark, {} rows'.format(num_rows)
+    xf = XFrame({'id': [i % 1000 for i in xrange(num_rows)],
+                 'name': ['key-{}'.format(i % 100) for i in xrange(num_rows)],
+                 'val': [float(i) for i in xrange(num_rows)]})
+    xf = xf[['id', 'name', 'val']]
+    rdd = xf.to_rdd()
+    rdd.cache()
+    rdd.count()
+    indexes = [0, 1]
+    make_key = key_encoder([int, str])
+
+    def json_group():
+        keyed = rdd.map(lambda row: (json.dumps([row[i] for i in indexes]), row[2]))
+        return keyed.reduceByKey(lambda x, y: x + y).map(lambda pair: (json.loads(pair[0]), pair[1])).count()
+
+    def tuple_group():
+        keyed = rdd.map(lambda row: (make_key(row, indexes), row[2]))
+        return keyed.reduceByKey(lambda x, y: x + y).count()
+
+    timed('json keys: aggregate by key', json_group)
+    timed('tuple keys: aggregate by key', tuple_group)
+
+    right = XFrame({'id': range(1000), 'label': ['label-{}'.format(i) for i in range(1000)]})
+    right = right[['id', 'label']]
+    right_rdd = right.to_rdd()
+
+    def json_join():
+        left_keyed = rdd.map(lambda row: (json.dumps([row[0]]), row))
+        right_keyed = right_rdd.map(lambda row: (json.dumps([row[0]]), row))
+        return left_keyed.join(right_keyed).count()
+
+    def tuple_join():
+        left_keyed = rdd.map(lambda row: ((row[0], ), row))
+        right_keyed = right_rdd.map(lambda row: ((row[0], ), row))
+        return left_keyed.join(right_keyed).count()
+
+    timed('json keys: join', json_join)
+    timed('tuple keys: join', tuple_join)
+    timed('XFrame.join', lambda: len(xf.join(right, on='id')))
+    timed('XFrame.groupby', lambda: len(xf.groupby(['id', 'name'], {})))
+    rdd.unpersist()
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    bench_local(make_rows(n))
+    bench_spark(n)
@@ -0,0 +1,101 @@
+"""
+Benchmark count-min sketch updates and merges.
+
+Compares counting one value at a time against counting a batch of values with
+numpy, for the CMSketch and QuantileAccumulator in xframes.dsq and the FreqSketch
+in xframes.frequent.  Each batched sketch is checked against the one counted a
+value at a time, since they must give the same counts to stay mergeable.
+
+Run from the xframes/test directory:
+    python benchmarks/benchsketch.py [num_values]
+"""
+import sys
+import time
+import random
+
+from xframes.dsq import CMSketch, QuantileAccumulator
+from xframes.frequent import FreqSketch
+
+
+def timed(label, fn):
+    start = time.time()
+    res = fn()
+    elapsed = time.time() - start
+    print '{:<40} {:8.3f} sec'.format(label, elapsed)
+    return res
+
+
+def make_values(num_values):
+    random.seed(1729)
+    return [random.randint(0, 10000) for _ in xrange(num_values)]
+
+
+def bench_cm_sketch(values):
+    print 'CMSketch, {} values'.format(len(values))
+    hash_state = CMSketch.generate_hash_state(5)
+
+    def one_at_a_time():
+        sketch = CMSketch(27183, 5, hash_state)
+        for value in values:
+            sketch.increment(value)
+        return sketch
+
+    def batched():
+        sketch = CMSketch(27183, 5, hash_state)
+        sketch.increment_batch(values)
+        return sketch
+
+    scalar = timed('increment', one_at_a_time)
+    batch = timed('increment_batch', batched)
+    assert list(scalar.counts()) == list(batch.counts())
+    timed('merge', lambda: scalar.merge(batch))
+
+
+def bench_quantile_accumulator(values):
+    print 'QuantileAccumulator, {} values'.format(len(values))
+
+    def one_at_a_time():
+        accumulator = QuantileAccumulator(0, 10000, 10, 0.001, 0.01)
+        for value in values:
+            accumulator.increment(value)
+        return accumulator
+
+    def batched():
+        accumulator = QuantileAccumulator(0, 10000, 10, 0.001, 0.01)
+        for accumulator in accumulator(iter(values)):
+            return accumulator
+
+    scalar = timed('increment', one_at_a_time)
+    batch = timed('mapPartitions call (batched)', batched)
+    for scalar_sketch, batch_sketch in zip(scalar.sketches(), batch.sketches()):
+        assert list(scalar_sketch.counts()) == list(batch_sketch.counts())
+    timed('merge', lambda: scalar.merge(batch))
+
+
+def bench_freq_sketch(values):
+    print 'FreqSketch, {} values'.format(len(values))
+    keys = ['key-{}'.format(value) for value in values]
+
+    def one_at_a_time():
+        sketch = FreqSketch(500, 0.0001, 0.01)
+        for key in keys:
+            sketch.increment(key)
+        return sketch
+
+    def batched():
+        sketch = FreqSketch(500, 0.0001, 0.01)
+        for sketch in sketch.iterate_values(iter(keys)):
+            return sketch
+
+    scalar = timed('increment', one_at_a_time)
+    batch = timed('iterate_values (batched)', batched)
+    assert list(scalar.count) == list(batch.count)
+    timed('merge', lambda: scalar.merge(batch))
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    values = make_values(n)
+    bench_cm_sketch(values)
+    bench_quantile_accumulator(values)
+    bench_freq_sketch(values)
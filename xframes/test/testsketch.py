@@ -6,6 +6,7 @@ import unittest
 # python -m unittest testsketch.TestSketchConstructor.test_construct
 
 from xframes.xarray import XArray
+from xframes.sketch import Sketch
 
 
 def eq_list(expected, result):
@@ -68,6 +69,11 @@ class TestSketchConstructor(unittest.TestCase):
         ss = t.sketch_summary()
         self.assertEqual(5, ss.num_unique())
 
+    def test_num_unique_exact(self):
+        t = XArray([[1], [2], [1]])
+        ss = t.sketch_summary()
+        self.assertEqual(2, ss.num_unique(approximate=False))
+
     def test_frequent_items(self):
         t = XArray([1, 2, 3, 2])
         ss = t.sketch_summary()
@@ -124,6 +130,108 @@ class TestSketchConstructor(unittest.TestCase):
         self.assertIsNone(ss.max())
         self.assertEqual(0, ss.avg_length())
 
+    def test_quantile_float(self):
+        t = XArray([float(i) for i in range(1000)])
+        ss = t.sketch_summary()
+        self.assertEqual(0.0, ss.quantile(0.0))
+        self.assertAlmostEqual(500, ss.quantile(0.5), delta=10)
+        self.assertEqual(999.0, ss.quantile(1.0))
+
+    def test_quantile_params(self):
+        t = XArray(range(1000))
+        ss = t.sketch_summary()
+        ss.set_quantile_accumulator_parms(epsilon=0.05)
+        self.assertAlmostEqual(500, ss.quantile(0.5), delta=50)
+
+    def test_num_unique_str(self):
+        t = XArray(['a', 'b', 'a', None, 'c'])
+        ss = t.sketch_summary()
+        self.assertEqual(4, ss.num_unique())
+        self.assertEqual(1, ss.num_undefined())
+        self.assertEqual({'a': 2, 'b': 1, 'c': 1}, ss.frequent_items())
+
+    def test_frequent_items_list(self):
+        t = XArray([[1, 2], [3]])
+        ss = t.sketch_summary()
+        with self.assertRaises(ValueError):
+            ss.frequent_items()
+
+
+
+class TestSketchSave(unittest.TestCase):
+    """
+    Tests sketch save and load
+    """
+
+    def test_save_load(self):
+        t = XArray([1, 2, 3, 4, 5, None])
+        ss = t.sketch_summary()
+        path = 'tmp/sketch-binary'
+        ss.save(path)
+        res = Sketch.load(path)
+        self.assertEqual(5, res.size())
+        self.assertEqual(1, res.num_undefined())
+        self.assertEqual(5, res.max())
+        self.assertEqual(1, res.min())
+        self.assertEqual(15, res.sum())
+        self.assertAlmostEqual(2.0, res.var())
+        self.assertEqual(3, res.quantile(0.5))
+        self.assertEqual(6, res.num_unique())
+        self.assertEqual(1, res.frequency_count(2))
+
+    def test_save_load_str(self):
+        t = XArray(['a', 'b', 'a', 'cc'])
+        ss = t.sketch_summary()
+        path = 'tmp/sketch-binary'
+        ss.save(path)
+        res = Sketch.load(path)
+        self.assertEqual({'a': 2, 'b': 1, 'cc': 1}, res.frequent_items())
+        self.assertEqual(1.25, res.avg_length())
+        with self.assertRaises(ValueError):
+            res.num_unique(approximate=False)
+
+
+class TestSketchMerge(unittest.TestCase):
+    """
+    Tests sketch merge and update
+    """
+
+    def test_merge(self):
+        ss1 = XArray([1, 2, 3]).sketch_summary()
+        ss2 = XArray([4, 5, None]).sketch_summary()
+        res = ss1.merge(ss2)
+        self.assertEqual(5, res.size())
+        self.assertEqual(1, res.num_undefined())
+        self.assertEqual(5, res.max())
+        self.assertEqual(1, res.min())
+        self.assertEqual(3, res.mean())
+        self.assertAlmostEqual(2.0, res.var())
+        self.assertEqual(3, res.quantile(0.5))
+        self.assertEqual(6, res.num_unique())
+        self.assertEqual(6, res.num_unique(approximate=False))
+        self.assertEqual(3, ss1.size())
+
+    def test_merge_type(self):
+        ss1 = XArray([1, 2, 3]).sketch_summary()
+        ss2 = XArray(['a', 'b']).sketch_summary()
+        with self.assertRaises(TypeError):
+            ss1.merge(ss2)
+
+    def test_update(self):
+        ss = XArray(['a', 'b', 'a']).sketch_summary()
+        res = ss.update(XArray(['a', 'c']))
+        self.assertEqual(5, res.size())
+        self.assertEqual(3, res.num_unique())
+        self.assertEqual({'a': 3, 'b': 1, 'c': 1}, res.frequent_items())
+
+    def test_update_loaded(self):
+        path = 'tmp/sketch-binary'
+        XArray(range(1000)).sketch_summary().save(path)
+        res = Sketch.load(path).update(XArray(range(1000, 2000)))
+        self.assertEqual(2000, res.size())
+        self.assertEqual(1999, res.max())
+        self.assertAlmostEqual(1000, res.quantile(0.5), delta=40)
+
 
 if __name__ == '__main__':
     unittest.main()
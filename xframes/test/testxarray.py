@@ -5,6 +5,7 @@ import array
 import datetime
 import pickle
 import shutil
+import gzip
 
 # python testxarray.py
 # python -m unittest testxarray
@@ -368,6 +369,15 @@ class TestXArraySaveCsv(XArrayUnitTestCase):
             self.assertEqual('2', f.readline().strip())
             self.assertEqual('3', f.readline().strip())
 
+    def test_save_gzip(self):
+        t = XArray([1, 2, 3])
+        path = 'tmp/array-csv.csv.gz'
+        t.save(path)
+        with gzip.open(path) as f:
+            self.assertEqual('1', f.readline().strip())
+            self.assertEqual('2', f.readline().strip())
+            self.assertEqual('3', f.readline().strip())
+
 
 class TestXArrayRepr(XArrayUnitTestCase):
     """
@@ -442,6 +452,16 @@ class TestXArrayIterator(XArrayUnitTestCase):
         for elem, expect in zip(t, [0, 1, 2]):
             self.assertEquals(expect, elem)
 
+    def test_iter_partitions(self):
+        rdd = XArray(range(100)).to_rdd(number_of_partitions=7)
+        t = XArray.from_rdd(rdd, int)
+        self.assertListEqual(range(100), list(t))
+
+    def test_iter_twice(self):
+        t = XArray([0, 1, 2])
+        self.assertListEqual([0, 1, 2], list(t))
+        self.assertListEqual([0, 1, 2], list(t))
+
 
 class TestXArrayAddScalar(XArrayUnitTestCase):
     """
@@ -600,6 +620,37 @@ class TestXArrayOpScalar(XArrayUnitTestCase):
         self.assertFalse(res[1])
         self.assertTrue(res[2])
 
+    # noinspection PyTypeChecker
+    def test_div_scalar_float(self):
+        t = XArray([1.0, 2.0, -3.0])
+        res = t / 2
+        self.assertColumnEqual([0.5, 1.0, -1.5], res)
+
+    # noinspection PyTypeChecker
+    def test_div_scalar_negative(self):
+        t = XArray([-1, -2, -3])
+        res = t / 2
+        self.assertColumnEqual([-1, -1, -2], res)
+
+    # noinspection PyTypeChecker
+    def test_mul_scalar_large(self):
+        t = XArray([1, 2, 3])
+        res = t * 2 ** 40
+        self.assertColumnEqual([2 ** 40, 2 ** 41, 3 * 2 ** 40], res)
+
+    # noinspection PyTypeChecker
+    def test_gt_scalar_type(self):
+        t = XArray([1, 2, 3])
+        res = t > 2
+        self.assertIs(int, res.dtype())
+        self.assertColumnEqual([False, False, True], res)
+
+    # noinspection PyTypeChecker
+    def test_rdiv_scalar_float(self):
+        t = XArray([1.0, 2.0, 4.0])
+        res = 2 / t
+        self.assertColumnEqual([2.0, 1.0, 0.5], res)
+
     def test_and_scalar(self):
         t = XArray([1, 2, 3])
         with self.assertRaises(TypeError):
@@ -704,6 +755,31 @@ class TestXArrayOpVector(XArrayUnitTestCase):
         self.assertEqual(1, res[1])
         self.assertEqual(1, res[2])
 
+    def test_div_vector_negative(self):
+        t1 = XArray([2, 2, -2])
+        t2 = XArray([-7, 7, 7])
+        res = t2 / t1
+        self.assertColumnEqual([-4, 3, -4], res)
+
+    def test_add_vector_large_int(self):
+        t1 = XArray([2 ** 62, 1])
+        t2 = XArray([2 ** 62, 2])
+        res = t1 + t2
+        self.assertColumnEqual([2 ** 63, 3], res)
+
+    def test_add_vector_int_float(self):
+        t1 = XArray([1, 2])
+        t2 = XArray([0.5, 1.5])
+        res = t1 + t2
+        self.assertColumnEqual([1.5, 3.5], res)
+
+    def test_lt_vector_float_partitions(self):
+        t1 = XArray.from_rdd(XArray([float(i) for i in range(100)]).to_rdd(number_of_partitions=5), float)
+        t2 = XArray.from_rdd(XArray([50.0] * 100).to_rdd(number_of_partitions=5), float)
+        res = t1 < t2
+        self.assertIs(int, res.dtype())
+        self.assertColumnEqual([True] * 50 + [False] * 50, res)
+
 
 class TestXArrayOpUnary(XArrayUnitTestCase):
     """
@@ -730,6 +806,16 @@ class TestXArrayOpUnary(XArrayUnitTestCase):
         self.assertEqual(2, res[1])
         self.assertEqual(3, res[2])
 
+    def test_neg_unary_float(self):
+        t = XArray([1.5, -2.5, 0.0])
+        res = -t
+        self.assertColumnEqual([-1.5, 2.5, 0.0], res)
+
+    def test_abs_unary_large_int(self):
+        t = XArray([-2 ** 62, 3])
+        res = abs(t)
+        self.assertColumnEqual([2 ** 62, 3], res)
+
 
 class TestXArrayLogicalFilter(XArrayUnitTestCase):
     """
@@ -1344,6 +1430,13 @@ class TestXArrayFlatMap(XArrayUnitTestCase):
         self.assertEqual('b', res[4])
         self.assertEqual('c', res[5])
 
+    def test_flat_map_zip_original(self):
+        t = XArray([[1, 2], [], [3]])
+        flat = t.flat_map(lambda x: x)
+        lengths = t.apply(len)
+        res = flat + lengths
+        self.assertColumnEqual([3, 2, 4], res)
+
     def test_flat_map_float_cast(self):
         t = XArray([[1], [1, 2], [1, 2, 3]])
         res = t.flat_map(lambda x: x, dtype=float)
@@ -1666,6 +1759,12 @@ class TestXArrayMax(XArrayUnitTestCase):
         t = XArray([1.0, 2.0, 3.0])
         self.assertEqual(3.0, t.max())
 
+    def test_max_large_int(self):
+        t = XArray([1, 2 ** 60 + 1, 2 ** 60])
+        res = t.max()
+        self.assertIsInstance(res, int)
+        self.assertEqual(2 ** 60 + 1, res)
+
 
 class TestXArrayMin(XArrayUnitTestCase):
     """
@@ -1688,6 +1787,12 @@ class TestXArrayMin(XArrayUnitTestCase):
         t = XArray([1.0, 2.0, 3.0])
         self.assertEqual(1.0, t.min())
 
+    def test_min_large_int(self):
+        t = XArray([2 ** 60 + 1, 2 ** 60 + 3, 2 ** 60 + 2])
+        res = t.min()
+        self.assertIsInstance(res, int)
+        self.assertEqual(2 ** 60 + 1, res)
+
 
 class TestXArraySum(XArrayUnitTestCase):
     """
@@ -1855,6 +1960,52 @@ class TestXArrayNumNonzero(XArrayUnitTestCase):
         self.assertEqual(2, t.nnz())
 
 
+class TestXArrayAggregateStats(XArrayUnitTestCase):
+    """
+    Tests XArray aggregate_stats
+    """
+    def test_aggregate_stats_int(self):
+        t = XArray([1, 2, 3, None, 0])
+        res = t.aggregate_stats(['count', 'missing', 'min', 'max', 'sum', 'mean', 'nnz'])
+        self.assertDictEqual({'count': 5, 'missing': 1, 'min': 0, 'max': 3, 'sum': 6, 'mean': 1.5, 'nnz': 3}, res)
+
+    def test_aggregate_stats_var(self):
+        t = XArray([1.0, 2.0, 3.0])
+        res = t.aggregate_stats(['var', 'std'])
+        self.assertEqual(2.0 / 3.0, res['var'])
+        self.assertEqual(math.sqrt(2.0 / 3.0), res['std'])
+
+    def test_aggregate_stats_all(self):
+        t = XArray([1, 2, 3])
+        res = t.aggregate_stats()
+        self.assertListEqual(sorted(['count', 'missing', 'min', 'max', 'sum', 'mean', 'var', 'std', 'nnz']),
+                             sorted(res.keys()))
+
+    def test_aggregate_stats_str(self):
+        t = XArray(['a', 'b', None])
+        res = t.aggregate_stats(['count', 'missing', 'max'])
+        self.assertDictEqual({'count': 3, 'missing': 1, 'max': None}, res)
+
+    def test_aggregate_stats_empty(self):
+        t = XArray([], dtype=int)
+        res = t.aggregate_stats(['count', 'mean'])
+        self.assertDictEqual({'count': 0, 'mean': None}, res)
+
+    def test_aggregate_stats_bad_stat(self):
+        t = XArray([1, 2, 3])
+        with self.assertRaises(ValueError):
+            t.aggregate_stats(['median'])
+
+    def test_aggregate_stats_reused(self):
+        t = XArray([1, 2, 3])
+        t.aggregate_stats()
+        self.assertTrue(t._is_materialized())
+        self.assertEqual(3, t.max())
+        self.assertEqual(1, t.min())
+        self.assertEqual(6, t.sum())
+        self.assertEqual(3, t.size())
+
+
 class TestXArrayDatetimeToStr(XArrayUnitTestCase):
     """
     Tests XArray datetime_to_str
@@ -2275,6 +2426,17 @@ class TestXArrayTopkIndex(XArrayUnitTestCase):
         res = t.topk_index(1, reverse=True)
         self.assertColumnEqual([1, 0, 0], res)
 
+    def test_topk_index_partitions(self):
+        rdd = XArray(range(100)).to_rdd(number_of_partitions=7)
+        t = XArray.from_rdd(rdd, int)
+        res = t.topk_index(3)
+        self.assertColumnEqual([0] * 97 + [1] * 3, res)
+
+    def test_topk_index_reverse_datetime(self):
+        t = XArray([datetime.datetime(2015, 1, 3), datetime.datetime(2015, 1, 1), datetime.datetime(2015, 1, 2)])
+        res = t.topk_index(2, reverse=True)
+        self.assertColumnEqual([0, 1, 1], res)
+
 
 class TestXArraySketchSummary(XArrayUnitTestCase):
     """
@@ -2408,6 +2570,24 @@ class TestXArrayUnique(XArrayUnitTestCase):
         self.assertEqualLen(3, res)
         self.assertListEqual([1, 2, 3], sorted(list(res)))
 
+    def test_approx_unique_count(self):
+        t = XArray([1, 2, 3, 1, 2, None])
+        self.assertEqual(4, t.approx_unique_count())
+
+    def test_approx_unique_count_minus_one(self):
+        # python hashes -1 and -2 alike
+        t = XArray([-1, -2])
+        self.assertEqual(2, t.approx_unique_count())
+
+    def test_approx_unique_count_large(self):
+        t = XArray(['id{}'.format(i % 20000) for i in range(40000)])
+        self.assertAlmostEqual(20000, t.approx_unique_count(rel_error=0.02), delta=1200)
+
+    def test_approx_unique_count_bad_error(self):
+        t = XArray([1, 2, 3])
+        with self.assertRaises(ValueError):
+            t.approx_unique_count(rel_error=0)
+
     def test_unique_float(self):
         t = XArray([1.0, 2.0, 3.0, 1.0, 2.0])
         res = t.unique()
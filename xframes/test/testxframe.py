@@ -6,6 +6,8 @@ from datetime import datetime
 import array
 import pickle
 import shutil
+import gzip
+import gc
 
 from pyspark.sql.types import StructType, StructField, IntegerType, StringType
 
@@ -18,8 +20,10 @@ import pandas
 
 from xframes import XArray
 from xframes import XFrame
+from xframes.xframe_impl import XFrameImpl
+from xframes.perf_tracker import PerfTracker
 from xframes.aggregate import SUM, ARGMAX, ARGMIN, MAX, MIN, COUNT, MEAN, \
-    VARIANCE, STDV, SELECT_ONE, CONCAT
+    VARIANCE, STDV, SELECT_ONE, CONCAT, APPROX_COUNT_DISTINCT, QUANTILE
 
 
 def delete_file_or_dir(path):
@@ -407,6 +411,17 @@ class TestXFrameReadCsvWithErrors(XFrameUnitTestCase):
         self.assertEqual('id,\x00val', csv_errs[0])
         self.assertEqualLen(0, res)
 
+    def test_read_csv_width_error_nrows(self):
+        path = 'files/test-frame-width-err.csv'
+        res, errs = XFrame.read_csv_with_errors(path, nrows=1)
+        self.assertIn('width', errs)
+        width_errs = errs['width']
+        self.assertEqualLen(2, width_errs)
+        self.assertEqual('1', width_errs[0])
+        self.assertEqual('2,x,y', width_errs[1])
+        self.assertEqualLen(1, res)
+        self.assertDictEqual({'id': 2, 'val': 'b'}, res[0])
+
     def test_read_csv_file_not_exist(self):
         path = 'files/does-not-exist.csv'
         with self.assertRaises(ValueError):
@@ -552,6 +567,44 @@ class TestXFrameReadCsv(XFrameUnitTestCase):
         self.assertDictEqual({'id': None, 'val': 'b'}, res[1])
         self.assertDictEqual({'id': 3, 'val': 'c'}, res[2])
 
+    def test_read_csv_infer_late_type(self):
+        path = 'files/test-frame-late-float.csv'
+        res = XFrame.read_csv(path)
+        self.assertEqualLen(150, res)
+        self.assertListEqual([float, str], res.column_types())
+        self.assertDictEqual({'id': 0.0, 'val': 'a'}, res[0])
+        self.assertDictEqual({'id': 149.5, 'val': 'b'}, res[149])
+
+    def test_read_csv_nrows(self):
+        path = 'files/test-frame.csv'
+        res = XFrame.read_csv(path, nrows=2)
+        self.assertEqualLen(2, res)
+        self.assertListEqual(['id', 'val'], res.column_names())
+        self.assertListEqual([int, str], res.column_types())
+        self.assertDictEqual({'id': 1, 'val': 'a'}, res[0])
+        self.assertDictEqual({'id': 2, 'val': 'b'}, res[1])
+
+    def test_read_csv_nrows_large(self):
+        path = 'files/test-frame-late-float.csv'
+        res = XFrame.read_csv(path, nrows=120, column_type_hints={'id': float})
+        self.assertEqualLen(120, res)
+        self.assertDictEqual({'id': 119.0, 'val': 'a'}, res[119])
+
+    def test_read_csv_drop_col(self):
+        path = 'files/test-frame-drop-col.csv'
+        res = XFrame.read_csv(path, column_type_hints={'id': int})
+        self.assertEqualLen(3, res)
+        self.assertListEqual(['id', 'val'], res.column_names())
+        self.assertListEqual([int, str], res.column_types())
+        self.assertDictEqual({'id': 1, 'val': 'a'}, res[0])
+        self.assertDictEqual({'id': 2, 'val': 'b'}, res[1])
+        self.assertDictEqual({'id': 3, 'val': 'c'}, res[2])
+
+    def test_read_csv_hints_str_rows(self):
+        path = 'files/test-frame.csv'
+        res = XFrame.read_csv(path, column_type_hints=str)
+        self.assertIsInstance(res.to_rdd().first(), tuple)
+
     def test_read_csv_file_not_exist(self):
         path = 'files/does-not-exist.csv'
         with self.assertRaises(ValueError):
@@ -684,6 +737,52 @@ class TestXFrameReadParquet(XFrameUnitTestCase):
         with self.assertRaises(ValueError):
             _ = XFrame(path)
 
+    def test_read_parquet_columns(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c'], 'x': [1.0, 2.0, 3.0]})
+        path = 'tmp/frame-parquet'
+        t.save(path, format='parquet')
+
+        res = XFrame.read_parquet('tmp/frame-parquet.parquet', columns=['val', 'id'])
+        res = res.sort('id')
+        self.assertListEqual(['val', 'id'], res.column_names())
+        self.assertListEqual([str, int], res.column_types())
+        self.assertDictEqual({'id': 1, 'val': 'a'}, res[0])
+
+    def test_read_parquet_filter(self):
+        t = XFrame({'id': [1, 2, 3, 4], 'val': ['a', 'b', 'c', 'd']})
+        path = 'tmp/frame-parquet'
+        t.save(path, format='parquet')
+
+        res = XFrame.read_parquet('tmp/frame-parquet.parquet', filter=[('id', '>', 1), ('val', '!=', 'c')])
+        res = res.sort('id')
+        self.assertEqualLen(2, res)
+        self.assertDictEqual({'id': 2, 'val': 'b'}, res[0])
+        self.assertDictEqual({'id': 4, 'val': 'd'}, res[1])
+
+    def test_read_parquet_filter_in(self):
+        t = XFrame({'id': [1, 2, 3, 4], 'val': ['a', 'b', 'c', 'd']})
+        path = 'tmp/frame-parquet'
+        t.save(path, format='parquet')
+
+        res = XFrame.read_parquet('tmp/frame-parquet.parquet', columns=['id'], filter=('val', 'in', ['a', 'd']))
+        self.assertListEqual([1, 4], sorted(res['id']))
+
+    def test_read_parquet_filter_bad_op(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        path = 'tmp/frame-parquet'
+        t.save(path, format='parquet')
+
+        with self.assertRaises(ValueError):
+            XFrame.read_parquet('tmp/frame-parquet.parquet', filter=('id', '=~', 1))
+
+    def test_read_parquet_bad_column(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        path = 'tmp/frame-parquet'
+        t.save(path, format='parquet')
+
+        with self.assertRaises(ValueError):
+            XFrame.read_parquet('tmp/frame-parquet.parquet', columns=['xx'])
+
 
 class TestXFrameFromXArray(XFrameUnitTestCase):
     """
@@ -872,6 +971,12 @@ class TestXFrameFromRdd(XFrameUnitTestCase):
         self.assertDictEqual({'X.0': None, 'X.1': 'a'}, res[0])
         self.assertDictEqual({'X.0': 2, 'X.1': 'b'}, res[1])
 
+    def test_from_rdd_infer_types(self):
+        sc = XFrame.spark_context()
+        rdd = sc.parallelize([(None, 'a'), (2, 'b'), (3.0, 'c')])
+        res = XFrame.from_rdd(rdd)
+        self.assertListEqual([float, str], res.column_types())
+
     def test_from_rdd_names_types(self):
         sc = XFrame.spark_context()
         rdd = sc.parallelize([(None, 'a'), (2, 'b'), (3, 'c')])
@@ -1005,6 +1110,31 @@ class TestXFrameDtype(XFrameUnitTestCase):
         self.assertIs(str, dt[1])
 
 
+class TestXFrameDescribe(XFrameUnitTestCase):
+    """
+    Tests XFrame describe
+    """
+
+    def test_describe(self):
+        t = XFrame({'id': [1, 2, 3, None], 'val': ['a', 'b', 'c', 'd']})
+        res = t.describe()
+        self.assertListEqual(['id', 'val'], sorted(res.keys()))
+        self.assertDictEqual({'count': 4, 'missing': 1, 'min': 1, 'max': 3, 'sum': 6, 'mean': 2.0,
+                              'var': 2.0 / 3.0, 'std': math.sqrt(2.0 / 3.0), 'nnz': 3}, res['id'])
+        self.assertDictEqual({'count': 4, 'missing': 0, 'min': None, 'max': None, 'sum': None, 'mean': None,
+                              'var': None, 'std': None, 'nnz': 4}, res['val'])
+
+    def test_describe_selected(self):
+        t = XFrame({'id': [1, 2, 3], 'val': [1.0, 0.0, 3.0]})
+        res = t.describe(['max', 'nnz'])
+        self.assertDictEqual({'id': {'max': 3, 'nnz': 3}, 'val': {'max': 3.0, 'nnz': 2}}, res)
+
+    def test_describe_bad_stat(self):
+        t = XFrame({'id': [1, 2, 3]})
+        with self.assertRaises(ValueError):
+            t.describe(['median'])
+
+
 class TestXFrameTableLineage(XFrameUnitTestCase):
     """
     Tests XFrame table lineage
@@ -1984,6 +2114,98 @@ class TestXFrameTopk(XFrameUnitTestCase):
         self.assertColumnEqual([30, 20], res['id'])
         self.assertColumnEqual(['a', 'b'], res['val'])
 
+    def test_topk_partitions(self):
+        t = XFrame({'id': range(100)})
+        t['val'] = t['id'].apply(lambda x: str(x))
+        t = XFrame.from_rdd(t.to_rdd().repartition(7), column_names=['id', 'val'], column_types=[int, str])
+        res = t.topk('id', 3)
+        self.assertColumnEqual([99, 98, 97], res['id'])
+        self.assertColumnEqual(['99', '98', '97'], res['val'])
+
+    def test_topk_more_than_rows(self):
+        t = XFrame({'id': [10, 30, 20], 'val': ['a', 'c', 'b']})
+        res = t.topk('id', 5, reverse=True)
+        self.assertColumnEqual([10, 20, 30], res['id'])
+
+    def test_topk_bad_column(self):
+        t = XFrame({'id': [10, 30, 20], 'val': ['a', 'c', 'b']})
+        with self.assertRaises(ValueError):
+            t.topk('xx', 2)
+
+
+class TestXFrameColumnar(XFrameUnitTestCase):
+    """
+    Tests XFrame stored by column
+    """
+
+    def test_to_columnar(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', None]})[['id', 'val']]
+        res = t.to_columnar()
+        self.assertTrue(res.is_columnar())
+        self.assertFalse(t.is_columnar())
+        self.assertEqualLen(3, res)
+        self.assertListEqual(['id', 'val'], res.column_names())
+        self.assertListEqual([int, str], res.column_types())
+        self.assertDictEqual({'id': 3, 'val': None}, res[2])
+
+    def test_select_column(self):
+        t = XFrame({'id': [1, 2, 3], 'val': [1.5, 2.5, 3.5]}).to_columnar()
+        self.assertColumnEqual([1, 2, 3], t['id'])
+        self.assertColumnEqual([1.5, 2.5, 3.5], t['val'])
+
+    def test_select_columns(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c'], 'x': [1.0, 2.0, 3.0]}).to_columnar()
+        res = t[['x', 'id']]
+        self.assertTrue(res.is_columnar())
+        self.assertListEqual(['x', 'id'], res.column_names())
+        self.assertListEqual([float, int], res.column_types())
+        self.assertDictEqual({'x': 2.0, 'id': 2}, res[1])
+
+    def test_remove_column(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c'], 'x': [1.0, 2.0, 3.0]})[['id', 'val', 'x']]
+        res = t.to_columnar().remove_column('val')
+        self.assertTrue(res.is_columnar())
+        self.assertListEqual(['id', 'x'], res.column_names())
+        self.assertDictEqual({'id': 1, 'x': 1.0}, res[0])
+
+    def test_remove_columns(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c'], 'x': [1.0, 2.0, 3.0]})[['id', 'val', 'x']]
+        res = t.to_columnar().remove_columns(['id', 'x'])
+        self.assertListEqual(['val'], res.column_names())
+        self.assertColumnEqual(['a', 'b', 'c'], res['val'])
+
+    def test_swap_columns(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})[['id', 'val']]
+        res = t.to_columnar().swap_columns('id', 'val')
+        self.assertListEqual(['val', 'id'], res.column_names())
+        self.assertListEqual([str, int], res.column_types())
+        self.assertEqual(('a', 1), res.to_rdd().first())
+
+    def test_add_column(self):
+        t = XFrame({'id': [1, 2, 3]}).to_columnar()
+        res = t.add_column(t['id'] * 10, 'tens')
+        self.assertTrue(res.is_columnar())
+        self.assertListEqual(['id', 'tens'], res.column_names())
+        self.assertDictEqual({'id': 3, 'tens': 30}, res[2])
+
+    def test_rename(self):
+        t = XFrame({'id': [1, 2, 3]}).to_columnar()
+        res = t.rename({'id': 'new_id'})
+        self.assertListEqual(['new_id'], res.column_names())
+        self.assertColumnEqual([1, 2, 3], res['new_id'])
+
+    def test_row_operation(self):
+        t = XFrame({'id': [3, 1, 2], 'val': ['c', 'a', 'b']}).to_columnar()
+        res = t.sort('id')
+        self.assertFalse(res.is_columnar())
+        self.assertColumnEqual(['a', 'b', 'c'], res['val'])
+
+    def test_in_place(self):
+        t = XFrame({'id': [1, 2, 3]}).to_columnar()
+        t['val'] = 'x'
+        self.assertFalse(t.is_columnar())
+        self.assertDictEqual({'id': 1, 'val': 'x'}, t[0])
+
 
 class TestXFrameSaveBinary(XFrameUnitTestCase):
     """
@@ -2005,6 +2227,48 @@ class TestXFrameSaveBinary(XFrameUnitTestCase):
         t = XFrame({'id': [30, 20, 10], 'val': ['a', 'b', 'c']})
         t.save(path, format='binary')
 
+    def test_save_load(self):
+        t = XFrame({'id': [30, 20, 10], 'val': ['a', 'b', 'a'], 'x': [1.5, None, 2.5], 'l': [[1], [2], [3]]})
+        path = 'tmp/frame'
+        t.save(path, format='binary')
+        res = XFrame.load(path).sort('id')
+        self.assertListEqual(['id', 'l', 'val', 'x'], res.column_names())
+        self.assertListEqual([int, list, str, float], res.column_types())
+        self.assertDictEqual({'id': 10, 'l': [3], 'val': 'a', 'x': 2.5}, res[0])
+        self.assertDictEqual({'id': 20, 'l': [2], 'val': 'b', 'x': None}, res[1])
+        self.assertDictEqual({'id': 30, 'l': [1], 'val': 'a', 'x': 1.5}, res[2])
+
+    def test_load_columns(self):
+        t = XFrame({'id': [30, 20, 10], 'val': ['a', 'b', 'c'], 'x': [1.5, 2.5, 3.5]})
+        path = 'tmp/frame'
+        t.save(path, format='binary')
+        res = XFrame.load(path, columns=['val', 'id']).sort('id')
+        self.assertListEqual(['val', 'id'], res.column_names())
+        self.assertListEqual([str, int], res.column_types())
+        self.assertDictEqual({'val': 'c', 'id': 10}, res[0])
+        self.assertListEqual(['id', 'val'], sorted(res.lineage()['column'].keys()))
+
+    def test_load_columns_bad(self):
+        t = XFrame({'id': [30, 20, 10], 'val': ['a', 'b', 'c']})
+        path = 'tmp/frame'
+        t.save(path, format='binary')
+        with self.assertRaises(ValueError):
+            XFrame.load(path, columns=['xx'])
+
+    def test_load_row_format(self):
+        # xframes saved before the columnar format have rows and no format file
+        path = 'tmp/frame-rows'
+        delete_file_or_dir(path)
+        sc = XFrame.spark_context()
+        sc.parallelize([(30, 'a'), (20, 'b'), (10, 'c')]).saveAsPickleFile(path)
+        with open(os.path.join(path, '_metadata'), 'w') as f:
+            pickle.dump([['id', 'val'], [int, str]], f)
+        res = XFrame.load(path).sort('id')
+        self.assertListEqual(['id', 'val'], res.column_names())
+        self.assertDictEqual({'id': 10, 'val': 'c'}, res[0])
+        res = XFrame.load(path, columns=['val'])
+        self.assertListEqual(['a', 'b', 'c'], sorted(res['val']))
+
 
 class TestXFrameSaveCsv(XFrameUnitTestCase):
     """
@@ -2029,6 +2293,40 @@ class TestXFrameSaveCsv(XFrameUnitTestCase):
         t = XFrame({'id': [30, 20, 10], 'val': ['a', 'b', 'c']})
         t.save(path, format='csv')
 
+    def test_save_gzip(self):
+        t = XFrame({'id': [30, 20, 10], 'val': ['a', 'b', 'c']})
+        path = 'tmp/frame-csv.csv.gz'
+        t.save(path)
+
+        with gzip.open(path) as f:
+            self.assertEqual('id,val', f.readline().rstrip())
+            self.assertEqual('30,a', f.readline().rstrip())
+            self.assertEqual('20,b', f.readline().rstrip())
+            self.assertEqual('10,c', f.readline().rstrip())
+
+    def test_save_as_csv_header_shard(self):
+        t = XFrame({'id': range(10), 'val': [str(i) for i in range(10)]})
+        t = XFrame.from_rdd(t.to_rdd().repartition(3), column_names=['id', 'val'])
+        path = 'tmp/frame-csv-shards'
+        t.save_as_csv(path, header='shard', single_file=False)
+
+        rows = []
+        for part in sorted(os.listdir(path)):
+            if not part.startswith('part-'):
+                continue
+            with open(os.path.join(path, part)) as f:
+                lines = f.read().splitlines()
+            if len(lines) == 0:
+                continue
+            self.assertEqual('id,val', lines[0])
+            rows.extend(lines[1:])
+        self.assertEqual(10, len(rows))
+
+    def test_save_as_csv_bad_header(self):
+        t = XFrame({'id': [30, 20, 10], 'val': ['a', 'b', 'c']})
+        with self.assertRaises(ValueError):
+            t.save_as_csv('tmp/frame-csv-bad.csv', header='every')
+
 
 class TestXFrameSaveParquet(XFrameUnitTestCase):
     """
@@ -2170,6 +2468,20 @@ class TestXFrameAddColumn(XFrameUnitTestCase):
         self.assertListEqual(['id', 'val', 'id.2'], res.column_names())
         self.assertDictEqual({'id': 1, 'val': 'a', 'id.2': 3.0}, res[0])
 
+    def test_add_column_derived(self):
+        tf = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        res = tf.add_column(tf['id'].apply(lambda x: x * 10), name='tens')
+        self.assertEqual(tf._impl.rdd().get_structure_id(), res._impl.rdd().get_structure_id())
+        self.assertColumnEqual([10, 20, 30], res['tens'])
+
+    def test_add_column_filtered(self):
+        tf = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        ta = XArray([0, 3, 0, 0, 2, 0, 1, 0]).filter(lambda x: x > 0)
+        res = tf.add_column(ta, name='another')
+        self.assertEqual(tf._impl.rdd().get_structure_id(), res._impl.rdd().get_structure_id())
+        self.assertColumnEqual([1, 2, 3], res['id'])
+        self.assertColumnEqual([3, 2, 1], res['another'])
+
 
 class TestXFrameAddColumnsArray(XFrameUnitTestCase):
     """
@@ -2567,6 +2879,11 @@ class TestXFrameIter(XFrameUnitTestCase):
             self.assertEqual(item[1], item[0]['id'])
             self.assertEqual(item[2], item[0]['val'])
 
+    def test_iter_partitions(self):
+        t = XFrame({'id': range(100)})
+        t = XFrame.from_rdd(t.to_rdd().repartition(7), column_names=['id'], column_types=[int])
+        self.assertListEqual(range(100), sorted([row['id'] for row in t]))
+
 
 class TestXFrameRange(XFrameUnitTestCase):
     """
@@ -3045,8 +3362,95 @@ class TestXFrameGroupbyAggregators(XFrameUnitTestCase):
         self.assertDictEqual({'id': 3, 'concat': {'c': 30}}, res[2])
 
     def test_groupby_quantile(self):
-        # not implemented
-        pass
+        t = XFrame({'id': [1, 2, 3, 1, 2, 1],
+                    'val': ['a', 'b', 'c', 'd', 'e', 'f'],
+                    'another': [10, 20, 30, 40, 50, 60]})
+        res = t.groupby('id', {'quantiles': QUANTILE('another', [0.0, 0.5, 1.0])})
+        res = res.topk('id', reverse=True)
+        self.assertEqualLen(3, res)
+        self.assertListEqual([int, list], res.column_types())
+        self.assertDictEqual({'id': 1, 'quantiles': [10, 40, 60]}, res[0])
+        self.assertDictEqual({'id': 2, 'quantiles': [20, 20, 50]}, res[1])
+        self.assertDictEqual({'id': 3, 'quantiles': [30, 30, 30]}, res[2])
+
+    def test_groupby_quantile_many(self):
+        vals = range(100000)
+        t = XFrame({'id': [val % 2 for val in vals], 'another': vals})
+        res = t.groupby('id', {'quantiles': QUANTILE('another', 0.5, 0.95, 0.99)})
+        res = res.topk('id', reverse=True)
+        # twice the rank error of 0.5% of 50000 values in each group, each two apart
+        self.assertAlmostEqual(50000, res[0]['quantiles'][0], delta=1000)
+        self.assertAlmostEqual(95000, res[0]['quantiles'][1], delta=1000)
+        self.assertAlmostEqual(99000, res[0]['quantiles'][2], delta=1000)
+        self.assertAlmostEqual(50000, res[1]['quantiles'][0], delta=1000)
+
+    def test_groupby_quantile_bad(self):
+        with self.assertRaises(ValueError):
+            QUANTILE('another', 1.5)
+
+    def test_groupby_combined_aggregators(self):
+        t = XFrame({'id': [1, 2, 3, 1, 2, 1],
+                    'val': ['a', 'b', 'c', 'd', 'e', 'f'],
+                    'another': [10, 20, 30, 40, 50, 60]})
+        res = t.groupby('id', {'sum': SUM('another'), 'count': COUNT, 'max': MAX('another'),
+                               'argmin': ARGMIN('another', 'val')})
+        res = res.topk('id', reverse=True)
+        self.assertEqualLen(3, res)
+        self.assertListEqual(['id', 'argmin', 'count', 'max', 'sum'], sorted(res.column_names()))
+        self.assertDictEqual({'id': 1, 'sum': 110, 'count': 3, 'max': 60, 'argmin': 'a'}, res[0])
+        self.assertDictEqual({'id': 2, 'sum': 70, 'count': 2, 'max': 50, 'argmin': 'b'}, res[1])
+        self.assertDictEqual({'id': 3, 'sum': 30, 'count': 1, 'max': 30, 'argmin': 'c'}, res[2])
+
+    def test_groupby_datetime_key(self):
+        t = XFrame({'id': [datetime(2015, 1, 1), datetime(2015, 1, 2), datetime(2015, 1, 1)],
+                    'another': [10, 20, 30]})
+        res = t.groupby('id', {'sum': SUM('another')})
+        res = res.topk('sum', reverse=True)
+        self.assertEqualLen(2, res)
+        self.assertListEqual([datetime, int], res.column_types())
+        self.assertDictEqual({'id': datetime(2015, 1, 2), 'sum': 20}, res[0])
+        self.assertDictEqual({'id': datetime(2015, 1, 1), 'sum': 40}, res[1])
+
+    def test_groupby_combined_and_concat(self):
+        t = XFrame({'id': [1, 2, 3, 1, 2, 1],
+                    'val': ['a', 'b', 'c', 'd', 'e', 'f'],
+                    'another': [10, 20, 30, 40, 50, 60]})
+        res = t.groupby('id', {'sum': SUM('another'), 'concat': CONCAT('another')})
+        res = res.topk('id', reverse=True)
+        self.assertEqualLen(3, res)
+        self.assertDictEqual({'id': 1, 'sum': 110, 'concat': [10, 40, 60]}, res[0])
+        self.assertDictEqual({'id': 2, 'sum': 70, 'concat': [20, 50]}, res[1])
+        self.assertDictEqual({'id': 3, 'sum': 30, 'concat': [30]}, res[2])
+
+    def test_groupby_variance_many_partitions(self):
+        vals = range(1000)
+        t = XFrame({'id': [val % 2 for val in vals], 'another': vals})
+        res = t.groupby('id', {'variance': VARIANCE('another'), 'mean': MEAN('another')})
+        res = res.topk('id', reverse=True)
+        self.assertEqualLen(2, res)
+        self.assertAlmostEqual(998.0 / 2.0, res[0]['mean'])
+        self.assertAlmostEqual(1000.0 / 2.0, res[1]['mean'])
+        self.assertAlmostEqual((500 ** 2 - 1) / 3.0, res[0]['variance'])
+        self.assertAlmostEqual((500 ** 2 - 1) / 3.0, res[1]['variance'])
+
+    def test_groupby_approx_count_distinct(self):
+        t = XFrame({'id': [1, 2, 3, 1, 2, 1],
+                    'val': ['a', 'b', 'c', 'a', 'e', None]})
+        res = t.groupby('id', {'distinct': APPROX_COUNT_DISTINCT('val')})
+        res = res.topk('id', reverse=True)
+        self.assertEqualLen(3, res)
+        self.assertListEqual([int, int], res.column_types())
+        self.assertDictEqual({'id': 1, 'distinct': 1}, res[0])
+        self.assertDictEqual({'id': 2, 'distinct': 2}, res[1])
+        self.assertDictEqual({'id': 3, 'distinct': 1}, res[2])
+
+    def test_groupby_approx_count_distinct_many(self):
+        vals = range(10000)
+        t = XFrame({'id': [val % 2 for val in vals], 'another': vals})
+        res = t.groupby('id', {'distinct': APPROX_COUNT_DISTINCT('another', rel_error=0.05)})
+        res = res.topk('id', reverse=True)
+        self.assertAlmostEqual(5000, res[0]['distinct'], delta=500)
+        self.assertAlmostEqual(5000, res[1]['distinct'], delta=500)
 
 
 class TestXFrameGroupbyAggregatorsWithMissingValues(XFrameUnitTestCase):
@@ -3645,6 +4049,102 @@ class TestXFrameJoin(XFrameUnitTestCase):
         with self.assertRaises(ValueError):
             t1.join(t2, on='xx')
 
+    def test_join_compound_key_reversed(self):
+        t1 = XFrame({'id1': [1, 2, 3], 'id2': [10, 20, 30], 'val': ['a', 'b', 'c']})
+        t2 = XFrame({'k2': [10, 20, 30], 'k1': [1, 2, 3], 'doubled': ['aa', 'bb', 'cc']})
+        t2 = t2[['k2', 'k1', 'doubled']]
+        res = t1.join(t2, on={'id1': 'k1', 'id2': 'k2'}).sort('id1').head()
+        self.assertEqualLen(3, res)
+        self.assertListEqual(['id1', 'id2', 'val', 'doubled'], res.column_names())
+        self.assertDictEqual({'id1': 1, 'id2': 10, 'val': 'a', 'doubled': 'aa'}, res[0])
+        self.assertDictEqual({'id1': 2, 'id2': 20, 'val': 'b', 'doubled': 'bb'}, res[1])
+        self.assertDictEqual({'id1': 3, 'id2': 30, 'val': 'c', 'doubled': 'cc'}, res[2])
+
+    def test_join_datetime_key(self):
+        t1 = XFrame({'id': [datetime(2015, 1, 1), datetime(2015, 1, 2)], 'val': ['a', 'b']})
+        t2 = XFrame({'id': [datetime(2015, 1, 1), datetime(2015, 1, 3)], 'doubled': ['aa', 'cc']})
+        res = t1.join(t2, how='full').sort('id').head()
+        self.assertEqualLen(3, res)
+        self.assertListEqual([datetime, str, str], res.column_types())
+        self.assertDictEqual({'id': datetime(2015, 1, 1), 'val': 'a', 'doubled': 'aa'}, res[0])
+        self.assertDictEqual({'id': datetime(2015, 1, 2), 'val': 'b', 'doubled': None}, res[1])
+        self.assertDictEqual({'id': datetime(2015, 1, 3), 'val': None, 'doubled': 'cc'}, res[2])
+
+    def test_join_list_key(self):
+        t1 = XFrame({'id': [[1, 2], [3]], 'val': ['a', 'b']})
+        t2 = XFrame({'id': [[1, 2], [4]], 'doubled': ['aa', 'cc']})
+        res = t1.join(t2)
+        self.assertEqualLen(1, res)
+        self.assertDictEqual({'id': [1, 2], 'val': 'a', 'doubled': 'aa'}, res[0])
+
+    def test_join_rows_if_fits(self):
+        t = XFrame({'id': range(10)})
+        self.assertIsNone(t._impl._rows_if_fits(5))
+        self.assertListEqual(range(10), sorted([row[0] for row in t._impl._rows_if_fits(10)]))
+        self.assertEqual(10, t._impl._known_count())
+        self.assertEqual(10, len(t._impl._rows_if_fits(10)))
+
+    def test_join_broadcast(self):
+        t1 = XFrame({'id': [1, 2, 3, 3], 'val': ['a', 'b', 'c', 'd']})
+        t2 = XFrame({'id': [1, 3, 4], 'doubled': ['aa', 'cc', 'dd']})
+        res = t1.join(t2, strategy='broadcast').sort(['id', 'val']).head()
+        self.assertEqualLen(3, res)
+        self.assertListEqual(['id', 'val', 'doubled'], res.column_names())
+        self.assertDictEqual({'id': 1, 'val': 'a', 'doubled': 'aa'}, res[0])
+        self.assertDictEqual({'id': 3, 'val': 'c', 'doubled': 'cc'}, res[1])
+        self.assertDictEqual({'id': 3, 'val': 'd', 'doubled': 'cc'}, res[2])
+
+    def test_join_broadcast_left(self):
+        t1 = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t2 = XFrame({'id': [1, 2, 4], 'doubled': ['aa', 'bb', 'cc']})
+        res = t1.join(t2, how='left', strategy='broadcast').sort('id').head()
+        self.assertEqualLen(3, res)
+        self.assertDictEqual({'id': 1, 'val': 'a', 'doubled': 'aa'}, res[0])
+        self.assertDictEqual({'id': 2, 'val': 'b', 'doubled': 'bb'}, res[1])
+        self.assertDictEqual({'id': 3, 'val': 'c', 'doubled': None}, res[2])
+
+    def test_join_broadcast_right(self):
+        t1 = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t2 = XFrame({'id': [1, 2, 4], 'doubled': ['aa', 'bb', 'dd']})
+        res = t1.join(t2, how='right', strategy='broadcast').sort('id').head()
+        self.assertEqualLen(3, res)
+        self.assertListEqual(['id', 'val', 'doubled'], res.column_names())
+        self.assertDictEqual({'id': 1, 'val': 'a', 'doubled': 'aa'}, res[0])
+        self.assertDictEqual({'id': 2, 'val': 'b', 'doubled': 'bb'}, res[1])
+        self.assertDictEqual({'id': 4, 'val': None, 'doubled': 'dd'}, res[2])
+
+    def test_join_broadcast_full(self):
+        t1 = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t2 = XFrame({'id': [1, 2, 4], 'doubled': ['aa', 'bb', 'dd']})
+        res = t1.join(t2, how='full', strategy='broadcast').sort('id').head()
+        self.assertEqualLen(4, res)
+        self.assertDictEqual({'id': 1, 'val': 'a', 'doubled': 'aa'}, res[0])
+        self.assertDictEqual({'id': 2, 'val': 'b', 'doubled': 'bb'}, res[1])
+        self.assertDictEqual({'id': 3, 'val': 'c', 'doubled': None}, res[2])
+        self.assertDictEqual({'id': 4, 'val': None, 'doubled': 'dd'}, res[3])
+
+    def test_join_broadcast_compound_key(self):
+        t1 = XFrame({'id1': [1, 2, 3], 'id2': [10, 20, 30], 'val': ['a', 'b', 'c']})
+        t2 = XFrame({'id1': [1, 2, 3], 'id2': [10, 20, 31], 'doubled': ['aa', 'bb', 'cc']})
+        res = t1.join(t2, strategy='broadcast').sort('id1').head()
+        self.assertEqualLen(2, res)
+        self.assertDictEqual({'id1': 1, 'id2': 10, 'val': 'a', 'doubled': 'aa'}, res[0])
+        self.assertDictEqual({'id1': 2, 'id2': 20, 'val': 'b', 'doubled': 'bb'}, res[1])
+
+    def test_join_shuffle(self):
+        t1 = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t2 = XFrame({'id': [1, 2, 4], 'doubled': ['aa', 'bb', 'dd']})
+        res = t1.join(t2, how='full', strategy='shuffle').sort('id').head()
+        self.assertEqualLen(4, res)
+        self.assertDictEqual({'id': 3, 'val': 'c', 'doubled': None}, res[2])
+        self.assertDictEqual({'id': 4, 'val': None, 'doubled': 'dd'}, res[3])
+
+    def test_join_bad_strategy(self):
+        t1 = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t2 = XFrame({'id': [1, 2, 3], 'doubled': ['aa', 'bb', 'cc']})
+        with self.assertRaises(ValueError):
+            t1.join(t2, strategy='xx')
+
 
 class TestXFrameSplitDatetime(XFrameUnitTestCase):
     """
@@ -4406,6 +4906,16 @@ class TestXFrameUnique(XFrameUnitTestCase):
         res = t.unique()
         self.assertEqualLen(4, res)
 
+    def test_unique_preserves_types(self):
+        t = XFrame({'id': [1, 1, 2],
+                    'dt': [datetime(2015, 1, 1), datetime(2015, 1, 1), datetime(2015, 1, 2)],
+                    'lst': [[1, 2], [1, 2], [3]],
+                    'dct': [{'a': 1}, {'a': 1}, {'b': 2}]})
+        res = t.unique().sort('id')
+        self.assertEqualLen(2, res)
+        self.assertDictEqual({'id': 1, 'dt': datetime(2015, 1, 1), 'lst': [1, 2], 'dct': {'a': 1}}, res[0])
+        self.assertDictEqual({'id': 2, 'dt': datetime(2015, 1, 2), 'lst': [3], 'dct': {'b': 2}}, res[1])
+
 
 class TestXFrameSort(XFrameUnitTestCase):
     """
@@ -4436,6 +4946,30 @@ class TestXFrameSort(XFrameUnitTestCase):
         self.assertColumnEqual([1, 1, 2, 3], res['id'])
         self.assertColumnEqual(['b', 'a', 'b', 'c'], res['val'])
 
+    def test_sort_desc_str_prefix(self):
+        t = XFrame({'id': [1, 2, 3, 4], 'val': ['ab', 'a', 'b', '']})
+        res = t.sort('val', ascending=False)
+        self.assertColumnEqual(['b', 'ab', 'a', ''], res['val'])
+
+    def test_sort_desc_datetime_float(self):
+        t = XFrame({'dt': [datetime(2015, 1, 1), datetime(2015, 1, 2), datetime(2015, 1, 1), datetime(2014, 1, 1)],
+                    'val': [1.5, 2.5, 3.5, 4.5]})
+        res = t.sort([('dt', False), ('val', False)])
+        self.assertColumnEqual([2.5, 3.5, 1.5, 4.5], res['val'])
+
+    def test_sort_missing(self):
+        t = XFrame({'id': [2, None, 1, 3], 'val': ['b', 'x', 'a', 'c']})
+        res = t.sort('id')
+        self.assertColumnEqual([None, 1, 2, 3], res['id'])
+        res = t.sort('id', ascending=False)
+        self.assertColumnEqual([3, 2, 1, None], res['id'])
+
+    def test_sort_partitions(self):
+        t = XFrame({'id': range(1000)})
+        t = XFrame.from_rdd(t.to_rdd().repartition(7), column_names=['id'], column_types=[int])
+        res = t.sort('id', ascending=False)
+        self.assertColumnEqual(range(999, -1, -1), res['id'])
+
 
 class TestXFrameDropna(XFrameUnitTestCase):
     """
@@ -4648,6 +5182,213 @@ class TestXFrameSql(XFrameUnitTestCase):
         self.assertDictEqual({'id': 2, 'val': 'b'}, res[0])
         self.assertDictEqual({'id': 3, 'val': 'c'}, res[1])
 
+    def test_sql_repeated(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        res1 = t.sql("SELECT * FROM xframe WHERE id > 1")
+        dataframe = t._impl._sql_dataframe()
+        res2 = t.sql("SELECT * FROM xframe WHERE id > 2")
+        self.assertIs(dataframe, t._impl._sql_dataframe())
+        self.assertEqualLen(2, res1)
+        self.assertEqualLen(1, res2)
+
+    def test_sql_after_change(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t.sql("SELECT * FROM xframe")
+        t['val'] = XArray(['x', 'y', 'z'])
+        res = t.sql("SELECT val FROM xframe WHERE id = 1")
+        self.assertListEqual(['x'], list(res['val']))
+
+    def test_sql_partitions(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t.sql("SELECT * FROM xframe")
+        self.assertEqual(1, t._impl._sql_dataframe().rdd.getNumPartitions())
+
+    def test_register_table(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t.register_table('reg_tbl')
+        rows = XFrame.spark_sql_context().sql('SELECT val FROM reg_tbl WHERE id > 1 ORDER BY id').collect()
+        self.assertListEqual(['b', 'c'], [row[0] for row in rows])
+        XFrame.unregister_table('reg_tbl')
+        with self.assertRaises(Exception):
+            XFrame.spark_sql_context().sql('SELECT val FROM reg_tbl').collect()
+        self.assertIsNone(t._impl._sql_cache)
+
+    def test_sql_table_replaced(self):
+        t1 = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t2 = XFrame({'id': [1, 2, 3], 'val': ['x', 'y', 'z']})
+        t1.sql("SELECT * FROM xframe")
+        t2.to_spark_dataframe('xframe')
+        self.assertIsNone(t1._impl._sql_cache)
+        res = t1.sql("SELECT val FROM xframe WHERE id = 1")
+        self.assertListEqual(['a'], list(res['val']))
+
+    def test_sql_cache_released_when_freed(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t.sql("SELECT * FROM freed_tbl")
+        ref = t._impl._sql_cache[2]
+        self.assertIn(ref, XFrameImpl._sql_cache_refs)
+        del t
+        gc.collect()
+        self.assertNotIn(ref, XFrameImpl._sql_cache_refs)
+
+
+class TestXFramePerfTracker(XFrameUnitTestCase):
+    """
+    Tests PerfTracker profile
+    """
+
+    def test_profile(self):
+        t = XFrame({'id': [3, 2, 1], 'val': ['c', 'b', 'a']})
+        with PerfTracker.profile() as p:
+            res = t.sort('id')
+            self.assertEqualLen(3, res)
+        records = {record['method']: record for record in p.records()}
+        self.assertEqual(1, records['XFrameImpl.sort']['calls'])
+        self.assertEqual(3, records['XFrameImpl.num_rows']['rows_out'])
+        self.assertTrue(len(records['XFrameImpl.num_rows']['job_ids']) > 0)
+        self.assertEqual('method,calls,wall_time,job_ids,stage_ids,rows_in,rows_out', p.to_csv().splitlines()[0])
+
+    def test_profile_restores(self):
+        sort = XFrameImpl.__dict__['sort']
+        with PerfTracker.profile():
+            self.assertIsNot(sort, XFrameImpl.__dict__['sort'])
+        self.assertIs(sort, XFrameImpl.__dict__['sort'])
+
+
+class TestXFrameDataFrameBacked(XFrameUnitTestCase):
+    """
+    Tests XFrame operations that stay on a Spark DataFrame
+    """
+
+    def frame(self):
+        t = XFrame({'id': [1, 2, 3, 4], 'val': ['a', 'b', 'a', None], 'x': [10, 20, 30, 40]})
+        return t.sql('SELECT * FROM xframe')
+
+    def test_sql_result(self):
+        res = self.frame()
+        self.assertTrue(res.is_dataframe_backed())
+        self.assertEqualLen(4, res)
+
+    def test_sql_twice(self):
+        res = self.frame().sql('SELECT id FROM xframe WHERE x > 15 ORDER BY id')
+        self.assertTrue(res.is_dataframe_backed())
+        self.assertListEqual([2, 3, 4], list(res['id']))
+
+    def test_select_columns(self):
+        res = self.frame().select_columns(['x', 'id'])
+        self.assertTrue(res.is_dataframe_backed())
+        self.assertListEqual(['x', 'id'], res.column_names())
+        self.assertDictEqual({'x': 10, 'id': 1}, res.sort('id')[0])
+
+    def test_filterby(self):
+        res = self.frame().filterby(['a'], 'val')
+        self.assertTrue(res.is_dataframe_backed())
+        self.assertListEqual([1, 3], sorted(res['id']))
+
+    def test_filterby_mismatched_type(self):
+        # spark would cast '1' to match id 1, python does not
+        res = XFrame(impl=self.frame().impl().filter({2, '1'}, 'id', False))
+        self.assertListEqual([2], list(res['id']))
+
+    def test_filterby_exclude(self):
+        # missing values are kept, as in the python filter
+        res = self.frame().filterby(['a'], 'val', exclude=True)
+        self.assertTrue(res.is_dataframe_backed())
+        self.assertListEqual([2, 4], sorted(res['id']))
+
+    def test_sort(self):
+        res = self.frame().sort('x', ascending=False)
+        self.assertTrue(res.is_dataframe_backed())
+        self.assertListEqual([40, 30, 20, 10], list(res['x']))
+
+    def test_groupby(self):
+        res = self.frame().groupby('val', {'sum': SUM('x'), 'count': COUNT()})
+        self.assertTrue(res.is_dataframe_backed())
+        self.assertListEqual(['count', 'sum', 'val'], sorted(res.column_names()))
+        self.assertEqual(int, res['sum'].dtype())
+        res = res.sort('val')
+        self.assertDictEqual({'val': None, 'count': 1, 'sum': 40}, res[0])
+        self.assertDictEqual({'val': 'a', 'count': 2, 'sum': 40}, res[1])
+        self.assertDictEqual({'val': 'b', 'count': 1, 'sum': 20}, res[2])
+
+    def test_join(self):
+        right = XFrame({'id': [1, 2, 5], 'y': ['p', 'q', 'r']}).sql('SELECT * FROM xframe')
+        res = self.frame().join(right, on='id', how='full')
+        self.assertTrue(res.is_dataframe_backed())
+        self.assertListEqual(['id', 'val', 'x', 'y'], res.column_names())
+        res = res.sort('id')
+        self.assertEqualLen(5, res)
+        self.assertDictEqual({'id': 1, 'val': 'a', 'x': 10, 'y': 'p'}, res[0])
+        self.assertDictEqual({'id': 4, 'val': None, 'x': 40, 'y': None}, res[3])
+        self.assertDictEqual({'id': 5, 'val': None, 'x': None, 'y': 'r'}, res[4])
+
+    def test_self_join(self):
+        t = self.frame()
+        res = t.join(t.select_columns(['id']), on='id')
+        self.assertTrue(res.is_dataframe_backed())
+        self.assertEqualLen(4, res)
+
+    def test_apply_converts(self):
+        t = self.frame()
+        res = t.apply(lambda row: row['x'] * 2)
+        self.assertListEqual([20, 40, 60, 80], sorted(res))
+        res = t.add_column(res, 'y')
+        self.assertFalse(res.is_dataframe_backed())
+
+
+class TestXFrameExplain(XFrameUnitTestCase):
+    """
+    Tests XFrame explain
+    """
+
+    def test_explain_groupby(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'a']})
+        res = t.groupby('val', {'count': COUNT()})
+        lines = res.explain().splitlines()
+        self.assertTrue(lines[0].startswith('groupby_aggregate('))
+        self.assertIn('shuffle', lines[0])
+        self.assertTrue(lines[-1].startswith('operations:'))
+
+    def test_explain_inputs(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        right = XFrame({'id': [1, 2], 'x': [10, 20]})
+        res = t.join(right, on='id').select_columns(['id', 'x'])
+        plan = res.explain(format='dict')
+        self.assertEqual('select_columns', plan['op'])
+        self.assertEqual('join', plan['inputs'][0]['op'])
+        self.assertEqualLen(2, plan['inputs'][0]['inputs'])
+
+    def test_explain_count(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        res = t.filterby([1, 2], 'id')
+        self.assertEqualLen(2, res)
+        plan = res.explain(format='dict')
+        self.assertEqual(1, plan['cost']['actions']['count'])
+        self.assertEqual(2, plan['cost']['rows'])
+        self.assertEqual(1, plan['totals']['counts'])
+        self.assertIn('table', plan['lineage'])
+
+    def test_explain_repeated_update(self):
+        t = XFrame({'id': [1, 2, 3], 'x': [10, 20, 30]})
+        for _ in range(30):
+            t['x'] = t['x'] + 1
+        plan = t.explain(format='dict')
+        self.assertEqual(0, plan['id'])
+        text = t.explain()
+        self.assertIn('(see above)', text)
+
+        def count_full(node):
+            if 'ref' in node:
+                return 0
+            return 1 + sum([count_full(input_node) for input_node in node['inputs']])
+        # each operation is given in full at most once
+        self.assertLessEqual(count_full(plan), plan['totals']['operations'])
+
+    def test_explain_bad_format(self):
+        t = XFrame({'id': [1, 2, 3]})
+        with self.assertRaises(ValueError):
+            t.explain(format='xml')
+
 
 if __name__ == '__main__':
     unittest.main()
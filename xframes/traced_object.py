@@ -2,10 +2,26 @@
 Base class for objects that support entry and exit tracing.
 """
 
-import inspect
+import sys
 from sys import stderr
 
 
+def _stack(levels):
+    """
+    The caller's stack, in the layout of inspect.stack(), without reading any source files.
+
+    Element 0 is the caller of _stack.  Only the frame, file name, line number, and
+    function name are filled in.
+    """
+    frame = sys._getframe(1)
+    stack = []
+    while frame is not None and len(stack) < levels:
+        code = frame.f_code
+        stack.append((frame, code.co_filename, frame.f_lineno, code.co_name))
+        frame = frame.f_back
+    return stack
+
+
 class TracedObject(object):
     entry_trace = False
     perf_count = None
@@ -15,7 +31,7 @@ class TracedObject(object):
         print >>stderr, 'Enter:', stack[1][3], stack[1][1], stack[1][2]
         # print a few frames
         print >>stderr, '   ', stack[2][3], stack[2][1], stack[2][2], args
-        for i in range(3, levels):
+        for i in range(3, min(levels, len(stack))):
             if stack[i][3] == '<module>':
                 break
             print >>stderr, '   ', stack[i][3], stack[i][1], stack[i][2]
@@ -24,22 +40,20 @@ class TracedObject(object):
     @classmethod
     def _print_trace(cls, **kwargs):
         """ Explicitly call this to trace a specific function. """
-        stack = inspect.stack()
+        stack = _stack(8)
         cls._print_stack(stack, kwargs, 8)
 
     @classmethod
     def _entry(cls, **kwargs):
         """ Trace function entry. """
-        if not cls.entry_trace and not cls.perf_count:
+        if not cls.entry_trace and cls.perf_count is None:
             return
-        stack = inspect.stack()
-        cls._print_stack(stack, kwargs)
+        if cls.entry_trace:
+            cls._print_stack(_stack(6), kwargs)
         if cls.perf_count is not None:
-            caller = stack[1]
-            my_fun = caller[3]
-            if my_fun not in cls.perf_count:
-                cls.perf_count[my_fun] = 0
-            cls.perf_count[my_fun] += 1
+            # only the name of the caller is needed, so skip building the stack
+            my_fun = sys._getframe(1).f_code.co_name
+            cls.perf_count[my_fun] = cls.perf_count.get(my_fun, 0) + 1
 
     @classmethod
     def set_trace(cls, entry_trace=None):
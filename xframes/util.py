@@ -21,6 +21,7 @@ from dateutil import parser as date_parser
 from sys import stderr
 import logging
 import types
+import threading
 
 from pyspark import StorageLevel
 from pyspark.sql.types import StringType, BooleanType, \
@@ -497,10 +498,75 @@ def classify_type(s):
     return str
 
 
-def infer_type(rdd):
+def type_inference_sample_size():
+    """
+    The number of values sampled to infer a type, from the [xframes] config section.
+    """
+    env = CommonSparkContext().env()
+    return int(env.get_config('xframes', 'type-inference-sample-size', '1000'))
+
+
+def sample_partitions(rdd, sample_fn, sample_size=None):
+    """
+    Summarize a uniform random sample of each partition, in a single pass.
+
+    Parameters
+    ----------
+    rdd : XRdd | RDD
+        The values to sample.
+
+    sample_fn : function(list)
+        Summarizes the sample of one partition.  This runs on the workers, so the
+        summary should be small.
+
+    sample_size : int, optional
+        The total number of values sampled.  Each partition contributes at most its share.
+        Defaults to type-inference-sample-size from the config.
+
+    Returns
+    -------
+    out : list
+        The summary of each partition.
+    """
+    sample_size = sample_size or type_inference_sample_size()
+    num_partitions = max(rdd.getNumPartitions(), 1)
+    per_partition = max(1, int(math.ceil(float(sample_size) / num_partitions)))
+
+    def sample_partition(split, values):
+        # reservoir sample, so sorted partitions are sampled throughout
+        rng = random.Random(split)
+        sample = []
+        for i, val in enumerate(values):
+            if i < per_partition:
+                sample.append(val)
+            else:
+                j = rng.randint(0, i)
+                if j < per_partition:
+                    sample[j] = val
+        return [sample_fn(sample)]
+    return rdd.mapPartitionsWithIndex(sample_partition).collect()
+
+
+def merge_classified_types(types):
+    """
+    Pick the type that represents a set of classified string types.
+
+    If all classify as a single type, then select that one.
+    If they are all either int or float, then pick float.
+    If they differ in other ways, then we will call it a string.
+    """
+    if len(types) == 1:
+        return list(types)[0]
+    if types == {int, float}:
+        return float
+    return str
+
+
+def infer_type(rdd, sample_size=None):
     """
     From an RDD of strings, find what data type they represent.
 
+    The strings are sampled from every partition.
     If all classify as a single type, then select that one.
     If they are all either int or float, then pick float.
     If they differ in other ways, then we will call it a string.
@@ -510,46 +576,61 @@ def infer_type(rdd):
     rdd : XRdd
         An XRdd of single values.
 
+    sample_size : int, optional
+        The number of values to sample.
+
     Returns
     -------
     out : type
         The type of the values in the rdd.
     """
-    head = rdd.take(100)
-    types = [classify_type(s) for s in head]
-    unique_types = set(types)
-    if len(unique_types) == 1:
-        dtype = types[0]
-    elif unique_types == {int, float}:
-        dtype = float
-    else: 
-        dtype = str
-    return dtype
+    def classify_sample(sample):
+        return {classify_type(s) for s in sample}
+    partition_types = sample_partitions(rdd, classify_sample, sample_size)
+    return merge_classified_types(set().union(*partition_types))
 
 
-def infer_types(rdd):
+def infer_types(rdd, sample_size=None):
     """
-    From an RDD of tuples of strings, find what data type each one represents.
+    From an RDD of tuples, find the data type of each position.
+
+    The tuples are sampled from every partition.
 
     Parameters
     ----------
     rdd : XRdd
         An XRdd of tuples.
 
+    sample_size : int, optional
+        The number of tuples to sample.
+
     Returns
     -------
     out : list(type)
         A list of the types of the values in the rdd.
     """
-    head = rdd.take(100)
-    n_cols = len(head[0])
-
-    def get_col(head, i):
-        return [row[i] for row in head]
-    try:
-        return [infer_type_of_list(get_col(head, i)) for i in range(n_cols)]
-    except IndexError:
-        raise ValueError('rows are not the same length')
+    def sample_types(sample):
+        widths = {len(row) for row in sample}
+        if len(widths) != 1:
+            return widths, None
+        width = list(widths)[0]
+        return widths, [{type(row[i]) for row in sample if row[i] is not None} for i in range(width)]
+
+    widths = set()
+    col_types = None
+    for partition_widths, partition_types in sample_partitions(rdd, sample_types, sample_size):
+        widths |= partition_widths
+        if len(widths) > 1:
+            raise ValueError('rows are not the same length')
+        if partition_types is None:
+            continue
+        if col_types is None:
+            col_types = partition_types
+        else:
+            col_types = [types1 | types2 for types1, types2 in zip(col_types, partition_types)]
+    if col_types is None:
+        raise ValueError('no rows to infer types from')
+    return [reduce(most_general, types, None) for types in col_types]
 
 
 def is_numeric_type(typ):
@@ -583,6 +664,38 @@ def is_sortable_type(typ):
     return issubclass(typ, sortable_types)
 
 
+def most_general(type1, type2):
+    """
+    The most general of two types, in the type lattice used by type inference.
+
+    None stands for no type yet.  Numeric types combine into float if either is float,
+    and into int otherwise.  Other types must match.
+
+    Parameters
+    ----------
+    type1 : type
+        The type so far.
+
+    type2 : type
+        Another type.
+
+    Returns
+    -------
+    out : type
+        A type that can hold values of both types.
+    """
+    if type1 is None:
+        return type2
+    if type2 is None or type1 == type2:
+        return type1
+    if is_numeric_type(type1) and is_numeric_type(type2):
+        if float in (type1, type2):
+            return float
+        # Handle long type like an int
+        return int
+    raise TypeError('Infer_type_of_list: mixed types in list: {} {}'.format(type2, type1))
+
+
 def infer_type_of_list(data):
     """
     Look through an iterable and get its data type.
@@ -600,30 +713,35 @@ def infer_type_of_list(data):
     out : type
         The type of values in the list.
     """
-    def most_general(type1, type2):
-        types = {type1, type2}
-        if float in types:
-            return float
-        # Handle long type like an int
-        return int
-
     candidate = None
     for d in data:
         if d is None:
             continue
-        d_type = type(d)
-        if candidate is None:
-            candidate = d_type
-        if d_type != candidate: 
-            if is_numeric_type(d_type) and is_numeric_type(candidate):
-                candidate = most_general(d_type, candidate)
-                continue
-            raise TypeError('Infer_type_of_list: mixed types in list: {} {}'.format(d_type, candidate))
+        candidate = most_general(candidate, type(d))
     return candidate
 
 
-def infer_type_of_rdd(rdd):
-    return infer_type_of_list(rdd.take(100))
+def infer_type_of_rdd(rdd, sample_size=None):
+    """
+    Get the data type of an RDD of values, sampling every partition.
+
+    Parameters
+    ----------
+    rdd : XRdd
+        The values.
+
+    sample_size : int, optional
+        The number of values to sample.
+
+    Returns
+    -------
+    out : type
+        The type of values in the RDD, or None if there are none.
+    """
+    def sample_types(sample):
+        return {type(val) for val in sample if val is not None}
+    partition_types = sample_partitions(rdd, sample_types, sample_size)
+    return reduce(most_general, set().union(*partition_types), None)
 
 
 def classify_auto(data):
@@ -691,6 +809,125 @@ def unpersist(rdd):
     rdd.unpersist()
 
 
+def iterate_partitions(rdd, prefetch=True):
+    """
+    Iterates over the elements of an RDD, fetching one partition at a time.
+
+    Each partition is computed only once, so iterating over the whole RDD takes
+    one pass over the data.  Only one partition is held in the driver at a time,
+    along with the next one, if it is being prefetched.
+
+    Parameters
+    ----------
+    rdd : XRdd
+        The RDD to iterate over.
+
+    prefetch : bool, optional
+        If True, the next partition is fetched in a background thread while the
+        elements of the current partition are consumed.
+
+    Returns
+    -------
+    out : generator
+        Yields the elements of the RDD, in order.
+    """
+    num_partitions = rdd.getNumPartitions()
+
+    def fetch(partition):
+        return rdd.runJob(lambda rows: list(rows), [partition])
+
+    class Prefetcher(threading.Thread):
+        def __init__(self, partition):
+            super(Prefetcher, self).__init__()
+            self.daemon = True
+            self.partition = partition
+            self.rows = None
+            self.error = None
+
+        def run(self):
+            try:
+                self.rows = fetch(self.partition)
+            except Exception as e:
+                self.error = e
+
+        def get(self):
+            self.join()
+            if self.error is not None:
+                raise self.error
+            return self.rows
+
+    if num_partitions == 0:
+        return
+    rows = fetch(0)
+    for partition in range(1, num_partitions + 1):
+        prefetcher = None
+        if partition < num_partitions and prefetch:
+            prefetcher = Prefetcher(partition)
+            prefetcher.start()
+        for row in rows:
+            yield row
+        if partition == num_partitions:
+            break
+        rows = prefetcher.get() if prefetcher else fetch(partition)
+
+
+def take_partitions(rdd, partition_func, limit, counts=None):
+    """
+    Runs a function over the partitions of an RDD in order, until enough results are found.
+
+    Like take, the first job runs on one partition, and later jobs run on more partitions,
+    estimated from the results so far.  Partitions after the ones that are needed are
+    never computed.
+
+    Parameters
+    ----------
+    rdd : XRdd
+        The RDD.
+
+    partition_func : function(iterator, int)
+        Called with the elements of a partition and the number of counted results still
+        needed.  Returns an iterable of results, and can stop once it has produced that many.
+
+    limit : int
+        The number of counted results to collect.
+
+    counts : function(result), optional
+        Returns True if a result counts toward the limit.  By default, every result counts.
+
+    Returns
+    -------
+    out : list
+        The results, in partition order, up to and including the result that reaches the limit.
+    """
+    counts = counts or (lambda item: True)
+    num_partitions = rdd.getNumPartitions()
+    results = []
+    found = 0
+    scanned = 0
+    while found < limit and scanned < num_partitions:
+        # use the same growth rule as take
+        num_to_try = 1
+        if scanned > 0:
+            if found == 0:
+                num_to_try = scanned * 4
+            else:
+                num_to_try = int(1.5 * limit * scanned / found) - scanned
+                num_to_try = min(max(num_to_try, 1), scanned * 4)
+        partitions = range(scanned, min(scanned + num_to_try, num_partitions))
+        needed = limit - found
+
+        def run_partition(iterator):
+            return list(partition_func(iterator, needed))
+        for item in rdd.runJob(run_partition, partitions):
+            if found >= limit:
+                break
+            results.append(item)
+            if counts(item):
+                found += 1
+        scanned += len(partitions)
+    return results
+
+
 def is_missing(x):
     """
     Tests for missing values.
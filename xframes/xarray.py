@@ -315,13 +315,14 @@ class XArray(XObject):
             as a single line in an output text file. If not
             given, will try to infer the format from filename given. If file
             name ends with 'csv', or 'txt', then save as 'csv' format,
-            otherwise save as 'binary' format.
+            otherwise save as 'binary' format.  A csv file name ending in '.gz' or '.bz2'
+            is saved compressed.
 
         """
         if format is None:
             if filename.endswith('.txt'):
                 format = 'text'
-            elif filename.endswith('.csv'):
+            elif filename.endswith(('.csv', '.csv.gz', '.csv.bz2')):
                 format = 'csv'
             else:
                 format = 'binary'
@@ -334,7 +335,7 @@ class XArray(XObject):
         elif format == 'text':
             self._impl.save_as_text(url)
         elif format == 'csv':
-            self._impl.save_as_csv(url)
+            self._impl.save_as_csv(url, compression=XArrayImpl.compression_from_path(filename))
 
     def to_rdd(self, number_of_partitions=4):
         """
@@ -1610,6 +1611,35 @@ class XArray(XObject):
         """
         return self._impl.nnz()
 
+    def aggregate_stats(self, stats=None):
+        """
+        Compute several summary statistics of the XArray in a single pass.
+
+        The results are kept, so later calls to this and to max, min, sum, mean, std,
+        var, num_missing, and nnz do not need to go over the data again.
+
+        Parameters
+        ----------
+        stats : list of str, optional
+            The statistics to compute.  The choices are 'count', 'missing', 'min', 'max',
+            'sum', 'mean', 'var', 'std', and 'nnz'.  By default, all of them are computed.
+
+        Returns
+        -------
+        out : dict
+            The value of each statistic, by name.  Missing values are included in
+            'count' and 'missing' and are skipped by the others.  The numeric statistics
+            are None if the XArray is not numeric or has no values.  The variance and
+            standard deviation use ddof=0.
+
+        Examples
+        --------
+        >>> xframes.XArray([1, 2, 3, None]).aggregate_stats(['count', 'missing', 'mean'])
+        {'count': 4, 'missing': 1, 'mean': 2.0}
+
+        """
+        return self._impl.aggregate_stats(stats)
+
     def datetime_to_str(self, str_format='%Y-%m-%dT%H:%M:%S%ZP'):
         """
         Create a new XArray with all the values cast to str. The string format is
@@ -2036,6 +2066,39 @@ class XArray(XObject):
 
         return XArray(impl=self._impl.unique())
 
+    def approx_unique_count(self, rel_error=0.01):
+        """
+        Estimate the number of unique values in the current XArray.
+
+        The estimate is made in one pass, with a HyperLogLog sketch of fixed size,
+        so it costs much less than counting the unique values exactly on large or
+        high cardinality columns.  Missing values count as one value, as they do in
+        :py:func:`~xframes.XArray.unique`.
+
+        Parameters
+        ----------
+        rel_error : float, optional
+            The relative standard error of the estimate.  The sketch uses about
+            (1.04 / rel_error) ** 2 bytes, up to 256KB.  Must be at least 0.002.
+
+        Returns
+        -------
+        out : int
+            The estimated number of unique values.
+
+        See Also
+        --------
+        xframes.XArray.unique
+            The unique values themselves.
+
+        Examples
+        --------
+        >>> xa = xframes.XArray([1, 2, 3, 2, 1])
+        >>> xa.approx_unique_count()
+        3
+        """
+        return self._impl.approx_unique_count(rel_error)
+
     def item_length(self):
         """
         Length of each element in the current XArray.
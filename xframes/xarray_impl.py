@@ -11,6 +11,7 @@ import copy
 import StringIO
 import random
 import datetime
+import itertools
 from dateutil import parser as date_parser
 import logging
 
@@ -24,34 +25,13 @@ from xframes.util import infer_type_of_list, cache, uncache
 from xframes.util import infer_type, infer_types, is_numeric_type
 from xframes.util import is_missing
 from xframes.util import distribute_seed
+from xframes.util import iterate_partitions
 from xframes.xrdd import XRdd
-
-
-class ReverseCmp(object):
-    """ Reverse comparison.
-
-    Wraps a comparable class so that comparisons are reversed.
-    """
-    def __init__(self, obj):
-        self.obj = obj
-
-    def __lt__(self, other):
-        return self.obj > other.obj
-
-    def __gt__(self, other):
-        return self.obj < other.obj
-
-    def __eq__(self, other):
-        return self.obj == other.obj
-
-    def __le__(self, other):
-        return self.obj >= other.obj
-
-    def __ge__(self, other):
-        return self.obj <= other.obj
-
-    def __ne__(self, other):
-        return self.obj != other.obj
+from xframes.heapdict import BoundedHeap
+from xframes.sort_keys import sort_key_encoder
+from xframes.column_stats import aggregate_values, validate_stats
+from xframes.hyperloglog import HyperLogLog, precision_for_error
+from xframes.blocks import can_vectorize, scalar_op_partition, vector_op_partition, unary_op_partition
 
 
 class ApplyError(object):
@@ -80,7 +60,9 @@ class XArrayImpl(XObjectImpl, TracedObject):
         self.elem_type = elem_type
         self.lineage = lineage or Lineage.init_array_lineage(Lineage.EMPTY)
         self.materialized = False
-        self.iter_pos = 0
+        self.iter_rows = None
+        # (rdd id, ColumnStats) of the last statistics computed
+        self._stats = None
 
     def _rv(self, rdd, typ=None, lineage=None):
         """
@@ -99,10 +81,21 @@ class XArrayImpl(XObjectImpl, TracedObject):
         return xframes.xframe_impl.XFrameImpl(rdd, col_names, col_types, lineage)
 
     def _count(self):
+        if self._stats is not None and self._stats[0] == self._rdd.get_id():
+            return self._stats[1].count
         count = self._rdd.count()
         self.materialized = True
+        self._plan.add_action('count', count)
         return count
 
+    def _known_count(self):
+        """
+        The number of elements if it is known without running a job, otherwise None.
+        """
+        if self._stats is not None and self._rdd is not None and self._stats[0] == self._rdd.get_id():
+            return self._stats[1].count
+        return None
+
     def rdd(self):
         return self._rdd
 
@@ -300,36 +293,29 @@ class XArrayImpl(XObjectImpl, TracedObject):
         lineage_path = os.path.join(path, '_lineage')
         self.lineage.save(lineage_path)
 
-    def save_as_csv(self, path, **params):
+    def save_as_csv(self, path, single_file=True, compression=None, **params):
         """
         Saves the RDD to file as text.
+
+        Every partition is written in parallel, then the shards are merged, unless
+        single_file is False.
         """
-        self._entry(path=path)
+        self._entry(path=path, single_file=single_file, compression=compression)
 
         # noinspection PyShadowingNames
         def to_csv(row, **params):
             sio = StringIO.StringIO()
             writer = csv.writer(sio, **params)
             try:
-                writer.writerow([row], **params)
+                writer.writerow([row])
                 ret = sio.getvalue()
                 return ret
             except IOError:
                 return ''
 
-        fileio.delete(path)
-        with fileio.open_file(path, 'w') as f:
-            self.begin_iterator()
-            elems_at_a_time = 10000
-            ret = self.iterator_get_next(elems_at_a_time)
-            while True:
-                for row in ret:
-                    line = to_csv(row, **params)
-                    f.write(line)
-                if len(ret) == elems_at_a_time:
-                    ret = self.iterator_get_next(elems_at_a_time)
-                else:
-                    break
+        params['lineterminator'] = ''
+        csv_data = self._rdd.map(lambda row: to_csv(row, **params))
+        self._save_lines(path, csv_data, single_file=single_file, compression=compression)
 
     def to_rdd(self, number_of_partitions=None):
         """
@@ -400,7 +386,10 @@ class XArrayImpl(XObjectImpl, TracedObject):
 
         Entries are '1' if the corresponding element in the current RDD is a
         part of the top k elements, and '0' if that corresponding element is
-        not. 
+        not.
+
+        Each partition keeps its own top k in a bounded heap.  The heaps are merged
+        on the driver, and the positions of the top k are broadcast to mark them.
         """
         self._entry(topk=topk, reverse=reverse)
         if not isinstance(topk, int):
@@ -409,19 +398,26 @@ class XArrayImpl(XObjectImpl, TracedObject):
         if topk == 0:
             res = self._rdd.map(lambda y: 0)
         else:
-            pairs = self._rdd.zipWithIndex()
-            # we are going to use this twice
-            cache(pairs)
-            # takeOrdered always sorts ascending
-            # topk needs to sort descending if reverse is False, ascending if True
-            if reverse:
-                top_pairs = pairs.takeOrdered(topk, lambda x: x[0])
-            else:
-                top_pairs = pairs.takeOrdered(topk, lambda x: ReverseCmp(x[0]))
-            top_ranks = [v[1] for v in top_pairs]
-            res = pairs.map(lambda z: z[1] in top_ranks)
-            uncache(pairs)
-        return self._rv(res)
+            # the largest keys are kept: invert the keys to keep the smallest values
+            make_key = sort_key_encoder([self.elem_type], [not reverse])
+
+            def partition_top(split, values):
+                heap = BoundedHeap(topk)
+                for i, value in enumerate(values):
+                    heap.push((make_key((value, ), [0]), split, i))
+                yield heap
+
+            heap = BoundedHeap(topk)
+            for partition_heap in self._rdd.mapPartitionsWithIndex(partition_top).collect():
+                heap.merge(partition_heap)
+            top_positions = self.spark_context().broadcast(frozenset([(split, i) for _, split, i in heap.items()]))
+
+            def mark_top(split, values):
+                positions = top_positions.value
+                for i, _ in enumerate(values):
+                    yield 1 if (split, i) in positions else 0
+            res = self._rdd.mapPartitionsWithIndex(mark_top)
+        return self._rv(res, int)
 
     # Materialization
     def materialize(self):
@@ -443,20 +439,15 @@ class XArrayImpl(XObjectImpl, TracedObject):
     def begin_iterator(self):
         """ Resets the iterator. """
         self._entry()
-        self.iter_pos = 0
+        self.iter_rows = iterate_partitions(self._rdd)
 
     def iterator_get_next(self, elems_at_a_time):
         """ Gets a group of elements for the iterator. """
 
         self._entry(elems_at_a_time=elems_at_a_time)
-        buf_rdd = self._rdd.zipWithIndex()
-        low = self.iter_pos
-        high = self.iter_pos + elems_at_a_time
-        filtered_rdd = buf_rdd.filter(lambda row: row[1] >= low < high)
-        trimmed_rdd = filtered_rdd.map(lambda row: row[0])
-        iter_buf = trimmed_rdd.collect()
-        self.iter_pos += elems_at_a_time
-        return iter_buf
+        if self.iter_rows is None:
+            self.begin_iterator()
+        return list(itertools.islice(self.iter_rows, elems_at_a_time))
 
     # Operate on Vectors
     def vector_operator(self, other, op):
@@ -466,7 +457,11 @@ class XArrayImpl(XObjectImpl, TracedObject):
         self._entry(op=op)
         res_type = self.elem_type
         pairs = self._rdd.zip(other.rdd())
-        if op == '+':
+        if can_vectorize(self.elem_type, op) and can_vectorize(other.elem_type, op):
+            res = pairs.mapPartitions(vector_op_partition(self.elem_type, other.elem_type, op))
+            if op in ['<', '>', '<=', '>=', '==', '!=']:
+                res_type = int
+        elif op == '+':
             res = pairs.map(lambda x: x[0] + x[1])
         elif op == '-':
             res = pairs.map(lambda x: x[0] - x[1])
@@ -509,7 +504,11 @@ class XArrayImpl(XObjectImpl, TracedObject):
         """
         self._entry(op=op)
         res_type = self.elem_type
-        if op == '+':
+        if can_vectorize(self.elem_type, op):
+            res = self._rdd.mapPartitions(scalar_op_partition(self.elem_type, other, op))
+            if op in ['<', '>', '<=', '>=', '==', '!=']:
+                res_type = int
+        elif op == '+':
             res = self._rdd.map(lambda x: x + other)
         elif op == '-':
             res = self._rdd.map(lambda x: x - other)
@@ -524,6 +523,7 @@ class XArrayImpl(XObjectImpl, TracedObject):
             res_type = int
         elif op == '>':
             res = self._rdd.map(lambda x: x > other)
+            res_type = int
         elif op == '<=':
             res = self._rdd.map(lambda x: x <= other)
             res_type = int
@@ -545,7 +545,9 @@ class XArrayImpl(XObjectImpl, TracedObject):
         Performs a scalar operation on the RDD.
         """
         self._entry(op=op)
-        if op == '+':
+        if op in ['+', '-', '*', '/'] and can_vectorize(self.elem_type, op):
+            res = self._rdd.mapPartitions(scalar_op_partition(self.elem_type, other, op, scalar_on_left=True))
+        elif op == '+':
             res = self._rdd.map(lambda x: other + x)
         elif op == '-':
             res = self._rdd.map(lambda x: other - x)
@@ -564,6 +566,8 @@ class XArrayImpl(XObjectImpl, TracedObject):
         self._entry(op=op)
         if op == '+':
             res = self._rdd
+        elif can_vectorize(self.elem_type, op, unary=True):
+            res = self._rdd.mapPartitions(unary_op_partition(self.elem_type, op))
         elif op == '-':
             res = self._rdd.map(lambda x: -x)
         elif op == 'abs':
@@ -984,6 +988,17 @@ class XArrayImpl(XObjectImpl, TracedObject):
         res = self._rdd.distinct()
         return self._rv(res)
 
+    def approx_unique_count(self, rel_error):
+        """
+        Estimate the number of unique values with a HyperLogLog sketch, in one pass.
+        """
+        self._entry(rel_error=rel_error)
+        zero = HyperLogLog(precision_for_error(rel_error))
+        res = self._rdd.treeAggregate(zero,
+                                      lambda acc, value: acc.add(value),
+                                      lambda acc1, acc2: acc1.merge(acc2))
+        return res.cardinality()
+
     def all(self):
         """
         Return True if every element of the rdd evaluates to True. For
@@ -1044,6 +1059,27 @@ class XArrayImpl(XObjectImpl, TracedObject):
         res = self._rdd.aggregate(False, do_any, combine)    # action
         return bool(res)
 
+    def _column_stats(self):
+        """
+        Returns the ColumnStats of the RDD, computing them if the RDD has changed.
+        """
+        rdd_id = self._rdd.get_id()
+        if self._stats is None or self._stats[0] != rdd_id:
+            self._stats = (rdd_id, aggregate_values(self._rdd, self.elem_type))     # action
+            self.materialized = True
+        return self._stats[1]
+
+    def aggregate_stats(self, stats):
+        """
+        Compute several statistics in one pass.
+
+        Returns a dict of the statistics, by name.
+        """
+        self._entry(stats=stats)
+        stats = validate_stats(stats)
+        column_stats = self._column_stats()
+        return {stat: column_stats.get(stat) for stat in stats}
+
     def max(self):
         """
         Get maximum numeric value in the RDD.
@@ -1052,12 +1088,12 @@ class XArrayImpl(XObjectImpl, TracedObject):
         RDD with non-numeric type.
         """
         self._entry()
-        count = self._count()     # action
-        if count == 0:     # action
+        stats = self._column_stats()     # action
+        if stats.count == 0:
             return None
         if not is_numeric_type(self.elem_type):
             raise TypeError('max: non numeric type')
-        return self._rdd.max()          # action
+        return stats.get('max')
 
     def min(self):
         """
@@ -1067,12 +1103,12 @@ class XArrayImpl(XObjectImpl, TracedObject):
         RDD with non-numeric type.
         """
         self._entry()
-        count = self._count()     # action
-        if count == 0:     # action
+        stats = self._column_stats()     # action
+        if stats.count == 0:
             return None
         if not is_numeric_type(self.elem_type):
             raise TypeError('sum: non numeric type')
-        return self._rdd.min()      # action
+        return stats.get('min')
 
     def sum(self):
         """
@@ -1086,11 +1122,11 @@ class XArrayImpl(XObjectImpl, TracedObject):
         """
         self._entry()
         count = self._count()     # action
-        if count == 0:     # action
+        if count == 0:
             return None
 
         if is_numeric_type(self.elem_type):
-            total = self._rdd.sum()    # action
+            total = self._column_stats().get('sum')
         elif self.elem_type is array.array:
             def array_sum(x, y):
                 if x.typecode != y.typecode:
@@ -1120,12 +1156,12 @@ class XArrayImpl(XObjectImpl, TracedObject):
         RDD with non-numeric type.
         """
         self._entry()
-        count = self._count()     # action
-        if count == 0:     # action
+        stats = self._column_stats()     # action
+        if stats.count == 0:
             return None
         if not is_numeric_type(self.elem_type):
             raise TypeError('mean: non numeric type')
-        return self._rdd.mean()       # action
+        return stats.get('mean')
 
     def std(self, ddof):
         """
@@ -1135,18 +1171,14 @@ class XArrayImpl(XObjectImpl, TracedObject):
         RDD with non-numeric type or if `ddof` >= length of RDD.
         """
         self._entry(ddof=ddof)
-        count = self._count()     # action
-        if count == 0:      # action
+        stats = self._column_stats()     # action
+        if stats.count == 0:
             return None
         if not is_numeric_type(self.elem_type):
             raise TypeError('mean: non numeric type')
-        if ddof < 0 or ddof > 1 or ddof >= count:
+        if ddof < 0 or ddof > 1 or ddof >= stats.count:
             raise ValueError('std: invalid ddof {}'.format(ddof))
-        if ddof == 0:
-            res = self._rdd.stdev()
-        else:
-            res = self._rdd.sampleStdev()       # action
-        return res
+        return stats.get('std', ddof)
 
     def var(self, ddof):
         """
@@ -1156,45 +1188,28 @@ class XArrayImpl(XObjectImpl, TracedObject):
         RDD with non-numeric type or if `ddof` >= length of XArray.
         """
         self._entry(ddof=ddof)
-        count = self._count()     # action
-        if count == 0:      # action
+        stats = self._column_stats()     # action
+        if stats.count == 0:
             return None
         if not is_numeric_type(self.elem_type):
             raise TypeError('mean: non numeric type')
-        if ddof < 0 or ddof > 1 or ddof >= count:
+        if ddof < 0 or ddof > 1 or ddof >= stats.count:
             raise ValueError('std: invalid ddof {}'.format(ddof))
-        if ddof == 0:
-            res = self._rdd.variance()     # action
-        else:
-            res = self._rdd.sampleVariance()     # action
-        return res
+        return stats.get('var', ddof)
 
     def num_missing(self):
         """
         Number of missing elements in the RDD.
         """
         self._entry()
-        self.materialized = True
-        res = self._rdd.aggregate(0,             # action
-                                  lambda acc, v: acc + 1 if is_missing(v) else acc,
-                                  lambda acc1, acc2: acc1 + acc2)
-        return res
+        return self._column_stats().get('missing')
 
     def nnz(self):
         """
         Number of non-zero elements in the RDD.
         """
         self._entry()
-        self.materialized = True
-
-        def ne_zero(x):
-            if is_missing(x):
-                return False
-            return x != 0
-        res = self._rdd.aggregate(0,            # action
-                                  lambda acc, v: acc + 1 if ne_zero(v) else acc,
-                                  lambda acc1, acc2: acc1 + acc2)
-        return res
+        return self._column_stats().get('nnz')
 
     def item_length(self):
         """
@@ -1241,7 +1256,7 @@ class XArrayImpl(XObjectImpl, TracedObject):
         def expand_datetime(val, limit):
             return tuple([expand_datetime_field(val, lim) for lim in limit])
         res = self._rdd.map(lambda x: expand_datetime(x, limit))
-        return self._rv_frame(res.RDD(), new_names, column_types)
+        return self._rv_frame(res, new_names, column_types)
 
     def datetime_to_str(self, str_format):
         """
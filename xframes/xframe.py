@@ -28,7 +28,7 @@ from xframes.xobject import XObject
 from xframes.xframe_impl import XFrameImpl
 from xframes.xplot import XPlot
 from xframes.xarray_impl import infer_type_of_list
-from xframes.util import make_internal_url, classify_type, classify_auto
+from xframes.util import make_internal_url, classify_auto
 from xframes.xarray import XArray
 import xframes
 import util
@@ -135,7 +135,6 @@ class XFrame(XObject):
     -----
     The following functionality is currently not implemented.
         - pack_columns data types except list, array, and dict
-        - groupby quantile
 
     See Also
     --------
@@ -274,7 +273,7 @@ class XFrame(XObject):
         elif _format == 'xframe_obj':
             if not isinstance(data, XFrame):
                 raise ValueError('Data is not XFrame')
-            self._impl = XFrameImpl(data.to_rdd(), data.column_names(), data.column_types())
+            self._impl = XFrameImpl(data._impl.rdd(), data.column_names(), data.column_types())
         elif _format == 'xarray':
             if not isinstance(data, XArray):
                 raise ValueError('Data is not XArray')
@@ -423,48 +422,8 @@ class XFrame(XObject):
             raise TypeError('Footer strs must be a list')
         LAZY_FOOTER_STRS = footer_strs
 
-    @staticmethod
-    def _infer_column_types_from_lines(first_rows, na_values):
-        if len(first_rows.column_names()) < 1:
-            logging.warn('Insufficient number of columns to perform type inference.')
-            raise RuntimeError('Insufficient columns.')
-        if len(first_rows) < 1:
-            logging.warn('Insufficient number of rows to perform type inference.')
-            raise RuntimeError('Insufficient rows.')
-
-        col_names = first_rows.column_names()
-
-        # TODO get this in a way that does not require an iterator
-        def row_as_array(row, col_names):
-            return [row[col] for col in col_names]
-
-        head = [row_as_array(row, col_names) for row in first_rows]
-
-        def infer_type(col, na_values):
-            col = [val for val in col if val not in na_values]
-            types = [classify_type(val) for val in col if val is not None]
-            unique_types = set(types)
-            if len(unique_types) == 1:
-                dtype = types[0]
-            elif unique_types == {int, float}:
-                dtype = float
-            else:
-                dtype = str
-            return dtype
-
-        n_cols = len(head[0])
-        cols = [[row[i] for row in head] for i in range(n_cols)]
-        types = [infer_type(col, na_values) for col in cols]
-
-        # special handling for '\n'
-        #        if delimiter == '\n' and len(column_type_hints) != 1:
-        #          column_type_hints = [str]
-
-        column_type_hints = types
-        return column_type_hints
-
     @classmethod
-    def load(cls, filename):
+    def load(cls, filename, columns=None):
         """
         Load an XFrame. The filename extension is used to determine the format
         automatically. This function is particularly useful for XFrames previously
@@ -477,6 +436,11 @@ class XFrame(XObject):
         filename : string
             Location of the file to load. Can be a local path or a remote URL.
 
+        columns : list[str], optional
+            Load only these columns, in this order.  Only supported for XFrames saved in
+            binary format.  The binary format is stored by column, so the columns that are
+            not selected are never decoded.
+
         Returns
         -------
         out : XFrame
@@ -494,7 +458,15 @@ class XFrame(XObject):
         >>> sf = xframes.XFrame({'id':[1,2,3], 'val':['A','B','C']})
         >>> sf.save('my_xframe')        # 'my_xframe' is a directory
         >>> sf_loaded = xframes.XFrame.load('my_xframe')
+
+        >>> ids = xframes.XFrame.load('my_xframe', columns=['id'])
         """
+        if columns is not None:
+            if not isinstance(columns, list):
+                raise TypeError('Columns must be a list.')
+            url = make_internal_url(filename)
+            XFrameImpl.check_input_uri(url)
+            return cls(impl=XFrameImpl.load_from_xframe_index(url, columns))
         sf = cls(data=filename)
         return sf
 
@@ -554,42 +526,12 @@ class XFrame(XObject):
         internal_url = make_internal_url(url)
         XFrameImpl.check_input_uri(internal_url)
 
-        # Attempt to automatically detect the column types. Either produce a
-        # list of types; otherwise default to all str types.
-        column_type_inference_was_used = False
+        # If there are no hints, the column types are inferred while the file is parsed,
+        #  from a sample of rows taken from every partition.
+        column_type_inference_was_used = column_type_hints is None
         if column_type_hints is None:
-            try:
-                # Get the first 100 rows (using all the desired arguments).
-                # first row may be excluded (based on heder setting)
-                first_rows = xframes.XFrame.read_csv(url,
-                                                     nrows=100,
-                                                     column_type_hints=str,
-                                                     header=header,
-                                                     delimiter=delimiter,
-                                                     comment_char=comment_char,
-                                                     escape_char=escape_char,
-                                                     double_quote=double_quote,
-                                                     quote_char=quote_char,
-                                                     skip_initial_space=skip_initial_space)
-                column_type_hints = XFrame._infer_column_types_from_lines(first_rows, na_values)
-                typelist = '[' + ','.join(t.__name__ for t in column_type_hints) + ']'
-                if verbose:
-                    print >> stderr, '------------------------------------------------------'
-                    print >> stderr, 'Inferred types from first line of file as '
-                    print >> stderr, 'column_type_hints=' + typelist
-                    print >> stderr, 'If parsing fails due to incorrect types, you can correct'
-                    print >> stderr, 'the inferred type list above and pass it to read_csv in'
-                    print >> stderr, 'the column_type_hints argument'
-                    print >> stderr, '------------------------------------------------------'
-                column_type_inference_was_used = True
-            except Exception as e:
-                # If the above fails, default back to str for all columns.
-                if verbose:
-                    logging.info('Error {} {}'.format(type(e).__name__, e))
-                    logging.warn('Could not detect types. Using str for each column.')
-                column_type_hints = str
-
-        if isinstance(column_type_hints, type):
+            type_hints = None
+        elif isinstance(column_type_hints, type):
             type_hints = {'__all_columns__': column_type_hints}
         elif isinstance(column_type_hints, list):
             type_hints = dict(zip(['__X%d__' % i for i in range(len(column_type_hints))], column_type_hints))
@@ -613,6 +555,16 @@ class XFrame(XObject):
             else:
                 raise
 
+        if column_type_inference_was_used and verbose:
+            typelist = '[' + ','.join(t.__name__ for t in impl.column_types) + ']'
+            print >> stderr, '------------------------------------------------------'
+            print >> stderr, 'Inferred types from a sample of the file as '
+            print >> stderr, 'column_type_hints=' + typelist
+            print >> stderr, 'If parsing fails due to incorrect types, you can correct'
+            print >> stderr, 'the inferred type list above and pass it to read_csv in'
+            print >> stderr, 'the column_type_hints argument'
+            print >> stderr, '------------------------------------------------------'
+
         return cls(impl=impl), {f: XArray(impl=es) for f, es in errors.iteritems() if es.size() != 0}
 
     @classmethod
@@ -705,7 +657,9 @@ class XFrame(XObject):
             A string or list of strings to be interpreted as missing values.
 
         nrows : int, optional
-            If set, only this many rows will be read from the file.
+            If set, only this many rows will be read from the file.  The header line
+            is not counted.  Partitions of the file are parsed in order, and reading
+            stops once this many rows have been found.
 
         verbose : bool, optional
             If True, print the progress while reading files.
@@ -842,7 +796,9 @@ class XFrame(XObject):
             A string or list of strings to be interpreted as missing values.
 
         nrows : int, optional
-            If set, only this many rows will be read from the file.
+            If set, only this many rows will be read from the file.  The header line
+            is not counted.  Partitions of the file are parsed in order, and reading
+            stops once this many rows have been found.
 
         verbose : bool, optional
             If True, print the progress while reading files.
@@ -1132,7 +1088,7 @@ class XFrame(XObject):
         return cls(impl=XFrameImpl.read_from_text(url, delimiter=delimiter, nrows=nrows, verbose=verbose))
 
     @classmethod
-    def read_parquet(cls, url):
+    def read_parquet(cls, url, columns=None, filter=None):
         """
         Constructs an XFrame from a parquet file.
 
@@ -1141,6 +1097,18 @@ class XFrame(XObject):
         url : string
             Location of the parquet file to load. 
 
+        columns : list[str], optional
+            Read only these columns, in this order.
+
+        filter : tuple | list[tuple], optional
+            Read only the rows that satisfy a predicate, or all of a list of predicates.
+            Each predicate is a tuple (column, op, value), where op is one of
+            '==', '!=', '<', '<=', '>', '>=', or 'in'.  For 'in', value is a list.
+            Comparing to None with '==' or '!=' tests for missing values.
+
+            The columns and the filter are passed to the parquet reader, which reads only
+            the selected columns and skips blocks of rows that cannot match.
+
         Returns
         -------
         out : XFrame
@@ -1150,9 +1118,52 @@ class XFrame(XObject):
         xframes.XFrame
             The constructor can read parquet files.
 
+        Examples
+        --------
+        >>> xf = xframes.XFrame.read_parquet('data/sales.parquet',
+        ...                                  columns=['store', 'amount'],
+        ...                                  filter=[('amount', '>', 100), ('store', 'in', ['a', 'b'])])
+
         """
         XFrameImpl.check_input_uri(url)
-        return cls(impl=XFrameImpl.load_from_parquet(url))
+        return cls(impl=XFrameImpl.load_from_parquet(url, columns, filter))
+
+    @classmethod
+    def from_hive(cls, dataset, columns=None, where=None):
+        """
+        Constructs an XFrame from a hive table.
+
+        Parameters
+        ----------
+        dataset : string
+            The hive table, given as table or database.table.
+
+        columns : list[str], optional
+            Read only these columns, in this order.
+
+        where : tuple | list[tuple], optional
+            Read only the rows that satisfy a predicate, or all of a list of predicates.
+            The predicates are given as in :py:meth:`~xframes.XFrame.read_parquet`.
+
+            The columns and predicates are added to the hive query, so they are pushed
+            down to the table scan.
+
+        Returns
+        -------
+        out : XFrame
+
+        See Also
+        --------
+        xframes.XFrame
+            The constructor can read hive tables.
+
+        Examples
+        --------
+        >>> xf = xframes.XFrame.from_hive('sales.orders', columns=['id', 'total'], where=('total', '>=', 10))
+        """
+        if not isinstance(dataset, basestring):
+            raise ValueError('Hive path is not a string: {}'.format(type(dataset).__name__))
+        return cls(impl=XFrameImpl.load_from_hive(dataset, columns, where))
 
     def impl(self):
         return self._impl
@@ -1163,6 +1174,37 @@ class XFrame(XObject):
         """
         return self._impl.dump_debug_info()
 
+    def explain(self, format='text'):
+        """
+        Describe the operations that produced this XFrame, and what they cost.
+
+        Each operation is shown with its arguments and the XFrames and XArrays it was
+        made from.  Cost hints are shown with each operation: the shuffles it caused,
+        how columns were zipped, broadcasts, persisted RDDs, and the counts that were
+        run on its result.  A safe zip is a fallback that joins and sorts both sides,
+        and repeated counts of the same result usually mean something is recomputed.
+
+        Parameters
+        ----------
+        format : {'text', 'dict'}, optional
+            The plan as an indented tree, with the last operation first, or as nested
+            dicts.  The dict form also holds the totals and the lineage.  An operation
+            that is reached again, through another input, is shown only once: the tree
+            marks it "(see above)", and the dicts give it as {'ref': id}, where id is the
+            'id' of its full dict.
+
+        Returns
+        -------
+        out : str | dict
+            The plan.
+
+        Examples
+        --------
+        >>> xf = xframes.XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        >>> print xf.groupby('val', {'count': xframes.aggregate.COUNT}).explain()
+        """
+        return self._impl.explain(format)
+
     def _get_pretty_tables(self, wrap_text=False, max_row_width=MAX_ROW_WIDTH,
                            max_column_width=30, max_columns=20,
                            max_rows_to_display=60):
@@ -1482,6 +1524,41 @@ class XFrame(XObject):
         """
         return self._impl.lineage_as_dict()
 
+    def describe(self, stats=None):
+        """
+        Compute summary statistics of every column of the XFrame.
+
+        All the columns are summarized in a single pass over the data.
+
+        Parameters
+        ----------
+        stats : list of str, optional
+            The statistics to compute.  The choices are 'count', 'missing', 'min', 'max',
+            'sum', 'mean', 'var', 'std', and 'nnz'.  By default, all of them are computed.
+
+        Returns
+        -------
+        out : dict
+            For each column name, a dict of the value of each statistic.
+            Missing values are included in 'count' and 'missing' and are skipped by the
+            others.  The numeric statistics are None for columns that are not numeric.
+            The variance and standard deviation use ddof=0.
+
+        See Also
+        --------
+        xframes.XArray.aggregate_stats
+            Computes the same statistics for an XArray.
+
+        Examples
+        --------
+        >>> xf = xframes.XFrame({'id': [1, 2, 3], 'val': ['a', 'b', None]})
+        >>> xf.describe(['count', 'missing', 'max'])
+        {'id': {'count': 3, 'missing': 0, 'max': 3},
+         'val': {'count': 3, 'missing': 1, 'max': None}}
+
+        """
+        return self._impl.describe(stats)
+
     def head(self, n=10):
         """
         The first n rows of the XFrame.
@@ -1592,6 +1669,71 @@ class XFrame(XObject):
         """
         return self._impl.to_rdd()
 
+    def to_columnar(self):
+        """
+        Store the XFrame by column.
+
+        Each partition is held as one array per column, instead of one tuple per row.
+        Int and float columns are packed into an array.array.
+        Selecting, adding, removing, renaming, and reordering columns then work on whole
+        columns, without rebuilding the rows.  Other operations see the XFrame as rows,
+        and return XFrames that are stored by row.
+
+        The columnar data is persisted, so this is most useful for an XFrame whose
+        columns are used many times.
+
+        Returns
+        -------
+        out : XFrame
+            An XFrame with the same contents, stored by column.
+
+        See Also
+        --------
+        is_columnar
+            Tells whether an XFrame is stored by column.
+
+        Examples
+        --------
+        >>> xf = xframes.XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']}).to_columnar()
+        >>> ids = xf['id']
+        """
+        return XFrame(impl=self._impl.to_columnar())
+
+    def is_columnar(self):
+        """
+        Tells whether the XFrame is stored by column.
+
+        Returns
+        -------
+        out : bool
+            True if the XFrame is stored by column.
+
+        See Also
+        --------
+        to_columnar
+            Stores an XFrame by column.
+        """
+        return self._impl.is_columnar()
+
+    def is_dataframe_backed(self):
+        """
+        Tells whether the XFrame is backed by a Spark DataFrame.
+
+        XFrames created from a Spark DataFrame, from the result of
+        :py:meth:`~xframes.XFrame.sql`, or read from parquet or hive are backed by a
+        DataFrame.  Selecting columns, filtering by values, sorting, grouping with the builtin
+        sum, count, min, max, mean, var, and std aggregators, and joining two such XFrames
+        are carried out by Spark SQL, and the result is also backed by a DataFrame.
+        The rows are converted into python only when an operation needs them, such as
+        apply, flat_map, or transform_col.
+
+        Returns
+        -------
+        out : bool
+            True if the XFrame is backed by a DataFrame.
+        """
+        return self._impl.is_dataframe_backed()
+
     def to_spark_dataframe(self,
                            table_name=None,
                            column_names=None,
@@ -2367,8 +2509,12 @@ class XFrame(XObject):
         if not isinstance(column_name, str):
             raise TypeError('Column_name must be a string.')
 
-        xf = self[self[column_name].topk_index(topk=k, reverse=reverse)]
-        return xf.sort(column_name, ascending=reverse)
+        if column_name not in self.column_names():
+            raise ValueError("Column name does not exist: '{}'.".format(column_name))
+        if not isinstance(k, int):
+            raise TypeError('K must be an integer.')
+
+        return XFrame(impl=self._impl.topk(column_name, k, reverse))
 
     def save(self, filename, format=None):
         """
@@ -2385,7 +2531,8 @@ class XFrame(XObject):
             Format in which to save the XFrame. Binary saved XFrames can be
             loaded much faster and without any format conversion losses. If not
             given, will try to infer the format from filename given. If file
-            name ends with 'csv' or '.csv.gz', then save as 'csv' format.
+            name ends with 'csv', '.csv.gz', or '.csv.bz2', then save as 'csv' format,
+            compressed if the name says so.
             If the file ends with 'parquet', then save as parquet file.
             Otherwise save as 'binary' format.
 
@@ -2404,7 +2551,7 @@ class XFrame(XObject):
         """
 
         if format is None:
-            if filename.endswith(('.csv', '.csv.gz')):
+            if filename.endswith(('.csv', '.csv.gz', '.csv.bz2')):
                 format = 'csv'
             elif filename.endswith('.parquet'):
                 format = 'parquet'
@@ -2412,7 +2559,7 @@ class XFrame(XObject):
                 format = 'binary'
         else:
             if format is 'csv':
-                if not filename.endswith(('.csv', '.csv.gz')):
+                if not filename.endswith(('.csv', '.csv.gz', '.csv.bz2')):
                     filename += '.csv'
             elif format is 'parquet':
                 if not filename.endswith('.parquet'):
@@ -2429,9 +2576,9 @@ class XFrame(XObject):
             self._impl.save(url)
 
         elif format is 'csv':
-            if not filename.endswith(('.csv', '.csv.gz')):
-                raise ValueError('File name must end with .csv or .csv.gz.')
-            self._impl.save_as_csv(url)
+            if not filename.endswith(('.csv', '.csv.gz', '.csv.bz2')):
+                raise ValueError('File name must end with .csv, .csv.gz, or .csv.bz2.')
+            self._impl.save_as_csv(url, compression=XFrameImpl.compression_from_path(filename))
         elif format is 'parquet':
             if not filename.endswith('.parquet'):
                 raise ValueError('File name must end with .parquet.')
@@ -2439,6 +2586,46 @@ class XFrame(XObject):
         else:
             raise ValueError('Unsupported format: {}.'.format(format))
 
+    def save_as_csv(self, filename, header='once', single_file=True, compression=None):
+        """
+        Save the XFrame as a csv file.
+
+        Every partition is written in parallel.  The partitions are then merged into one
+        file by the file system, or left as separate files.
+
+        Parameters
+        ----------
+        filename : string
+            A local path or a remote URL.
+
+        header : {'once', 'shard'}, optional
+            Write the column names once, at the start of the file, or at the start of
+            every shard.  Writing them in every shard makes each shard a complete csv file.
+
+        single_file : bool, optional
+            If True, the shards are merged into the file `filename`.  Otherwise `filename`
+            is a directory holding one file for each partition.
+
+        compression : {None, 'gzip', 'bz2'}, optional
+            Compress each shard.  When the shards are merged, the result is a multi-stream
+            compressed file.  If not given, it is inferred from a filename ending in '.gz'
+            or '.bz2'.
+
+        See Also
+        --------
+        xframes.XFrame.save
+
+        Examples
+        --------
+        >>> xf.save_as_csv('data/training_data.csv.gz')
+
+        >>> xf.save_as_csv('data/training_data', header='shard', single_file=False)
+        """
+        url = make_internal_url(filename)
+        XFrameImpl.check_output_uri(url)
+        compression = compression or XFrameImpl.compression_from_path(filename)
+        self._impl.save_as_csv(url, header=header, single_file=single_file, compression=compression)
+
     def save_as_parquet(self, filename, column_names=None, column_type_hints=None):
         url = make_internal_url(filename)
         XFrameImpl.check_output_uri(url)
@@ -3048,12 +3235,8 @@ class XFrame(XObject):
         """
 
         def generator():
-            # The more we get at a time, the more buffer space it takes.
-            # But getting a lot of items takes a lot of time, if we only need a few.
-            # Getting more is expensive, because we have to number everything and then
-            #  filter out the ones we don't want.  This is a compromise.
-            # TODO: start with getting fwer, and if that is not enough, get
-            # TODO: a bigger chunk.
+            # The impl fetches rows one partition at a time, and hands them out
+            #  in chunks of this size.
             elems_at_a_time = 200000
             self._impl.begin_iterator()
             ret = self._impl.iterator_get_next(elems_at_a_time)
@@ -3494,21 +3677,21 @@ class XFrame(XObject):
         >>> user_rating_stats = xf.groupby(['user_id', 'time'], agg.COUNT(),
         ...                                {'rating_quantiles': agg.QUANTILE('rating',[0.25, 0.75])})
         >>> user_rating_stats
-        +------+---------+-------+------------------------+
-        | time | user_id | Count |    rating_quantiles    |
-        +------+---------+-------+------------------------+
-        | 2006 |  61285  |   1   | array('d', [4.0, 4.0]) |
-        | 2000 |  36078  |   1   | array('d', [4.0, 4.0]) |
-        | 2003 |  47158  |   1   | array('d', [3.0, 3.0]) |
-        | 2007 |  34446  |   1   | array('d', [3.0, 3.0]) |
-        | 2010 |  47990  |   1   | array('d', [3.0, 3.0]) |
-        | 2003 |  42120  |   1   | array('d', [5.0, 5.0]) |
-        | 2007 |  44940  |   1   | array('d', [4.0, 4.0]) |
-        | 2008 |  58240  |   1   | array('d', [4.0, 4.0]) |
-        | 2002 |   102   |   1   | array('d', [1.0, 1.0]) |
-        | 2009 |  52708  |   1   | array('d', [3.0, 3.0]) |
-        | ...  |   ...   |  ...  |          ...           |
-        +------+---------+-------+------------------------+
+        +------+---------+-------+------------------+
+        | time | user_id | Count | rating_quantiles |
+        +------+---------+-------+------------------+
+        | 2006 |  61285  |   1   |    [4.0, 4.0]    |
+        | 2000 |  36078  |   1   |    [4.0, 4.0]    |
+        | 2003 |  47158  |   1   |    [3.0, 3.0]    |
+        | 2007 |  34446  |   1   |    [3.0, 3.0]    |
+        | 2010 |  47990  |   1   |    [3.0, 3.0]    |
+        | 2003 |  42120  |   1   |    [5.0, 5.0]    |
+        | 2007 |  44940  |   1   |    [4.0, 4.0]    |
+        | 2008 |  58240  |   1   |    [4.0, 4.0]    |
+        | 2002 |   102   |   1   |    [1.0, 1.0]    |
+        | 2009 |  52708  |   1   |    [3.0, 3.0]    |
+        | ...  |   ...   |  ...  |       ...        |
+        +------+---------+-------+------------------+
         [10000 rows x 4 columns]
 
         To put all items a user rated into one list value by their star rating:
@@ -3558,7 +3741,7 @@ class XFrame(XObject):
         """
         return self._groupby(key_columns, operations, *args)
 
-    def join(self, right, on=None, how='inner'):
+    def join(self, right, on=None, how='inner', strategy='auto'):
         """
         Merge two XFrames. Merges the current (left) XFrame with the given
         (right) XFrame using a SQL-style equi-join operation by columns.
@@ -3610,6 +3793,23 @@ class XFrame(XObject):
               There is no common column matching: the resulting number of rows is the product
               of the row counts of the left and right XFrames.
 
+        strategy : {'auto', 'broadcast', 'shuffle'}, optional
+            How the join is carried out.  'auto' is default.
+
+            * auto: Use a broadcast join if one side of the join has no more rows than
+              the broadcast-join-threshold setting in the [xframes] section of the
+              config file, and a shuffle join otherwise.
+
+            * broadcast: Collect the right XFrame (the left for a right join) into a
+              hash table, send it to every worker, and look up each row of the other
+              XFrame in it.  The broadcast side must fit in memory.  Full joins are
+              always shuffle joins.
+
+            * shuffle: Partition both XFrames by their join keys, and join the
+              matching partitions.
+
+            The strategy does not apply to cartesian joins.
+
         Returns
         -------
         out : XFrame
@@ -3673,6 +3873,9 @@ class XFrame(XObject):
         if how not in available_join_types:
             raise ValueError('Invalid join type.')
 
+        if strategy not in ['auto', 'broadcast', 'shuffle']:
+            raise ValueError('Invalid join strategy.')
+
         join_keys = dict()
         if on is None:
             left_names = self.column_names()
@@ -3692,7 +3895,7 @@ class XFrame(XObject):
         else:
             raise TypeError("Must pass a 'str', 'list', or 'dict' of join keys.")
 
-        return XFrame(impl=self._impl.join(right._impl, how, join_keys))
+        return XFrame(impl=self._impl.join(right._impl, how, join_keys, strategy))
 
     def split_datetime(self, expand_column, column_name_prefix=None, limit=None):
         """
@@ -5041,6 +5244,53 @@ class XFrame(XObject):
         """
         return XFrame(impl=self._impl.sql(sql_statement, table_name=table_name))
 
+    def register_table(self, table_name):
+        """
+        Register the XFrame as a temporary table, for use in Spark SQL queries.
+
+        The Spark DataFrame for the XFrame is built and cached the first time the XFrame
+        is registered or queried with :py:meth:`~xframes.XFrame.sql`.  It is reused, and the
+        table is left as it is, until the XFrame is modified, or freed.  When the number
+        of rows is already known, the DataFrame gets one partition for about
+        sql-rows-per-partition rows, from the [xframes] config section; otherwise it keeps
+        the partitions of the XFrame.
+
+        Parameters
+        ----------
+        table_name : str
+            The table name, used in sql statements.
+
+        See Also
+        --------
+        xframes.XFrame.unregister_table
+            Removes the table.
+
+        Examples
+        --------
+        >>> xf = xframes.XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        >>> xf.register_table('items')
+        >>> sql_context = xframes.XFrame.spark_sql_context()
+        >>> sql_context.sql('SELECT val FROM items WHERE id > 1').collect()
+        """
+        if not isinstance(table_name, basestring):
+            raise TypeError('Table name must be a string.')
+        self._impl.register_table(table_name)
+
+    @classmethod
+    def unregister_table(cls, table_name):
+        """
+        Remove a temporary table registered by :py:meth:`~xframes.XFrame.register_table`
+        or :py:meth:`~xframes.XFrame.sql`.
+
+        Parameters
+        ----------
+        table_name : str
+            The table name.
+        """
+        if not isinstance(table_name, basestring):
+            raise TypeError('Table name must be a string.')
+        XFrameImpl.unregister_table(table_name)
+
     @property
     def shape(self):
         """
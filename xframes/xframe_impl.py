@@ -2,52 +2,53 @@
 This module provides an implementation of XFrame using pySpark RDDs.
 """
 import os
-import json
 import random
 import array
 import pickle
 import csv
 import StringIO
-import ast
-import shutil
 import re
 import copy
-import datetime
-from dateutil import parser as date_parser
+import itertools
+from operator import itemgetter
 import logging
+import weakref
 
 
 from xframes.deps import HAS_PANDAS
 from xframes.deps import HAS_NUMPY
 
-from pyspark.sql import DataFrame
 from pyspark.sql.types import StructType, StructField
 
 import xframes.fileio as fileio
 from xframes.xobject_impl import XObjectImpl
 from xframes.traced_object import TracedObject
 from xframes.spark_context import CommonSparkContext
-from xframes.util import infer_type_of_rdd
+from xframes.util import infer_types, sample_partitions, classify_type, merge_classified_types
 from xframes.util import cache, uncache, persist, unpersist
 from xframes.util import is_missing, is_missing_or_empty
 from xframes.util import to_ptype, to_schema_type, hint_to_schema_type, pytype_from_dtype, safe_cast_val
 from xframes.util import distribute_seed
+from xframes.util import iterate_partitions, take_partitions
 from xframes.lineage import Lineage
 import xframes
 from xframes.xarray_impl import XArrayImpl
 from xframes.xrdd import XRdd
-from xframes.cmp_rows import CmpRows
+from xframes.sort_keys import sort_key_encoder, range_bounds, range_partitioner
+from xframes.heapdict import BoundedHeap
+from xframes.columnar import rows_to_blocks, values_to_columns
+import xframes.columnar_io as columnar_io
+from xframes.column_stats import aggregate_rows, validate_stats
+from xframes.csv_parse import parse_header, parse_partition, make_row_parser, make_row_caster
 from xframes.aggregator_impl import aggregator_properties
+from xframes.shuffle_keys import key_encoder, key_decoder
+import xframes.dataframe_ops as dataframe_ops
+import xframes.plan as plan
 
 if HAS_NUMPY:
     import numpy
 
 
-# Used to save the original line being parsed.
-# If there are any errors, then the line is picked up from here.
-saved_line = None
-
-
 # noinspection PyUnresolvedReferences,PyShadowingNames,PyIncorrectDocstring
 def name_col(existing_col_names, proposed_name):
     """ Give a column a unique name.
@@ -68,6 +69,13 @@ def name_col(existing_col_names, proposed_name):
 class XFrameImpl(XObjectImpl, TracedObject):
     """ Implementation for XFrame. """
 
+    # the impl whose sql DataFrame was last registered under each table name
+    # only weak references are held, so the impls and their DataFrames can be freed
+    _table_owners = {}
+    # weak references to the impls holding a cached sql DataFrame
+    # each has a callback, holding only the DataFrame, that unpersists it when the impl is freed
+    _sql_cache_refs = set()
+
     def __init__(self, rdd=None, col_names=None, column_types=None, lineage=None):
         """ Instantiate a XFrame implementation.
 
@@ -83,8 +91,16 @@ class XFrameImpl(XObjectImpl, TracedObject):
         self.col_names = list(col_names)
         self.column_types = list(column_types)
         self.lineage = lineage or Lineage.init_frame_lineage(Lineage.EMPTY, self.col_names)
-        self.iter_pos = None
+        self.iter_rows = None
         self._num_rows = None
+        # when the XFrame is stored by column, this holds one ColumnBlock per partition,
+        #  and the rdd is a view of the blocks as rows
+        self._blocks = None
+        # when the XFrame is backed by a spark DataFrame, this holds it,
+        #  and the rdd is a view of the DataFrame as rows
+        self._dataframe = None
+        # the DataFrame built for sql queries, and the key of the rdd it was built from
+        self._sql_cache = None
 
         self.materialized = False
 
@@ -116,6 +132,9 @@ class XFrameImpl(XObjectImpl, TracedObject):
         This is typically used when a function modifies the current XFrame.
         """
         self._replace_rdd(rdd)
+        self._blocks = None
+        self._dataframe = None
+        self._clear_sql_cache()
         if col_names is not None:
             self.col_names = col_names
         if column_types is not None:
@@ -128,11 +147,99 @@ class XFrameImpl(XObjectImpl, TracedObject):
         return self
 
     def _count(self):
-        persist(self._rdd)
-        count = self._rdd.count()
+        if self._dataframe is not None:
+            count = self._dataframe.count()
+        elif self._blocks is not None:
+            persist(self._blocks)
+            count = self._blocks.map(lambda block: block.num_rows).sum()
+        else:
+            persist(self._rdd)
+            count = self._rdd.count()
         self.materialized = True
+        self._plan.add_action('count', count)
         return count
 
+    def _known_count(self):
+        """
+        The number of rows if it is known without running a job, otherwise None.
+        """
+        return self._num_rows
+
+    def _rows_if_fits(self, limit):
+        """
+        The rows, as a list, if there are no more than limit of them, otherwise None.
+
+        Unless the count is already known, at most limit + 1 rows are taken, rather than
+        counting them all.  The rows taken are returned, so they need not be computed again.
+        """
+        count = self._known_count()
+        if count is not None:
+            return self._rdd.collect() if count <= limit else None
+        rows = self._rdd.take(limit + 1)
+        if len(rows) > limit:
+            return None
+        self._num_rows = len(rows)
+        return rows
+
+    @staticmethod
+    def _from_blocks(blocks, col_names, column_types, lineage):
+        """
+        Return a new XFrameImpl stored by column, from an RDD of ColumnBlocks.
+        """
+        rdd = blocks.flatMap(lambda block: block.rows(), preserves_structure=True)
+        res = XFrameImpl(rdd, col_names, column_types, lineage)
+        res._blocks = blocks
+        return res
+
+    def _rv_blocks(self, blocks, col_names=None, column_types=None, lineage=None):
+        """
+        Return a new XFrameImpl stored by column, with the given blocks.
+
+        Column names, types, and lineage default to the existing ones.
+        """
+        col_names = self.col_names if col_names is None else col_names
+        column_types = self.column_types if column_types is None else column_types
+        lineage = lineage or self.lineage
+        return XFrameImpl._from_blocks(blocks, col_names, column_types, lineage)
+
+    def to_columnar(self):
+        """
+        Return an XFrameImpl that stores each partition by column.
+
+        The blocks are persisted, since they are meant to be reused.
+        """
+        self._entry()
+        if self._blocks is not None:
+            return self
+        blocks = self._rdd.mapPartitions(rows_to_blocks(self.column_types))
+        persist(blocks)
+        return self._rv_blocks(blocks)
+
+    def is_columnar(self):
+        """
+        True if the XFrameImpl stores each partition by column.
+        """
+        self._entry()
+        return self._blocks is not None
+
+    def _rv_dataframe(self, dataframe, col_names=None, column_types=None, lineage=None):
+        """
+        Return a new XFrameImpl backed by the given DataFrame.
+
+        Column names, types, and lineage default to the existing ones.
+        """
+        col_names = self.col_names if col_names is None else col_names
+        column_types = self.column_types if column_types is None else column_types
+        lineage = lineage or self.lineage
+        return XFrameImpl._from_dataframe(dataframe, col_names, column_types, lineage)
+
+    def is_dataframe_backed(self):
+        """
+        True if the XFrameImpl is backed by a spark DataFrame.
+        """
+        self._entry()
+        return self._dataframe is not None
+
     def rdd(self):
         return self._rdd
 
@@ -181,11 +288,14 @@ class XFrameImpl(XObjectImpl, TracedObject):
         return XFrameImpl(rdd, column_names, column_types, lineage)
 
     @classmethod
-    def load_from_xframe_index(cls, path):
+    def load_from_xframe_index(cls, path, columns=None):
         """
         Load from a saved xframe.
+
+        If columns is given, only those columns are loaded.  In the columnar format,
+        the other columns are not decoded.
         """
-        cls._entry(path=path)
+        cls._entry(path=path, columns=columns)
         sc = cls.spark_context()
         res = sc.pickleFile(path)
         # read metadata from the same directory
@@ -193,12 +303,41 @@ class XFrameImpl(XObjectImpl, TracedObject):
         XFrameImpl.check_input_uri(metadata_path)
         with fileio.open_file(metadata_path) as f:
             names, types = pickle.load(f)
+        # xframes saved in the row format have no format file
+        format_path = os.path.join(path, '_format')
+        if fileio.exists(format_path):
+            with fileio.open_file(format_path) as f:
+                properties = pickle.load(f)
+        else:
+            properties = {}
         lineage_path = os.path.join(path, '_lineage')
         if fileio.exists(lineage_path):
             lineage = Lineage.load(lineage_path)
         else:
             lineage = Lineage.init_frame_lineage(path, names)
-        return cls(res, names, types, lineage)
+
+        if columns is None:
+            indexes = range(len(names))
+        else:
+            for col in columns:
+                if col not in names:
+                    raise ValueError("Column '{}' not in XFrame.".format(col))
+            indexes = [names.index(col) for col in columns]
+            lineage = lineage.select_columns(columns)
+
+        if properties.get('format') == columnar_io.FORMAT:
+            if properties.get('version', 0) > columnar_io.VERSION:
+                raise ValueError('XFrame was saved by a newer version: {}.'.format(properties['version']))
+            all_types = types
+            blocks = XRdd(res.map(lambda chunk: columnar_io.decode_block(chunk, all_types, indexes)))
+            return XFrameImpl._from_blocks(blocks,
+                                           [names[i] for i in indexes],
+                                           [types[i] for i in indexes],
+                                           lineage)
+
+        if columns is not None:
+            res = res.map(lambda row: tuple([row[i] for i in indexes]))
+        return cls(res, [names[i] for i in indexes], [types[i] for i in indexes], lineage)
 
     @classmethod
     def load_from_spark_dataframe(cls, rdd):
@@ -210,33 +349,43 @@ class XFrameImpl(XObjectImpl, TracedObject):
         xf_names = [str(col.name) for col in schema.fields]
         xf_types = [to_ptype(col.dataType) for col in schema.fields]
         lineage = Lineage.init_frame_lineage(Lineage.DATAFRAME, xf_names)
+        return cls._from_dataframe(rdd, xf_names, xf_types, lineage)
 
-        def row_to_tuple(row):
-            return tuple([row[i] for i in range(len(row))])
-        xf_rdd = rdd.map(row_to_tuple)
-        return cls(xf_rdd, xf_names, xf_types, lineage)
+    @staticmethod
+    def _from_dataframe(dataframe, col_names, column_types, lineage):
+        """
+        Return a new XFrameImpl backed by a spark dataframe.
+
+        Operations that spark can run stay on the dataframe.  Others use the rdd, which
+        converts the dataframe rows into tuples a partition at a time, only when it is
+        evaluated.
+        """
+        rdd = dataframe.rdd.mapPartitions(lambda rows: itertools.imap(tuple, rows))
+        res = XFrameImpl(rdd, col_names, column_types, lineage)
+        res._dataframe = dataframe
+        return res
 
     # noinspection SqlNoDataSourceInspection
     @classmethod
-    def load_from_hive(cls, dataset):
+    def load_from_hive(cls, dataset, columns=None, where=None):
         """
         Load data from a hive dataset.  This is normally given as database.table.
+
+        The columns and where predicates are applied to the hive query, so
+        they are pushed down to the table scan.
         """
-        cls._entry()
+        cls._entry(columns=columns, where=where)
         hc = cls.hive_context()
         # guard agains SQL injection attack
         if not re.match('^[A-Za-z0-9]+(.[A-Za-z0-9]+)?$', dataset):
             raise ValueError('Hive dataset name must contain only alphanumeric and period.')
         hive_dataframe = hc.sql('SELECT * from {}'.format(dataset))
+        hive_dataframe = dataframe_ops.select_dataframe(hive_dataframe, columns, where)
         xf_names = [str(col) for col in hive_dataframe.columns]
         type_names = [name_type[1] for name_type in hive_dataframe.dtypes]
         xf_types = [pytype_from_dtype(type_name) for type_name in type_names]
-
-        def row_to_tuple(row):
-            return tuple([row[i] for i in range(len(row))])
-        rdd = hive_dataframe.map(row_to_tuple)
         lineage = Lineage.init_frame_lineage(dataset, xf_names)
-        return cls(rdd, xf_names, xf_types, lineage)
+        return cls._from_dataframe(hive_dataframe, xf_names, xf_types, lineage)
 
     @classmethod
     def load_from_rdd(cls, rdd, names=None, types=None):
@@ -249,9 +398,10 @@ class XFrameImpl(XObjectImpl, TracedObject):
             if len(types) != len(first_row):
                 raise ValueError('Length of types does not match RDD.')
         names = names or ['X.{}'.format(i) for i in range(len(first_row))]
-        types = types or [type(elem) for elem in first_row]
+        if types is None:
+            # columns with no values in the sample keep the type of the first row
+            types = [typ or type(elem) for typ, elem in zip(infer_types(rdd), first_row)]
         lineage = Lineage.init_frame_lineage(Lineage.RDD, names)
-        # TODO sniff types using more of the rdd
         return cls(rdd, names, types, lineage)
 
     @classmethod
@@ -288,11 +438,6 @@ class XFrameImpl(XObjectImpl, TracedObject):
         # 'continue_on_failure': True,
         # 'store_errors': False,
 
-        def apply_comment(line, comment_char):
-            return line.partition(comment_char)[0].rstrip()
-        if comment_char:
-            raw = raw.map(lambda line: apply_comment(line, comment_char))
-
         def to_format_params(config):
             params = {}
             parm_map = {
@@ -309,87 +454,12 @@ class XFrameImpl(XObjectImpl, TracedObject):
             return params
 
         params = to_format_params(parsing_config)
-        if row_limit:
-            if row_limit > 100:
-                pairs = raw.zipWithIndex()
-                cache(pairs)
-                filtered_pairs = pairs.filter(lambda x: x[1] < row_limit)
-                uncache(pairs)
-                raw = filtered_pairs.keys()
-            else:
-                lines = raw.take(row_limit)
-                raw = XRdd(sc.parallelize(lines))
-
-        # read and parse a csv file in a partition
-        def read_csv_stream(f, params, num_columns):
-            def record_input(_f):
-                global saved_line
-                for line in _f:
-                    saved_line = line
-                    yield line
-
-            def strip_utf8_bom(_f):
-                for line in _f:
-                    if len(line) > 3 and ord(line[0]) == 239 and ord(line[1]) == 187 and ord(line[2]) == 191:
-                        yield line[3:]
-                    else:
-                        yield line
-
-            def handle_unicode(_f):
-                # The Python 2 CSV parser can only handle ASCII and UTF-8.
-                for line in _f:
-                    if isinstance(line, str):
-                        yield line
-                    else:
-                        yield line.encode('utf-8')
-
-            def strip_comments(_f, comment_char):
-                # Wraps the file iterator, providing comment stripping
-                for line in _f:
-                    yield line.partition(comment_char)[0].rstrip()
-
-            def unquote(field):
-                if field is None or len(field) == 0:
-                    return field
-                if field[0] == '"' and field[-1] == '"':
-                    return field[1: -1]
-                if field[0] == "'" and field[-1] == "'":
-                    return field[1: -1]
-                return field
-
-            def strip_newline(field):
-                return field.replace('\n', '\\n').replace('\r', '\\r')
-
-            f = strip_utf8_bom(handle_unicode(record_input(f)))
-
-            params = copy.copy(params)
-
-            if 'commentchar' in params:
-                commentchar = params['commentchar']
-                del params['commentchar']
-                f = strip_comments(f, commentchar)
-
-            reader = csv.reader(f, **params)
-
-            try:
-                for row in reader:
-                    # get rid of newline in fields
-                    # get rid of quotes around fields
-                    row = [unquote(strip_newline(col)) for col in row]
-                    if num_columns is not None and len(row) != num_columns:
-                        yield 'width', saved_line
-                    else:
-                        yield 'data', row
-            except csv.Error:
-                yield 'csv', saved_line
-            except SystemError:
-                yield 'csv', saved_line
 
         errs = {}
 
         # use first row, if available, to make column names
         first_raw = raw.first()
-        res = read_csv_stream([first_raw], params, num_columns=None).next()
+        res = parse_header(first_raw, params, comment_char)
         if res[0] != 'data':
             errs['header'] = XArrayImpl(rdd=sc.parallelize([res[1]]), elem_type=str)
             return errs, XFrameImpl()
@@ -400,21 +470,6 @@ class XFrameImpl(XObjectImpl, TracedObject):
             col_names = ['X.{}'.format(i) for i in range(len(first))]
         col_count = len(col_names)
 
-        parsed = raw.mapPartitions(lambda partition:
-                                   read_csv_stream(partition, params, col_count))
-
-        persist(parsed)
-        res = parsed.filter(lambda tup: tup[0] == 'data').values()
-        if store_errors:
-            errs['width'] = XArrayImpl(rdd=parsed.filter(lambda tup: tup[0] == 'width').values(), elem_type=str)
-            errs['csv'] = XArrayImpl(rdd=parsed.filter(lambda tup: tup[0] == 'csv').values(), elem_type=str)
-        unpersist(parsed)
-
-        # filter out all rows that match header
-        # this could potentialy filter data rows, but we will ignore that for now
-        if use_header:
-            res = res.filter(lambda row: row != first)
-
         # Transform hints: __X{}__ ==> name.
         # If it is not of this form, leave it alone.
         def extract_index(s):
@@ -432,7 +487,11 @@ class XFrameImpl(XObjectImpl, TracedObject):
             return col_names[index]
 
         # get desired column types
-        if '__all_columns__' in type_hints:
+        infer_types_from_sample = type_hints is None
+        if infer_types_from_sample:
+            # parse as str, then infer the types from the parsed rows
+            types = [str for _ in first]
+        elif '__all_columns__' in type_hints:
             # all cols are of the given type
             typ = type_hints['__all_columns__']
             types = [typ for _ in first]
@@ -444,60 +503,60 @@ class XFrameImpl(XObjectImpl, TracedObject):
             for col in col_names:
                 if col in type_hints:
                     types[col_names.index(col)] = type_hints[col]
-        column_types = types
-
-        # apply na values to value
-        def apply_na(row, na_values):
-            return [None if val in na_values else val for val in row]
-        if len(na_values) > 0:
-            res = res.map(lambda row: apply_na(row, na_values))
 
         # drop columns with empty header
-        remove_cols = [col_index for col_index, col_name in enumerate(col_names) if len(col_name) == 0]
-
-        def remove_columns(row):
-            return [val for index, val in enumerate(row) if index not in remove_cols]
-        if len(remove_cols) > 0:
-            res = res.map(remove_columns)
-            col_names = remove_columns(col_names)
-
-        # cast to desired type
-        def cast_val(val, typ, name):
-            if val is None:
-                return None
-            if len(val) == 0:
-                if typ is int:
-                    return 0
-                if typ is float:
-                    return 0.0
-                if typ is datatime.datetime:
-                    return datatime.datetime(1, 1, 1)
-                if typ is str:
-                    return ''
-                if typ is dict:
-                    return {}
-                if typ is list:
-                    return []
-            try:
-                if typ in (dict, list):
-                    return ast.literal_eval(val)
-                elif typ is datetime.datetime:
-                    return date_parser.parse(val)
-                return typ(val)
-            except ValueError:
-                raise ValueError('Cast failed: ({}) {}  col: {}'.format(typ, val, name))
-            except TypeError:
-                raise TypeError('Cast failed: ({}) {}  col: {}'.format(typ, val, name))
-
-        # This is where the result is cast as a tuple
-        def cast_row(row, types, names):
-            return tuple([cast_val(val, typ, name) for val, typ, name in zip(row, types, names)])
-
-        # TODO -- if cast fails, then store None
-        if not (len(types) == 0 or all([t == str for t in types])):
-            res = res.map(lambda row: cast_row(row, types, col_names))
-            if row_limit is None:
-                persist(res)
+        keep_cols = [col_index for col_index, col_name in enumerate(col_names) if len(col_name) > 0]
+        col_names = [col_names[col_index] for col_index in keep_cols]
+        column_types = [types[col_index] for col_index in keep_cols]
+
+        # clean, apply na values, drop columns, and cast, in one pass
+        parse_row = make_row_parser(column_types, col_names, na_values, keep_cols)
+        header = first if use_header else None
+
+        def parse(lines, tagged):
+            return parse_partition(lines, params, comment_char, col_count, header, parse_row, tagged)
+        if row_limit:
+            # parse partitions in order, only until there are row_limit rows
+            def parse_limited(lines, needed):
+                count = 0
+                for item in parse(lines, True):
+                    yield item
+                    if item[0] == 'data':
+                        count += 1
+                        if count >= needed:
+                            break
+            items = take_partitions(raw, parse_limited, row_limit, lambda item: item[0] == 'data')
+            res = XRdd(sc.parallelize([val for tag, val in items if tag == 'data']))
+            if store_errors:
+                errs['width'] = XArrayImpl(rdd=sc.parallelize([val for tag, val in items if tag == 'width']),
+                                           elem_type=str)
+                errs['csv'] = XArrayImpl(rdd=sc.parallelize([val for tag, val in items if tag == 'csv']),
+                                         elem_type=str)
+        elif store_errors:
+            parsed = raw.mapPartitions(lambda lines: parse(lines, True), preserves_structure=False)
+            persist(parsed)
+            res = parsed.filter(lambda tup: tup[0] == 'data').values()
+            errs['width'] = XArrayImpl(rdd=parsed.filter(lambda tup: tup[0] == 'width').values(), elem_type=str)
+            errs['csv'] = XArrayImpl(rdd=parsed.filter(lambda tup: tup[0] == 'csv').values(), elem_type=str)
+            unpersist(parsed)
+        else:
+            res = raw.mapPartitions(lambda lines: parse(lines, False), preserves_structure=False)
+        if row_limit is None:
+            persist(res)
+
+        if infer_types_from_sample:
+            # sample every partition of the parsed rows, so the file is not read again
+            def classify_sample(rows):
+                if len(rows) == 0:
+                    return None
+                return [{classify_type(val) for val in col if val is not None} for col in zip(*rows)]
+            col_classes = [set() for _ in col_names]
+            for partition_classes in sample_partitions(res, classify_sample):
+                if partition_classes is not None:
+                    col_classes = [classes1 | classes2 for classes1, classes2 in zip(col_classes, partition_classes)]
+            column_types = [merge_classified_types(classes) for classes in col_classes]
+            if any([column_type is not str for column_type in column_types]):
+                res = res.map(make_row_caster(column_types, col_names))
 
         lineage = Lineage.init_frame_lineage(path, col_names)
 
@@ -533,24 +592,27 @@ class XFrameImpl(XObjectImpl, TracedObject):
         return XFrameImpl(res, col_names, col_types, lineage)
 
     @classmethod
-    def load_from_parquet(cls, path):
+    def load_from_parquet(cls, path, columns=None, predicates=None):
         """
         Load RDD from a parquet file
+
+        The columns and predicates are applied to the dataframe before it is converted,
+        so the parquet reader reads only those columns, and skips row groups that
+        cannot match.
         """
-        cls._entry(path=path)
+        cls._entry(path=path, columns=columns, predicates=predicates)
         sqlc = CommonSparkContext.spark_sql_context()
         spark_ver = CommonSparkContext.spark_version()
         if spark_ver >= [1, 6, 0]:
             s_rdd = sqlc.read.parquet(path)
         else:
             s_rdd = sqlc.parquetFile(path)
+        s_rdd = dataframe_ops.select_dataframe(s_rdd, columns, predicates)
         schema = s_rdd.schema
         col_names = [str(col.name) for col in schema.fields]
         col_types = [to_ptype(col.dataType) for col in schema.fields]
         lineage = Lineage.init_frame_lineage(path, col_names)
-
-        rdd = s_rdd.map(lambda row: tuple(row))
-        return XFrameImpl(rdd, col_names, col_types, lineage)
+        return cls._from_dataframe(s_rdd, col_names, col_types, lineage)
 
     # Save
     def save(self, path):
@@ -558,6 +620,7 @@ class XFrameImpl(XObjectImpl, TracedObject):
         Save to a file.
 
         Saved in an efficient internal format, intended for reading back into an RDD.
+        Each partition is saved as one chunk, stored by column: see xframes.columnar_io.
 
         Note: do not save over the old file name of an XFrame.  The lazy evaluator is
         triggered by the save operation, and still needs to read from the old file to generate
@@ -566,8 +629,13 @@ class XFrameImpl(XObjectImpl, TracedObject):
         """
         self._entry(path=path)
         fileio.delete(path)
-        # save rdd
-        self._rdd.saveAsPickleFile(path)
+        # save one chunk per partition
+        column_types = self.column_types
+        blocks = self._blocks
+        if blocks is None:
+            blocks = self._rdd.mapPartitions(rows_to_blocks(column_types))
+        chunks = blocks.map(lambda block: columnar_io.encode_block(block, column_types))
+        chunks.saveAsPickleFile(path)
         # save metadata in the same directory
 
         metadata_path = os.path.join(path, '_metadata')
@@ -576,16 +644,23 @@ class XFrameImpl(XObjectImpl, TracedObject):
             # TODO detect filesystem errors
             pickle.dump(metadata, f)
 
+        format_path = os.path.join(path, '_format')
+        with fileio.open_file(format_path, 'w') as f:
+            pickle.dump({'format': columnar_io.FORMAT, 'version': columnar_io.VERSION}, f)
+
         lineage_path = os.path.join(path, '_lineage')
         self.lineage.save(lineage_path)
 
     # noinspection PyArgumentList
-    def save_as_csv(self, path, **params):
+    def save_as_csv(self, path, header='once', single_file=True, compression=None, **params):
         """
         Save to a text file in csv format.
+
+        Every partition is written in parallel, then the shards are merged, unless
+        single_file is False.
         """
         # Transform into RDD of csv-encoded lines, then write
-        self._entry(path=path, **params)
+        self._entry(path=path, header=header, single_file=single_file, compression=compression, **params)
 
         def to_csv(row, **params):
             sio = StringIO.StringIO()
@@ -596,28 +671,12 @@ class XFrameImpl(XObjectImpl, TracedObject):
             except IOError:
                 return ''
 
-        # create heading with line terminator
-        heading = to_csv(self.column_names(), **params)
-        # create rows without the line terminator
+        # create heading and rows without the line terminator
         params['lineterminator'] = ''
+        heading = to_csv(self.column_names(), **params)
         csv_data = self._rdd.map(lambda row: to_csv(row, **params))
-
-        # Make a CSV file from an RDD
-
-        # this will ensure that we get everything in one fie
-        data = csv_data.repartition(1)
-
-        # save the data in the part file
-        temp_file_name = fileio.temp_file_name(path)
-        data.saveAsTextFile(temp_file_name)
-        in_path = os.path.join(temp_file_name, 'part-00000')
-        fileio.delete(path)
-        # copy the part file to the output file
-        with fileio.open_file(path, 'w') as f:
-            f.write(heading)
-            with fileio.open_file(in_path) as rd:
-                shutil.copyfileobj(rd, f)
-        fileio.delete(temp_file_name)
+        self._save_lines(path, csv_data, heading=heading, header=header,
+                         single_file=single_file, compression=compression)
 
     def save_as_parquet(self, url, column_names=None, column_type_hints=None, number_of_partitions=None):
         """
@@ -676,13 +735,24 @@ class XFrameImpl(XObjectImpl, TracedObject):
             raise ValueError('Column names list must match number of columns: actual: {}, expected: {}'
                              .format(len(column_names), len(self.col_names)))
 
-        if isinstance(self._rdd, DataFrame):
-            return self._rdd
-
         def rename_columns(column_names):
             # rename columns to be acceptable to parquet
             return [re.sub(r'[\s,;{}()]', '_', column_name) for column_name in column_names]
 
+        sqlc = self.spark_sql_context()
+        if self._dataframe is not None:
+            # the schema is already known, and the rows are already in spark
+            res = self._dataframe
+            parquet_column_names = rename_columns(column_names)
+            if parquet_column_names != res.columns:
+                res = res.toDF(*parquet_column_names)
+            if number_of_partitions is not None:
+                res = res.repartition(number_of_partitions)
+            if table_name is not None:
+                sqlc.registerDataFrameAsTable(res, table_name)
+                XFrameImpl._set_table_owner(table_name, None)
+            return res
+
         def convert_column_type(column_type, column_name, element):
             if column_name in column_type_hints:
                 hint = column_type_hints[column_name]
@@ -705,10 +775,10 @@ class XFrameImpl(XObjectImpl, TracedObject):
         schema = StructType(fields)
 
         rdd = self._rdd if number_of_partitions is None else self._rdd.repartition(number_of_partitions)
-        sqlc = self.spark_sql_context()
         res = sqlc.createDataFrame(rdd.RDD(), schema)
         if table_name is not None:
             sqlc.registerDataFrameAsTable(res, table_name)
+            XFrameImpl._set_table_owner(table_name, None)
         return res
 
     # Table Information
@@ -765,6 +835,20 @@ class XFrameImpl(XObjectImpl, TracedObject):
         return {'table': self.lineage.table_lineage,
                 'column': self.lineage.column_lineage}
 
+    def describe(self, stats):
+        """
+        Compute summary statistics of every column in one pass.
+
+        Returns a dict of the statistics of each column, by column name.
+        """
+        self._entry(stats=stats)
+        stats = validate_stats(stats)
+        column_stats = aggregate_rows(self._rdd, self.column_types)      # action
+        if len(column_stats) > 0:
+            self._num_rows = column_stats[0].count
+        return {col_name: {stat: col_stats.get(stat) for stat in stats}
+                for col_name, col_stats in zip(self.col_names, column_stats)}
+
     # Get Data
     def head(self, n):
         """
@@ -875,7 +959,10 @@ class XFrameImpl(XObjectImpl, TracedObject):
             raise ValueError("Column name does not exist: '{}'.".format(column_name))
 
         col = self.col_names.index(column_name)
-        res = self._rdd.map(lambda row: row[col])
+        if self._blocks is not None:
+            res = self._blocks.flatMap(lambda block: block.column(col), preserves_structure=True)
+        else:
+            res = self._rdd.map(lambda row: row[col])
         col_type = self.column_types[col]
         lineage = self.lineage.to_array_lineage(column_name)
         return xframes.xarray_impl.XArrayImpl(res, col_type, lineage)
@@ -892,8 +979,13 @@ class XFrameImpl(XObjectImpl, TracedObject):
         cols = [self.col_names.index(key) for key in keylist]
         names = [self.col_names[col] for col in cols]
         types = [self.column_types[col] for col in cols]
-        res = self._rdd.map(lambda row: get_columns(row, cols))
         lineage = self.lineage.select_columns(names)
+        if self._dataframe is not None and dataframe_ops.names_supported(names):
+            return self._rv_dataframe(self._dataframe.select(*names), names, types, lineage)
+        if self._blocks is not None:
+            blocks = self._blocks.map(lambda block: block.select(cols))
+            return self._rv_blocks(blocks, names, types, lineage)
+        res = self._rdd.map(lambda row: get_columns(row, cols))
         return self._rv(res, names, types, lineage)
 
     def copy(self):
@@ -903,6 +995,10 @@ class XFrameImpl(XObjectImpl, TracedObject):
         The underlying RDD is immutale, so we just need to copy the metadata.
         """
         self._entry()
+        if self._dataframe is not None:
+            return self._rv_dataframe(self._dataframe)
+        if self._blocks is not None:
+            return self._rv_blocks(self._blocks)
         return self._rv(self._rdd)
 
     @classmethod
@@ -941,6 +1037,12 @@ class XFrameImpl(XObjectImpl, TracedObject):
         col_names.append(new_name)
         col_types = copy.copy(self.column_types)
         col_types.append(col.elem_type)
+        lineage = self.lineage.add_column(col, new_name)
+        if self._blocks is not None and self._blocks.get_structure_id() == col.rdd().get_structure_id():
+            # each partition of the column lines up with a block, so add it as a whole
+            columns = col.rdd().mapPartitions(values_to_columns(col.elem_type))
+            blocks = self._blocks.zip(columns).map(lambda pair: pair[0].add(pair[1]))
+            return self._rv_blocks(blocks, col_names, col_types, lineage)
         # zip the data into the rdd, then shift into the tuple
         if self._rdd is None:
             res = col.rdd().map(lambda x: (x,))
@@ -950,7 +1052,6 @@ class XFrameImpl(XObjectImpl, TracedObject):
             def move_inside(old_val, new_elem):
                 return tuple(old_val + (new_elem, ))
             res = res.map(lambda pair: move_inside(pair[0], pair[1]))
-        lineage = self.lineage.add_column(col, new_name)
         return self._rv(res, col_names, col_types, lineage)
 
     def add_column_in_place(self, col, name):
@@ -1086,13 +1187,17 @@ class XFrameImpl(XObjectImpl, TracedObject):
         col_types = copy.copy(self.column_types)
         col_names.pop(col)
         col_types.pop(col)
+        lineage = self.lineage.remove_column(name)
+        if self._blocks is not None:
+            keep = [i for i in range(len(self.col_names)) if i != col]
+            blocks = self._blocks.map(lambda block: block.select(keep))
+            return self._rv_blocks(blocks, col_names, col_types, lineage)
 
         def pop_col(row, col):
             lst = list(row)
             lst.pop(col)
             return tuple(lst)
         res = self._rdd.map(lambda row: pop_col(row, col))
-        lineage = self.lineage.remove_column(name)
         return self._rv(res, col_names, col_types, lineage)
 
     def remove_column_in_place(self, name):
@@ -1129,6 +1234,11 @@ class XFrameImpl(XObjectImpl, TracedObject):
         for col in cols:
             remaining_col_names.pop(col)
             remaining_col_types.pop(col)
+        lineage = self.lineage.remove_columns(col_names)
+        if self._blocks is not None:
+            keep = [i for i in range(len(self.col_names)) if i not in cols]
+            blocks = self._blocks.map(lambda block: block.select(keep))
+            return self._rv_blocks(blocks, remaining_col_names, remaining_col_types, lineage)
 
         def pop_cols(row, cols):
             lst = list(row)
@@ -1136,7 +1246,6 @@ class XFrameImpl(XObjectImpl, TracedObject):
                 lst.pop(col)
             return tuple(lst)
         res = self._rdd.map(lambda row: pop_cols(row, cols))
-        lineage = self.lineage.remove_columns(col_names)
         return self._rv(res, remaining_col_names, remaining_col_types, lineage)
 
     def swap_columns(self, column_1, column_2):
@@ -1166,6 +1275,10 @@ class XFrameImpl(XObjectImpl, TracedObject):
         col2 = self.col_names.index(column_2)
         names = swap_list(self.col_names, col1, col2)
         types = swap_list(self.column_types, col1, col2)
+        if self._blocks is not None:
+            column_indexes = swap_list(range(len(self.col_names)), col1, col2)
+            blocks = self._blocks.map(lambda block: block.select(column_indexes))
+            return self._rv_blocks(blocks, names, types)
         res = self._rdd.map(lambda row: swap_cols(row, col1, col2))
         return self._rv(res, names, types)
 
@@ -1185,6 +1298,9 @@ class XFrameImpl(XObjectImpl, TracedObject):
 
         names = reorder_list(self.col_names, column_indexes)
         types = reorder_list(self.column_types, column_indexes)
+        if self._blocks is not None:
+            blocks = self._blocks.map(lambda block: block.select(column_indexes))
+            return self._rv_blocks(blocks, names, types)
         res = self._rdd.map(lambda row: reorder_cols(row, column_indexes))
         return self._rv(res, names, types)
 
@@ -1195,33 +1311,29 @@ class XFrameImpl(XObjectImpl, TracedObject):
         self._entry(new_names=new_names)
         name_map = {k: v for k, v in zip(self.col_names, new_names)}
         lineage = self.lineage.replace_column_names(name_map)
+        if self._blocks is not None:
+            return self._rv_blocks(self._blocks, new_names, lineage=lineage)
         return self._rv(self._rdd, new_names, lineage=lineage)
 
-        # Iteration
+    # Iteration
 
     # Begin_iterator is called by a generator function, local to __iter__.
-        # It calls iterator_get_next to fetch a group of items, then returns them one by one
-        # using yield.  It keeps calling iterator_get_next as long as there are elements 
-        # remaining.  It seems like only one iterator at a time can be operating because
-        # the position is stored here.  Would it be better to let the caller handle the iter_pos?
-        #
-        # This uses zipWithIndex, which needs to process the whole data set.  
-        # Is it better to use take or collect ?  OR are they effectively the same since zipWithIndex 
-        # has just run?
+    # It calls iterator_get_next to fetch a group of items, then returns them one by one
+    # using yield.  It keeps calling iterator_get_next as long as there are elements
+    # remaining.  Only one iterator at a time can be operating, because the iteration
+    # state is stored here.
+    #
+    # The rows are fetched one partition at a time, so iterating over the whole
+    # XFrame takes a single pass over the data.
     def begin_iterator(self):
         self._entry()
-        self.iter_pos = 0
+        self.iter_rows = iterate_partitions(self._rdd)
 
     def iterator_get_next(self, elems_at_a_time):
         self._entry(elems_at_a_time=elems_at_a_time)
-        low = self.iter_pos
-        high = self.iter_pos + elems_at_a_time
-        buf_rdd = self._rdd.zipWithIndex()
-        filtered_rdd = buf_rdd.filter(lambda row: low <= row[1] < high)
-        trimmed_rdd = filtered_rdd.keys()
-        iter_buf = trimmed_rdd.collect()
-        self.iter_pos += elems_at_a_time
-        return iter_buf
+        if self.iter_rows is None:
+            self.begin_iterator()
+        return list(itertools.islice(self.iter_rows, elems_at_a_time))
 
     def add_column_const_in_place(self, name, value):
         """
@@ -1271,7 +1383,7 @@ class XFrameImpl(XObjectImpl, TracedObject):
         """
         self._entry()
         res = col.rdd().map(lambda item: (item, ))
-        col_type = infer_type_of_rdd(col.rdd())
+        col_type = col.elem_type
         self.column_types[0] = col_type
         lineage = col.lineage
         return self._replace(res, lineage=lineage)
@@ -1294,7 +1406,7 @@ class XFrameImpl(XObjectImpl, TracedObject):
         res = rdd.map(lambda row_col: replace_col(row_col, col_num))
         col_names = copy.copy(self.column_names())
         col_names[col_num] = column_name
-        col_type = infer_type_of_rdd(col.rdd())
+        col_type = col.elem_type
         col_types = copy.copy(self.column_types)
         col_types[col_num] = col_type
         lineage = self.lineage.replace_column(col, column_name)
@@ -1316,7 +1428,7 @@ class XFrameImpl(XObjectImpl, TracedObject):
             row[col_num] = col
             return tuple(row)
         res = rdd.map(lambda row_col: replace_col(row_col, col_num))
-        col_type = infer_type_of_rdd(col.rdd())
+        col_type = col.elem_type
         self.column_types[col_num] = col_type
         lineage = self.lineage.replace_column(col, column_name)
         return self._replace(res, lineage=lineage)
@@ -1714,6 +1826,11 @@ class XFrameImpl(XObjectImpl, TracedObject):
         For now, values is always a set.
         """
         col_index = self.col_names.index(column_name)
+        if self._dataframe is not None:
+            res = dataframe_ops.filter_values(self._dataframe, column_name, self.column_types[col_index],
+                                              values, exclude)
+            if res is not None:
+                return self._rv_dataframe(res)
 
         def filter_fun(row):
             val = row[col_index]
@@ -1792,42 +1909,134 @@ class XFrameImpl(XObjectImpl, TracedObject):
                      for op, group_type in zip(group_ops, group_types)]
 
         new_col_types.extend(agg_types)
+        lineage = self.lineage.groupby(key_columns_array, group_output_columns, group_columns)
+
+        if self._dataframe is not None:
+            group_names = [[self.col_names[col] if col is not None else None for col in cols]
+                           for cols in group_cols]
+            res = dataframe_ops.aggregate(self._dataframe, key_columns_array,
+                                          [self.column_types[col] for col in key_cols],
+                                          group_names, group_types, group_ops, new_col_names)
+            if res is not None:
+                return self._rv_dataframe(res, new_col_names, new_col_types, lineage)
 
         # make RDD into K,V pairs where key incorporates the key column values
-        def make_key(row, key_cols):
-            key = [row[col] for col in key_cols]
-            return json.dumps(key)
+        key_types = [self.column_types[col] for col in key_cols]
+        make_key = key_encoder(key_types)
+        decode_key = key_decoder(key_types)
         keyed_rdd = self._rdd.map(lambda row: (make_key(row, key_cols), row))
 
-        grouped = keyed_rdd.groupByKey()
-        grouped = grouped.map(lambda pair: (json.loads(pair[0]), pair[1]))
-        # (key, [row ...]) ...
-        # run the aggregator on y: count --> len(y); sum --> sum(y), etc
-
-        def build_aggregates(rows, aggregators, group_cols):
-            # apply each of the aggregator functions and collect their results into a list
-            return [aggregator(rows, cols)
-                    for aggregator, cols in zip(aggregators, group_cols)]
-        aggregators = [aggregator_properties[op].agg_function for op in group_ops]
-        aggregates = grouped.map(lambda (x, y): (x, build_aggregates(y, aggregators, group_cols)))
+        properties = [aggregator_properties[op] for op in group_ops]
+        if all([prop.is_decomposable() for prop in properties]):
+            # Every aggregator can be expressed as a combiner, so combine within each
+            #  partition and shuffle only the partial aggregates.
+            zero_fns = [prop.zero_function for prop in properties]
+            seq_fns = [prop.seq_function for prop in properties]
+            comb_fns = [prop.comb_function for prop in properties]
+            final_fns = [prop.final_function for prop in properties]
+            zero_value = tuple([zero_fn(cols) for zero_fn, cols in zip(zero_fns, group_cols)])
+
+            def seq_op(accs, row):
+                return tuple([seq_fn(acc, row, cols)
+                              for seq_fn, acc, cols in zip(seq_fns, accs, group_cols)])
+
+            def comb_op(accs1, accs2):
+                return tuple([comb_fn(acc1, acc2)
+                              for comb_fn, acc1, acc2 in zip(comb_fns, accs1, accs2)])
+
+            def finalize(accs):
+                return [final_fn(acc) for final_fn, acc in zip(final_fns, accs)]
+            combined = keyed_rdd.aggregateByKey(zero_value, seq_op, comb_op)
+            aggregates = combined.map(lambda pair: (decode_key(pair[0]), finalize(pair[1])))
+        else:
+            grouped = keyed_rdd.groupByKey()
+            grouped = grouped.map(lambda pair: (decode_key(pair[0]), pair[1]))
+            # (key, [row ...]) ...
+            # run the aggregator on y: count --> len(y); sum --> sum(y), etc
+
+            def build_aggregates(rows, aggregators, group_cols):
+                # apply each of the aggregator functions and collect their results into a list
+                return [aggregator(rows, cols)
+                        for aggregator, cols in zip(aggregators, group_cols)]
+            aggregators = [prop.agg_function for prop in properties]
+            aggregates = grouped.map(lambda (x, y): (x, build_aggregates(y, aggregators, group_cols)))
 
         def concatenate(old_vals, new_vals):
             return old_vals + new_vals
         res = aggregates.map(lambda pair: concatenate(pair[0], pair[1]))
         res = res.map(tuple)
         persist(res)
-        lineage = self.lineage.groupby(key_columns_array, group_output_columns, group_columns)
         return self._rv(res, new_col_names, new_col_types, lineage)
 
-    def join(self, right, how, join_keys):
+    def _broadcast_join(self, probe_rdd, build_probe_key, probe_key_indexes,
+                        build_rows, build_build_key, build_key_indexes,
+                        keep_probe, build_is_left):
+        """
+        Join by putting the collected rows of the build side into a hash table,
+        broadcasting it, and probing it with each partition of the probe side.
+
+        Returns an RDD of (left_row, right_row) pairs, with None for a missing row.
+        keep_probe keeps unmatched probe rows.  Unmatched build rows are never kept:
+        finding them would take a second pass over the probe side.
+        """
+        self._entry(keep_probe=keep_probe, build_is_left=build_is_left)
+        sc = self.spark_context()
+        table = {}
+        for row in build_rows:
+            table.setdefault(build_build_key(row, build_key_indexes), []).append(row)
+        broadcast_table = sc.broadcast(table)
+        plan.record('broadcast', '{} rows'.format(sum([len(rows) for rows in table.itervalues()])))
+
+        def make_pair(probe_row, build_row):
+            return (build_row, probe_row) if build_is_left else (probe_row, build_row)
+
+        def probe(rows):
+            tab = broadcast_table.value
+            for row in rows:
+                matches = tab.get(build_probe_key(row, probe_key_indexes))
+                if matches is not None:
+                    for match in matches:
+                        yield make_pair(row, match)
+                elif keep_probe:
+                    yield make_pair(row, None)
+        return probe_rdd.mapPartitions(probe, preserves_structure=False)
+
+    def _broadcast_join_side(self, right, how):
+        """
+        Choose which side of a join to broadcast, and return it with its rows,
+        or (None, None) if both are too big.
+
+        A side is broadcast only if its row count is no more than the
+        broadcast-join-threshold from the [xframes] config section.  Sides are not
+        counted in full: a side whose count is not known is checked by taking at
+        most threshold + 1 rows, which become the broadcast table if they fit.
+        """
+        env = CommonSparkContext().env()
+        threshold = int(env.get_config('xframes', 'broadcast-join-threshold', '0'))
+        if threshold <= 0:
+            return None, None
+        # left joins must keep every left row, so only the right can be broadcast,
+        #  and the reverse for right joins
+        if how in ['inner', 'left']:
+            rows = right._rows_if_fits(threshold)
+            if rows is not None:
+                return 'right', rows
+        if how in ['inner', 'right']:
+            rows = self._rows_if_fits(threshold)
+            if rows is not None:
+                return 'left', rows
+        return None, None
+
+    def join(self, right, how, join_keys, strategy='auto'):
         """
         Merge two XFrames. Merges the current (left) XFrame with the given
         (right) XFrame using a SQL-style equi-join operation by columns.
 
         join_keys is a dict of left-right column names
         how = [left, right, outer, inner]
+        strategy = [auto, broadcast, shuffle]
         """
-        self._entry(how=how, join_keys=join_keys)
+        self._entry(how=how, join_keys=join_keys, strategy=strategy)
         # new columns are made up of:
         # 1) left columns
         # 2) right columns exculding join_keys.values()
@@ -1879,12 +2088,15 @@ class XFrameImpl(XObjectImpl, TracedObject):
                 left_key_indexes.append(left_index)
                 right_index = right.col_names.index(right_key)
                 right_key_indexes.append(right_index)
-                right_key_indexes.sort(reverse=True)
+            # the right key columns are removed highest index first, so that
+            #  removing one does not shift the others
+            # the keys themselves must stay in the same order as the left keys
+            right_remove_indexes = sorted(right_key_indexes, reverse=True)
 
             # make a list of the right column names and types
             right_col_names = list(right.col_names)
             right_col_types = list(right.column_types)
-            for i in right_key_indexes:
+            for i in right_remove_indexes:
                 right_col_names.pop(i)
                 right_col_types.pop(i)
 
@@ -1894,32 +2106,69 @@ class XFrameImpl(XObjectImpl, TracedObject):
                 process_column_names(right_col_names, right_col_types)
 
             # build a key from the column values
-            # spark cannot handle tuples as keys, so make it a string using json
-            def build_key(row, indexes):
-                key = [row[i] for i in indexes]
-                return json.dumps(key)
+            # values that are not hashable are encoded, so the key can be used by spark
+            build_left_key = key_encoder([self.column_types[i] for i in left_key_indexes])
+            build_right_key = key_encoder([right.column_types[i] for i in right_key_indexes])
 
             if len(left_key_indexes) == 0 or len(right_key_indexes) == 0:
                 raise ValueError("Empty join columns -- left: '{}' right: '{}'."
                                  .format(left_key_indexes, right_key_indexes))
 
-            # add keys to left and right
-            keyed_left = self._rdd.map(lambda row: (build_key(row, left_key_indexes), row))
-            keyed_right = right.rdd().map(lambda row: (build_key(row, right_key_indexes), row))
-
-            if how == 'inner':
-                joined = keyed_left.join(keyed_right)
-            elif how == 'left':
-                joined = keyed_left.leftOuterJoin(keyed_right)
-            elif how == 'right':
-                joined = keyed_left.rightOuterJoin(keyed_right)
-            elif how == 'full':
-                joined = keyed_left.fullOuterJoin(keyed_right)
-            else:
+            if how not in ['inner', 'left', 'right', 'full']:
                 raise ValueError("'How' argument is not 'inner', 'left', 'right', 'full' or 'cartesian'.")
 
-            # throw away key in the joined table
-            pairs = joined.values()
+            if self._dataframe is not None and right.is_dataframe_backed() and strategy == 'auto' and \
+                    new_col_names == self.col_names + right_col_names:
+                # spark chooses its own join strategy
+                res = dataframe_ops.join(self._dataframe, right._dataframe, how,
+                                         [(self.col_names[left_key_index], right.col_names[right_key_index])
+                                          for left_key_index, right_key_index in zip(left_key_indexes,
+                                                                                     right_key_indexes)],
+                                         self.col_names,
+                                         [self.column_types[i] for i in left_key_indexes],
+                                         right_col_names)
+                if res is not None:
+                    lineage = self.lineage.merge(right_lineage)
+                    return self._rv_dataframe(res, new_col_names, new_col_types, lineage)
+
+            if strategy not in ['auto', 'broadcast', 'shuffle']:
+                raise ValueError("'Strategy' argument is not 'auto', 'broadcast', or 'shuffle'.")
+            # full joins are always shuffled: a broadcast full join needs a second pass over
+            #  the probe side to find the build rows that were not matched
+            if strategy == 'auto' and how != 'full':
+                broadcast_side, build_rows = self._broadcast_join_side(right, how)
+            elif strategy == 'broadcast' and how != 'full':
+                broadcast_side = 'left' if how == 'right' else 'right'
+                build_rows = (self._rdd if broadcast_side == 'left' else right.rdd()).collect()
+            else:
+                broadcast_side, build_rows = None, None
+
+            if broadcast_side == 'right':
+                pairs = self._broadcast_join(self._rdd, build_left_key, left_key_indexes,
+                                             build_rows, build_right_key, right_key_indexes,
+                                             keep_probe=how == 'left',
+                                             build_is_left=False)
+            elif broadcast_side == 'left':
+                pairs = self._broadcast_join(right.rdd(), build_right_key, right_key_indexes,
+                                             build_rows, build_left_key, left_key_indexes,
+                                             keep_probe=how == 'right',
+                                             build_is_left=True)
+            else:
+                # add keys to left and right
+                keyed_left = self._rdd.map(lambda row: (build_left_key(row, left_key_indexes), row))
+                keyed_right = right.rdd().map(lambda row: (build_right_key(row, right_key_indexes), row))
+
+                if how == 'inner':
+                    joined = keyed_left.join(keyed_right)
+                elif how == 'left':
+                    joined = keyed_left.leftOuterJoin(keyed_right)
+                elif how == 'right':
+                    joined = keyed_left.rightOuterJoin(keyed_right)
+                else:
+                    joined = keyed_left.fullOuterJoin(keyed_right)
+
+                # throw away key in the joined table
+                pairs = joined.values()
 
             def combine_results(left_row, right_row, left_count, right_count):
                 if left_row is None:
@@ -1930,19 +2179,20 @@ class XFrameImpl(XObjectImpl, TracedObject):
 
             # remove redundant key fields from the right
             # take into account any missing any missing rows
-            def fixup(left_row, right_row, left_count, right_count, left_key_indexes, right_key_indexes):
+            def fixup(left_row, right_row, left_count, right_count,
+                      left_key_indexes, right_key_indexes, right_remove_indexes):
                 left_list = list([None] * left_count) if left_row is None else list(left_row)
                 right_list = list([None] * right_count) if right_row is None else list(right_row)
                 for left_index, right_index in zip(left_key_indexes, right_key_indexes):
                     if left_list[left_index] is None:
                         left_list[left_index] = right_list[right_index]
-                for i in right_key_indexes:
+                for i in right_remove_indexes:
                     right_list.pop(i)
                 return tuple(tuple(left_list) + tuple(right_list))
 
             res = pairs.map(lambda row: fixup(row[0], row[1],
                                               left_count, right_count,
-                                              left_key_indexes, right_key_indexes))
+                                              left_key_indexes, right_key_indexes, right_remove_indexes))
 
         persist(res)
 
@@ -1956,9 +2206,38 @@ class XFrameImpl(XObjectImpl, TracedObject):
         """
 
         self._entry()
-        as_json = self._rdd.map(lambda row: json.dumps(row))
-        unique_rows = as_json.distinct()
-        res = unique_rows.map(lambda s: json.loads(s))
+        col_indexes = range(len(self.col_names))
+        make_key = key_encoder(self.column_types)
+        decode_key = key_decoder(self.column_types)
+        keys = self._rdd.map(lambda row: make_key(row, col_indexes))
+        unique_rows = keys.distinct()
+        res = unique_rows.map(lambda key: tuple(decode_key(key)))
+        return self._rv(res)
+
+    def topk(self, column_name, k, reverse):
+        """
+        Get the k rows with the largest values in the given column (smallest, if reverse),
+        sorted by that column.
+
+        Each partition keeps its own top k rows in a bounded heap, and the heaps are
+        merged on the driver, so the rows are found in a single pass.
+        """
+        self._entry(column_name=column_name, k=k, reverse=reverse)
+        col = self.col_names.index(column_name)
+        make_key = sort_key_encoder([self.column_types[col]], [not reverse])
+
+        def partition_top(split, rows):
+            heap = BoundedHeap(k)
+            for i, row in enumerate(rows):
+                # the split and position break ties, so rows are never compared
+                heap.push((make_key(row, [col]), split, i, row))
+            yield heap
+
+        heap = BoundedHeap(k)
+        for partition_heap in self._rdd.mapPartitionsWithIndex(partition_top).collect():
+            heap.merge(partition_heap)
+        top_rows = [item[3] for item in heap.items()]
+        res = self.spark_context().parallelize(top_rows)
         return self._rv(res)
 
     def sort(self, sort_column_names, sort_column_orders):
@@ -1971,19 +2250,133 @@ class XFrameImpl(XObjectImpl, TracedObject):
         self._entry(sort_column_names=sort_column_names, sort_column_orders=sort_column_orders)
 
         sort_column_indexes = [self.col_names.index(name) for name in sort_column_names]
+        sort_column_types = [self.column_types[i] for i in sort_column_indexes]
+        if self._dataframe is not None:
+            res = dataframe_ops.sort(self._dataframe, sort_column_names, sort_column_types, sort_column_orders)
+            if res is not None:
+                return self._rv_dataframe(res)
+        make_key = sort_key_encoder(sort_column_types, sort_column_orders)
+
+        # key each row, partition the keys into ranges, then sort each range
+        # the keyed rows are not persisted: finding the ranges reads them in a single pass,
+        #  and a cached copy would outlive the sort
+        keyed = self._rdd.map(lambda row: (make_key(row, sort_column_indexes), row))
+        num_partitions = self._rdd.getNumPartitions()
+        bounds = range_bounds(keyed.keys(), num_partitions)
+        partitioned = keyed.partitionBy(len(bounds) + 1, range_partitioner(bounds))
+        res = partitioned.mapPartitions(lambda rows: [row for _, row in sorted(rows, key=itemgetter(0))],
+                                        preserves_partitioning=True)
+        return self._rv(res)
 
-        def key_fn(row):
-            return CmpRows(row, sort_column_indexes, sort_column_orders)
+    def _sql_num_partitions(self):
+        """
+        The number of partitions for a DataFrame queried by sql.
 
-        res = self._rdd.sortBy(keyfunc=key_fn)
-        return self._rv(res)
+        Each partition gets about sql-rows-per-partition rows, from the [xframes] config section.
+        The rows are not counted just for this: unless the count is already known,
+        the partitions of the rdd are kept.
+        """
+        num_rows = self._known_count()
+        if num_rows is None:
+            return self._rdd.getNumPartitions()
+        env = CommonSparkContext().env()
+        rows_per_partition = int(env.get_config('xframes', 'sql-rows-per-partition', '100000'))
+        return max(1, (num_rows + rows_per_partition - 1) // max(1, rows_per_partition))
+
+    @staticmethod
+    def _release_when_freed(impl, dataframe):
+        """
+        Unpersist the DataFrame cached for impl if impl is freed without releasing it.
+
+        The callback holds the DataFrame, not the impl, so it does not keep the impl alive.
+        """
+        def release(ref):
+            XFrameImpl._sql_cache_refs.discard(ref)
+            dataframe.unpersist()
+        ref = weakref.ref(impl, release)
+        XFrameImpl._sql_cache_refs.add(ref)
+        return ref
+
+    def _clear_sql_cache(self):
+        if self._sql_cache is not None:
+            _, dataframe, ref = self._sql_cache
+            XFrameImpl._sql_cache_refs.discard(ref)
+            dataframe.unpersist()
+        self._sql_cache = None
+
+    def _sql_dataframe(self):
+        """
+        The DataFrame that sql queries run against.
+
+        It is built once, and reused until the XFrameImpl is modified.
+        """
+        if self._dataframe is not None:
+            # already in spark, and partitioned by its source
+            return self._dataframe
+        key = (self._rdd.get_id(), self._rdd.get_structure_id(),
+               tuple(self.col_names), tuple(self.column_types))
+        if self._sql_cache is not None and self._sql_cache[0] == key:
+            return self._sql_cache[1]
+
+        num_partitions = self._sql_num_partitions()
+        if num_partitions < self._rdd.getNumPartitions():
+            rdd = self._rdd.coalesce(num_partitions)
+        elif num_partitions > self._rdd.getNumPartitions():
+            rdd = self._rdd.repartition(num_partitions)
+        else:
+            rdd = self._rdd
+        dataframe = self._rv(rdd).to_spark_dataframe(None)
+        dataframe.cache()
+        self._clear_sql_cache()
+        self._sql_cache = (key, dataframe, XFrameImpl._release_when_freed(self, dataframe))
+        return dataframe
+
+    def _owns_table(self):
+        return any([ref() is self for ref in XFrameImpl._table_owners.itervalues()])
+
+    @staticmethod
+    def _set_table_owner(table_name, owner):
+        """
+        Record the impl whose sql DataFrame is registered under a table name, or None.
+
+        The cached DataFrame of the previous owner is released, once it is no longer
+        registered under any name.
+        """
+        ref = XFrameImpl._table_owners.pop(table_name, None)
+        previous = ref() if ref is not None else None
+        if owner is not None:
+            XFrameImpl._table_owners[table_name] = weakref.ref(owner)
+        if previous is not None and previous is not owner and not previous._owns_table():
+            previous._clear_sql_cache()
+
+    def register_table(self, table_name):
+        """
+        Register the XFrame as a temporary sql table.
+
+        The table is registered every time, since the name may have been registered or
+        dropped in other ways.  Registering is only a metadata operation.
+        """
+        self._entry(table_name=table_name)
+        dataframe = self._sql_dataframe()
+        self.spark_sql_context().registerDataFrameAsTable(dataframe, table_name)
+        XFrameImpl._set_table_owner(table_name, self)
+
+    @classmethod
+    def unregister_table(cls, table_name):
+        """
+        Remove a temporary sql table, and release its cached DataFrame.
+        """
+        cls._entry(table_name=table_name)
+        cls.spark_sql_context().dropTempTable(table_name)
+        XFrameImpl._set_table_owner(table_name, None)
 
     def sql(self, sql_statement, table_name):
         """
         Execute a spark-sql command against a XFrame
         """
         self._entry(sql_statement=sql_statement, table_name=table_name)
-        self.to_spark_dataframe(table_name, number_of_partitions=8)  # registers table for use in query
+        # registers table for use in query
+        self.register_table(table_name)
         sqlc = self.spark_sql_context()
         s_res = sqlc.sql(sql_statement)
         res = XFrameImpl.load_from_spark_dataframe(s_res)
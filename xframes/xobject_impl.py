@@ -2,12 +2,21 @@
 This object implements the base of the xframes inheritance hierarchy.
 """
 import os
+import shutil
 
 from pyspark import RDD
+from py4j.protocol import Py4JError
 
 from xframes.spark_context import CommonSparkContext
 from xframes.xrdd import XRdd
 import xframes.fileio as fileio
+from xframes.plan import PlanNode
+
+# Hadoop codecs for the compression options of csv saves.
+_COMPRESSION_CODECS = {
+    'gzip': 'org.apache.hadoop.io.compress.GzipCodec',
+    'bz2': 'org.apache.hadoop.io.compress.BZip2Codec',
+}
 
 
 class XObjectImpl(object):
@@ -15,6 +24,8 @@ class XObjectImpl(object):
 
     def __init__(self, rdd):
         self._rdd = self._wrap_rdd(rdd)
+        # the operation that made this, and its inputs
+        self._plan = PlanNode.capture(XObjectImpl)
 
     @staticmethod
     def _wrap_rdd(rdd):
@@ -56,8 +67,116 @@ class XObjectImpl(object):
             if not fileio.exists(dirname):
                 raise ValueError('Output directory does not exist: {}'.format(dirname))
 
+    @staticmethod
+    def compression_from_path(path):
+        """
+        The compression implied by a file name: 'gzip', 'bz2', or None.
+        """
+        if path.endswith('.gz'):
+            return 'gzip'
+        if path.endswith('.bz2'):
+            return 'bz2'
+        return None
+
+    def _save_lines(self, path, lines, heading=None, header='once', single_file=True, compression=None):
+        """
+        Save an RDD of text lines, writing every partition in parallel.
+
+        Parameters
+        ----------
+        path : str
+            The output file, or the output directory if single_file is False.
+
+        lines : XRdd
+            The lines, without line terminators.
+
+        heading : str, optional
+            A header line, without a line terminator.
+
+        header : {'once', 'shard'}, optional
+            Write the heading once, at the start of the output, or at the start of every shard.
+
+        single_file : bool, optional
+            If True, the shards are merged into a single file.  Otherwise path is a directory
+            containing one file per partition.
+
+        compression : {None, 'gzip', 'bz2'}, optional
+            Compress each shard.  Compressed shards are merged by concatenating them, which
+            gives a multi-stream file.
+        """
+        if header not in ('once', 'shard'):
+            raise ValueError("Header must be 'once' or 'shard'.")
+        if compression is not None and compression not in _COMPRESSION_CODECS:
+            raise ValueError('Compression must be None, {}.'.format(', '.join(sorted(_COMPRESSION_CODECS))))
+        codec = _COMPRESSION_CODECS.get(compression)
+
+        if heading is not None:
+            per_shard = header == 'shard'
+
+            def add_heading(split, it):
+                first = next(it, None)
+                if split == 0 or (per_shard and first is not None):
+                    yield heading
+                if first is not None:
+                    yield first
+                    for line in it:
+                        yield line
+            lines = lines.mapPartitionsWithIndex(add_heading, preserves_structure=False)
+
+        fileio.delete(path)
+        if not single_file:
+            lines.saveAsTextFile(path, codec)
+            return
+
+        shard_dir = fileio.temp_file_name(path)
+        lines.saveAsTextFile(shard_dir, codec)
+        self._merge_shards(shard_dir, path)
+        fileio.delete(shard_dir)
+
+    def _merge_shards(self, shard_dir, path):
+        """
+        Concatenate the shards in a directory into one file, in partition order.
+
+        The files are merged by the file system, so the data does not pass through python.
+        If the hadoop version cannot do that, they are copied through the driver.
+        """
+        sc = self.spark_context()
+        # noinspection PyProtectedMember
+        jvm = sc._jvm
+        # noinspection PyProtectedMember
+        conf = sc._jsc.hadoopConfiguration()
+        src = jvm.org.apache.hadoop.fs.Path(shard_dir)
+        dst = jvm.org.apache.hadoop.fs.Path(path)
+        try:
+            jvm.org.apache.hadoop.fs.FileUtil.copyMerge(src.getFileSystem(conf), src,
+                                                        dst.getFileSystem(conf), dst,
+                                                        False, conf, None)
+            return
+        except Py4JError:
+            # copyMerge was removed in hadoop 3
+            pass
+        parts = sorted(name for name in fileio.list_dir(shard_dir) if name.startswith('part-'))
+        with fileio.open_file(path, 'wb') as f:
+            for part in parts:
+                with fileio.open_file(os.path.join(shard_dir, part), 'rb') as rd:
+                    shutil.copyfileobj(rd, f)
+
     def _replace_rdd(self, rdd):
         self._rdd = self._wrap_rdd(rdd)
+        self._plan = PlanNode.capture(XObjectImpl)
+
+    def explain(self, format='text'):
+        """
+        The logical plan of the operations that made this, as text or a dict.
+        """
+        if format == 'text':
+            return self._plan.as_text()
+        if format == 'dict':
+            res = self._plan.as_dict()
+            res['totals'] = self._plan.totals()
+            res['lineage'] = self.lineage.as_dict()
+            return res
+        raise ValueError("Format must be 'text' or 'dict'.")
 
     def dump_debug_info(self):
         return self._rdd.toDebugString()
@@ -9,10 +9,14 @@ Wrapped functions allow entry and exit tracing and keeps perf counts.
 # If new RDD functions are called, they must be added here.
 
 
+import bisect
+from operator import itemgetter
+
 import pyspark
 from pyspark import RDD
 
 from xframes.traced_object import TracedObject
+import xframes.plan as plan
 
 
 # noinspection PyPep8Naming,PyProtectedMember
@@ -132,6 +136,11 @@ class XRdd(TracedObject):
         res = self._rdd.aggregate(zeroValue, seqOp, combOp)
         return res
 
+    def treeAggregate(self, zeroValue, seqOp, combOp, depth=2):
+        self._entry(depth=depth)
+        res = self._rdd.treeAggregate(zeroValue, seqOp, combOp, depth)
+        return res
+
     def reduce(self, fn):
         self._entry()
         res = self._rdd.reduce(fn)
@@ -144,6 +153,8 @@ class XRdd(TracedObject):
         
     def persist(self, storage_level):
         self._entry(storage_level=storage_level)
+        if not self._rdd.is_cached:
+            plan.record('persist', str(storage_level))
         self._rdd.persist(storage_level)
 
     def unpersist(self):
@@ -154,18 +165,24 @@ class XRdd(TracedObject):
         self._entry(path=path)
         self._rdd.saveAsPickleFile(path)
 
-    def saveAsTextFile(self, path):
-        self._entry(path=path)
-        self._rdd.saveAsTextFile(path)
+    def saveAsTextFile(self, path, compression_codec=None):
+        self._entry(path=path, compression_codec=compression_codec)
+        self._rdd.saveAsTextFile(path, compression_codec)
 
     def stats(self):
         self._entry()
         res = self._rdd.stats()
         return res
 
+    def runJob(self, partition_func, partitions=None):
+        self._entry(partitions=partitions)
+        res = self._rdd.context.runJob(self._rdd, partition_func, partitions)
+        return res
+
     # transformations
     def repartition(self, number_of_partitions):
         self._entry()
+        plan.record('shuffle', 'repartition')
         res = self._rdd.repartition(number_of_partitions)
         return XRdd(res)
 
@@ -174,48 +191,114 @@ class XRdd(TracedObject):
         res = self._rdd.map(fn, preserves_partitioning)
         return XRdd(res, structure_id=self.structure_id)
 
-    def mapPartitions(self, fn, preserves_partitioning=False):
-        self._entry(preserves_partitioning=preserves_partitioning)
+    def mapPartitions(self, fn, preserves_partitioning=False, preserves_structure=True):
+        # Set preserves_structure to False if fn does not return exactly one element for each input.
+        self._entry(preserves_partitioning=preserves_partitioning, preserves_structure=preserves_structure)
         res = self._rdd.mapPartitions(fn, preserves_partitioning)
-        return XRdd(res, structure_id=self.structure_id)
+        return XRdd(res, structure_id=self.structure_id if preserves_structure else None)
 
-    def mapPartitionsWithIndex(self, fn, preserves_partitioning=False):
-        self._entry(preserves_partitioning=preserves_partitioning)
+    def mapPartitionsWithIndex(self, fn, preserves_partitioning=False, preserves_structure=True):
+        self._entry(preserves_partitioning=preserves_partitioning, preserves_structure=preserves_structure)
         res = self._rdd.mapPartitionsWithIndex(fn, preserves_partitioning)
-        return XRdd(res, structure_id=self.structure_id)
+        return XRdd(res, structure_id=self.structure_id if preserves_structure else None)
 
     def mapValues(self, fn):
         self._entry()
         res = self._rdd.mapValues(fn)
         return XRdd(res, structure_id=self.structure_id)
 
-    def flatMap(self, fn, preserves_partitioning=False):
-        self._entry(preserves_partitioning=preserves_partitioning)
+    def flatMap(self, fn, preserves_partitioning=False, preserves_structure=False):
+        # Set preserves_structure to True only if the flattened rows correspond one to one
+        #  with the rows of the RDD this was derived from.
+        self._entry(preserves_partitioning=preserves_partitioning, preserves_structure=preserves_structure)
         res = self._rdd.flatMap(fn, preserves_partitioning)
-        return XRdd(res, structure_id=self.structure_id)
+        return XRdd(res, structure_id=self.structure_id if preserves_structure else None)
 
     def basic_zip(self, other):
         # these are separate so they can have their own tracing
         self._entry()
+        plan.record('zip', 'basic')
         return self._rdd.zip(other._rdd)
 
+    def partition_counts(self):
+        """
+        Returns the number of elements in each partition.
+        """
+        self._entry()
+        return self._rdd.mapPartitions(lambda it: [sum(1 for _ in it)]).collect()
+
+    def aligned_zip(self, other, self_counts, other_counts):
+        """
+        Zip with an RDD having the same total number of elements, but laid out differently.
+
+        The other RDD is moved into the partition layout of this one:
+        each element is keyed by its position, computed from the partition counts,
+        and sent to the partition of this RDD that holds the same position.
+        The result has the same structure as this RDD.
+        """
+        self._entry()
+        plan.record('zip', 'aligned')
+        plan.record('shuffle', 'aligned_zip')
+        other_offsets = [0]
+        for count in other_counts[:-1]:
+            other_offsets.append(other_offsets[-1] + count)
+        self_offsets = [0]
+        for count in self_counts[:-1]:
+            self_offsets.append(self_offsets[-1] + count)
+
+        def index_partition(split, it):
+            for i, val in enumerate(it, other_offsets[split]):
+                yield i, val
+
+        def target_partition(index):
+            return bisect.bisect_right(self_offsets, index) - 1
+
+        def order_partition(it):
+            return [val for _, val in sorted(it, key=itemgetter(0))]
+        aligned = other._rdd.mapPartitionsWithIndex(index_partition) \
+            .partitionBy(len(self_counts), target_partition) \
+            .mapPartitions(order_partition)
+        return self._rdd.zip(aligned)
+
     def safe_zip(self, other):
         # do the zip operation safely
         self._entry()
+        plan.record('zip', 'safe')
+        plan.record('shuffle', 'safe_zip join')
+        plan.record('shuffle', 'safe_zip sortByKey')
         ix_left = self._rdd.zipWithIndex().map(lambda row: (row[1], row[0]))
         ix_right = other._rdd.zipWithIndex().map(lambda row: (row[1], row[0]))
         return ix_left.join(ix_right).sortByKey().values()
 
     def zip(self, other):
+        """
+        Zip two RDDs.
+
+        If both have the same structure, the RDDs are zipped directly.  Otherwise the
+        partition counts are compared: if they match, the RDDs are still zipped directly,
+        and if only the totals match, the other RDD is realigned to the partitions of this one.
+        In both cases the result keeps the structure of this RDD.
+        If the totals differ, the elements are matched by index, and unmatched elements are dropped.
+        """
         self._entry()
         if self.structure_id == other.structure_id:
             res = self.basic_zip(other)
             structure_id = self.structure_id
         else:
-            res = self.safe_zip(other)
-            structure_id = None
+            self_counts = self.partition_counts()
+            other_counts = other.partition_counts()
+            if self_counts == other_counts:
+                res = self.basic_zip(other)
+                structure_id = self.structure_id
+            elif sum(self_counts) == sum(other_counts):
+                res = self.aligned_zip(other, self_counts, other_counts)
+                structure_id = self.structure_id
+            else:
+                res = self.safe_zip(other)
+                structure_id = None
         # noinspection PyUnresolvedReferences
         res.persist(pyspark.StorageLevel.MEMORY_AND_DISK)
+        plan.record('persist', 'zip')
         return XRdd(res, structure_id=structure_id)
 
     def zipWithIndex(self):
@@ -235,6 +318,7 @@ class XRdd(TracedObject):
 
     def distinct(self):
         self._entry()
+        plan.record('shuffle', 'distinct')
         res = self._rdd.distinct()
         return XRdd(res)
 
@@ -255,6 +339,8 @@ class XRdd(TracedObject):
 
     def coalesce(self, num_partitions, shuffle=False):
         self._entry(num_partitions=num_partitions, shuffle=shuffle)
+        if shuffle:
+            plan.record('shuffle', 'coalesce')
         res = self._rdd.coalesce(num_partitions, shuffle)
         return XRdd(res)
 
@@ -269,40 +355,60 @@ class XRdd(TracedObject):
 
     def groupByKey(self):
         self._entry()
+        plan.record('shuffle', 'groupByKey')
         res = self._rdd.groupByKey()
         return XRdd(res)
 
+    def aggregateByKey(self, zero_value, seq_func, comb_func, num_partitions=None):
+        self._entry(num_partitions=num_partitions)
+        plan.record('shuffle', 'aggregateByKey')
+        res = self._rdd.aggregateByKey(zero_value, seq_func, comb_func, num_partitions)
+        return XRdd(res)
+
     def cartesian(self, right):
         self._entry()
+        plan.record('shuffle', 'cartesian')
         res = self._rdd.cartesian(right._rdd)
         return XRdd(res)
         
     def join(self, right):
         self._entry()
+        plan.record('shuffle', 'join')
         res = self._rdd.join(right._rdd)
         return XRdd(res)
         
     def leftOuterJoin(self, right):
         self._entry()
+        plan.record('shuffle', 'leftOuterJoin')
         res = self._rdd.leftOuterJoin(right._rdd)
         return XRdd(res)
         
     def rightOuterJoin(self, right):
         self._entry()
+        plan.record('shuffle', 'rightOuterJoin')
         res = self._rdd.rightOuterJoin(right._rdd)
         return XRdd(res)
         
     def fullOuterJoin(self, right):
         self._entry()
+        plan.record('shuffle', 'fullOuterJoin')
         res = self._rdd.fullOuterJoin(right._rdd)
         return XRdd(res)
 
+    def partitionBy(self, num_partitions, partition_func):
+        self._entry(num_partitions=num_partitions)
+        plan.record('shuffle', 'partitionBy')
+        res = self._rdd.partitionBy(num_partitions, partition_func)
+        return XRdd(res)
+
     def sortBy(self, keyfunc, ascending=True, numPartitions=None):
         self._entry()
+        plan.record('shuffle', 'sortBy')
         res = self._rdd.sortBy(keyfunc, ascending, numPartitions)
         return XRdd(res)
 
     def sortByKey(self, ascending=True, numPartitions=None, keyfunc=lambda x: x):
         self._entry()
+        plan.record('shuffle', 'sortByKey')
         res = self._rdd.sortByKey(ascending, numPartitions, keyfunc)
         return XRdd(res)